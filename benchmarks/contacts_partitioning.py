@@ -0,0 +1,240 @@
+"""
+Compare ContactRepository queries on the partitioned and an unpartitioned contacts table.
+
+The script copies `contacts` into an unpartitioned table with the same columns
+and indexes in the `bench_unpartitioned` schema, so the baseline does not depend
+on the migration history. Every repository query is run against both through
+EXPLAIN to list the contacts relations it touched (with ANALYZE for reads, so
+partitions pruned at run time are left out), then timed over `--repeat` runs.
+Writes are rolled back instead of committed, so every run sees the same data
+and the timings of writes include the rollback. The copy is dropped at the end.
+
+    python -m benchmarks.contacts_partitioning --seed-users 1000 --contacts-per-user 1000
+    python -m benchmarks.contacts_partitioning
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.conf.config import settings
+from src.database.db import sessionmanager
+from src.repository.contacts import ContactRepository
+from src.schemas import User
+
+BASELINE_SCHEMA = "bench_unpartitioned"
+
+
+class BenchmarkSession:
+    """
+    Proxy around AsyncSession that rolls back instead of committing and, with
+    `explain`, records the contacts relations scanned by each statement.
+    """
+
+    def __init__(self, session, explain: bool = False):
+        self.session = session
+        self.explain = explain
+        self.relations: list[set[str]] = []
+
+    async def execute(self, stmt, *args, **kwargs):
+        if self.explain:
+            await self._explain(stmt)
+        return await self.session.execute(stmt, *args, **kwargs)
+
+    async def scalar(self, stmt, *args, **kwargs):
+        result = await self.execute(stmt, *args, **kwargs)
+        return result.scalar()
+
+    async def commit(self) -> None:
+        await self.session.rollback()
+
+    async def _explain(self, stmt) -> None:
+        sql = stmt.compile(
+            dialect=self.session.bind.dialect, compile_kwargs={"literal_binds": True}
+        )
+        # ANALYZE runs the statement, writes are only planned
+        options = "ANALYZE, FORMAT JSON" if stmt.is_select else "FORMAT JSON"
+        plan = await self.session.execute(text(f"EXPLAIN ({options}) {sql}"))
+        relations = set()
+        self._collect_relations(plan.scalar()[0]["Plan"], relations)
+        self.relations.append(relations)
+
+    def _collect_relations(self, node: dict, relations: set) -> None:
+        if node.get("Relation Name", "").startswith("contacts"):
+            relations.add(node["Relation Name"])
+        for child in node.get("Plans", []):
+            self._collect_relations(child, relations)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+async def seed(session, users: int, contacts_per_user: int) -> None:
+    await session.execute(
+        text(
+            "INSERT INTO users (username, email, hashed_password, confirmed) "
+            "SELECT 'bench' || u, 'bench' || u || '@example.com', '', true "
+            "FROM generate_series(1, :users) AS u ON CONFLICT DO NOTHING"
+        ),
+        {"users": users},
+    )
+    await session.execute(
+        text(
+            "INSERT INTO contacts (first_name, last_name, email, phone, phone_digits, "
+            "birthday, created_at, updated_at, user_id) "
+            "SELECT 'First' || c, 'Last' || c, 'c' || c || '@example.com', "
+            "'+380500000000', '380500000000', date '1990-01-01' + (c % 365), "
+            "now(), now(), u.id "
+            "FROM users u CROSS JOIN generate_series(1, :per_user) AS c "
+            "WHERE u.username LIKE 'bench%' ON CONFLICT DO NOTHING"
+        ),
+        {"per_user": contacts_per_user},
+    )
+    await session.execute(
+        text(
+            "INSERT INTO tags (name, user_id, created_at) "
+            "SELECT 'bench', id, now() FROM users "
+            "WHERE username LIKE 'bench%' ON CONFLICT DO NOTHING"
+        )
+    )
+    # every tenth contact is tagged
+    await session.execute(
+        text(
+            "INSERT INTO contact_tags (tag_id, contact_id, user_id) "
+            "SELECT t.id, c.id, c.user_id FROM contacts c "
+            "JOIN tags t ON t.user_id = c.user_id AND t.name = 'bench' "
+            "WHERE c.id % 10 = 0 ON CONFLICT DO NOTHING"
+        )
+    )
+    await session.commit()
+    await session.execute(text("ANALYZE contacts"))
+
+
+async def create_baseline(session) -> None:
+    """
+    Copy `contacts` into an unpartitioned table with the same columns and indexes.
+    """
+    for statement in (
+        f"DROP SCHEMA IF EXISTS {BASELINE_SCHEMA} CASCADE",
+        f"CREATE SCHEMA {BASELINE_SCHEMA}",
+        f"CREATE TABLE {BASELINE_SCHEMA}.contacts "
+        "(LIKE public.contacts INCLUDING DEFAULTS INCLUDING INDEXES)",
+        f"INSERT INTO {BASELINE_SCHEMA}.contacts SELECT * FROM public.contacts",
+    ):
+        await session.execute(text(statement))
+    await session.commit()
+    await session.execute(text(f"ANALYZE {BASELINE_SCHEMA}.contacts"))
+
+
+def queries(user: User, user_ids: list[int]):
+    today = date.today()
+    updated_before = datetime.now() + timedelta(days=1)
+    return {
+        "get_contacts": lambda r: r.get_contacts(0, 100, user),
+        "get_contact_by_id": lambda r: r.get_contact_by_id(1, user),
+        "search_contacts": lambda r: r.search_contacts(
+            0, 100, "first1", None, None, user
+        ),
+        "suggest_contacts": lambda r: r.suggest_contacts("first1", 10, user),
+        "get_upcoming_birthdays": lambda r: r.get_upcoming_birthdays(
+            today, today + timedelta(days=30), 0, 100, user
+        ),
+        "get_upcoming_birthdays_for_users": lambda r: (
+            r.get_upcoming_birthdays_for_users(
+                today, today + timedelta(days=7), user_ids, 10
+            )
+        ),
+        "archive_stale_contacts": lambda r: r.archive_stale_contacts(
+            0, updated_before, 100
+        ),
+        "get_tag_counts": lambda r: r.get_tag_counts(user),
+        "get_tag_count": lambda r: r.get_tag_count("bench", user),
+        "tag_contacts": lambda r: r.tag_contacts("bench", list(range(1, 101)), user),
+        "untag_contacts": lambda r: r.untag_contacts("bench", None, user),
+        "get_duplicate_candidates": lambda r: r.get_duplicate_candidates(user),
+        "get_stats": lambda r: r.stats_repository.get_stats(
+            user, today - timedelta(weeks=12), 5
+        ),
+    }
+
+
+def describe(relations: set[str]) -> str:
+    partitions = sorted(name for name in relations if name != "contacts")
+    if len(partitions) > 1:
+        # the parent shows up in the plans of writes
+        return f"{len(partitions)} partitions"
+    return ", ".join(sorted(relations)) or "-"
+
+
+async def measure(session, layout: str, user: User, user_ids: list[int], repeat: int):
+    for name, run in queries(user, user_ids).items():
+        explaining = BenchmarkSession(session, explain=True)
+        await run(ContactRepository(explaining))
+        await session.rollback()
+        relations = describe(set().union(*explaining.relations))
+
+        repository = ContactRepository(BenchmarkSession(session))
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await run(repository)
+            timings.append((time.perf_counter() - started) * 1000)
+            await session.rollback()
+            session.expunge_all()
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(
+            f"{name:<34}{layout:<15}{relations:>16}"
+            f"{statistics.median(timings):>10.3f}{p99:>10.3f}"
+        )
+
+
+async def main(args) -> None:
+    # the baseline engine resolves `contacts` to the unpartitioned copy
+    baseline_engine = create_async_engine(
+        settings.DB_URL,
+        connect_args={"server_settings": {"search_path": f"{BASELINE_SCHEMA}, public"}},
+    )
+    try:
+        async with sessionmanager.session() as session:
+            if args.seed_users:
+                await seed(session, args.seed_users, args.contacts_per_user)
+            await create_baseline(session)
+            user_ids = list(
+                await session.scalars(
+                    text(
+                        "SELECT id FROM users WHERE username LIKE 'bench%' "
+                        "ORDER BY id LIMIT 100"
+                    )
+                )
+            )
+        user = User(id=user_ids[0], username="", email="", avatar=None)
+
+        print(
+            f"{'query':<34}{'layout':<15}{'relations':>16}{'p50 ms':>10}{'p99 ms':>10}"
+        )
+        async with sessionmanager.session() as session:
+            await measure(session, "partitioned", user, user_ids, args.repeat)
+        async with async_sessionmaker(bind=baseline_engine)() as session:
+            await measure(session, "unpartitioned", user, user_ids, args.repeat)
+    finally:
+        async with sessionmanager.session() as session:
+            await session.execute(
+                text(f"DROP SCHEMA IF EXISTS {BASELINE_SCHEMA} CASCADE")
+            )
+            await session.commit()
+        await baseline_engine.dispose()
+        await sessionmanager._engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seed-users", type=int, default=0)
+    parser.add_argument("--contacts-per-user", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
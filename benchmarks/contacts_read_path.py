@@ -0,0 +1,150 @@
+"""
+Compare the Core read path of ContactRepository with ORM entity loading.
+
+Both paths run the same query for one user and serialize the rows to JSON
+dicts: ORM entities are validated into ContactResponse, Core rows go through
+the contacts service serializer. For a 100-row page and for a
+large export the benchmark reports wall and CPU time per run and the peak
+memory allocated while loading and serializing (tracemalloc):
+
+    python -m benchmarks.contacts_read_path --seed-contacts 50000
+    python -m benchmarks.contacts_read_path --export-rows 50000
+"""
+
+import argparse
+import asyncio
+import gc
+import statistics
+import time
+import tracemalloc
+from datetime import date, datetime
+
+from sqlalchemy import insert, select, text
+
+from src.database.db import sessionmanager
+from src.database.models import Contact, User as UserModel
+from src.repository.contacts import ContactRepository
+from src.schemas import ContactResponse, User
+from src.services.contacts import _to_responses
+
+BENCH_USERNAME = "bench-read-path"
+
+
+async def seed(session, contacts: int) -> int:
+    user_id = await session.scalar(
+        select(UserModel.id).filter_by(username=BENCH_USERNAME)
+    )
+    if user_id is None:
+        user_id = (
+            await session.execute(
+                insert(UserModel)
+                .values(
+                    username=BENCH_USERNAME,
+                    email=f"{BENCH_USERNAME}@example.com",
+                    hashed_password="",
+                    confirmed=True,
+                )
+                .returning(UserModel.id)
+            )
+        ).scalar_one()
+    existing = await session.scalar(
+        text("SELECT COUNT(*) FROM contacts WHERE user_id = :user_id"),
+        {"user_id": user_id},
+    )
+    now = datetime.now()
+    rows = [
+        {
+            "first_name": f"First{c}",
+            "last_name": f"Last{c}",
+            "email": f"c{c}@example.com",
+            "phone": "+380500000000",
+            "phone_digits": "380500000000",
+            "birthday": date(1990, c % 12 + 1, c % 28 + 1),
+            "created_at": now,
+            "updated_at": now,
+            "user_id": user_id,
+        }
+        for c in range(existing, contacts)
+    ]
+    for start in range(0, len(rows), 5000):
+        await session.execute(insert(Contact.__table__), rows[start : start + 5000])
+    await session.commit()
+    return user_id
+
+
+async def load_orm(session, user: User, limit: int) -> list[dict]:
+    stmt = (
+        select(Contact)
+        .filter_by(user_id=user.id)
+        .order_by(Contact.id)
+        .offset(0)
+        .limit(limit)
+    )
+    contacts = (await session.execute(stmt)).scalars().all()
+    return [
+        ContactResponse.model_validate(contact).model_dump(mode="json")
+        for contact in contacts
+    ]
+
+
+async def load_core(session, user: User, limit: int) -> list[dict]:
+    return _to_responses(await ContactRepository(session).get_contacts(0, limit, user))
+
+
+async def measure(session, load, user: User, limit: int, repeat: int) -> dict:
+    wall, cpu = [], []
+    for _ in range(repeat):
+        gc.collect()
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        await load(session, user, limit)
+        wall.append((time.perf_counter() - wall_started) * 1000)
+        cpu.append((time.process_time() - cpu_started) * 1000)
+        session.expunge_all()
+
+    gc.collect()
+    tracemalloc.start()
+    result = await load(session, user, limit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    session.expunge_all()
+    return {
+        "rows": len(result),
+        "wall_ms": statistics.median(wall),
+        "cpu_ms": statistics.median(cpu),
+        "peak_kib": peak / 1024,
+    }
+
+
+async def main(args) -> None:
+    async with sessionmanager.session() as session:
+        if args.seed_contacts:
+            user_id = await seed(session, args.seed_contacts)
+        else:
+            user_id = (
+                await session.execute(
+                    select(UserModel.id).filter_by(username=BENCH_USERNAME)
+                )
+            ).scalar_one()
+        user = User(id=user_id, username=BENCH_USERNAME, email="", avatar=None)
+
+        print(
+            f"{'case':<10}{'path':<6}{'rows':>8}{'wall ms':>11}"
+            f"{'cpu ms':>11}{'peak KiB':>12}"
+        )
+        cases = [("page", 100, args.repeat), ("export", args.export_rows, 5)]
+        for case, limit, repeat in cases:
+            for path, load in (("orm", load_orm), ("core", load_core)):
+                stats = await measure(session, load, user, limit, repeat)
+                print(
+                    f"{case:<10}{path:<6}{stats['rows']:>8}{stats['wall_ms']:>11.3f}"
+                    f"{stats['cpu_ms']:>11.3f}{stats['peak_kib']:>12.1f}"
+                )
+    await sessionmanager._engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seed-contacts", type=int, default=0)
+    parser.add_argument("--export-rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
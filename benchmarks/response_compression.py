@@ -0,0 +1,131 @@
+"""
+Measure the bytes saved and the CPU spent compressing each contacts route.
+
+Every route is requested once through the app without compression; its body
+is then compressed with each available encoder and level, as one response
+and, for the export, as a stream of 64 KiB chunks flushed one by one like
+CompressionMiddleware does. The benchmark reports the compressed size, the
+ratio and the median CPU time per response, which tells where the
+`COMPRESSION_MINIMUM_SIZE` and `COMPRESSION_THREAD_CUTOFF` limits belong:
+
+    python -m benchmarks.response_compression --seed-contacts 5000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+from sqlalchemy import select
+
+from benchmarks.contacts_read_path import BENCH_USERNAME, seed
+from main import app
+from src.conf.config import settings
+from src.database.db import sessionmanager
+from src.database.models import User as UserModel
+from src.middleware.compression import available_encoders
+from src.repository.contacts import ContactRepository
+from src.schemas import User
+from src.services.auth import create_access_token
+from src.services.contacts import _to_responses
+
+ROUTES = [
+    ("list", "/api/contacts/?limit=100"),
+    ("list fields", "/api/contacts/?limit=100&fields=first_name,last_name,email"),
+    ("search", "/api/contacts/search/?last_name=last1&limit=100"),
+    ("birthdays", "/api/contacts/birthdays/?days=30&limit=100"),
+    ("suggest", "/api/contacts/suggest?prefix=first1&limit=20"),
+    ("tags", "/api/contacts/tags"),
+]
+LEVELS = {"gzip": (1, 6, 9), "br": (4, 11), "zstd": (3, 19)}
+STREAM_CHUNK = 65536
+
+
+def compress(encoding: str, level: int, body: bytes, chunk: int | None) -> bytes:
+    encoder = available_encoders(level, level, level)[encoding]()
+    if chunk is None:
+        return encoder.compress(body, True)
+    parts = [
+        encoder.compress(body[start : start + chunk], False)
+        for start in range(0, len(body), chunk)
+    ]
+    return b"".join(parts) + encoder.compress(b"", True)
+
+
+def measure(body: bytes, repeat: int, chunk: int | None = None):
+    for encoding in available_encoders(1, 1, 1):
+        for level in LEVELS[encoding]:
+            cpu = []
+            for _ in range(repeat):
+                started = time.process_time()
+                compressed = compress(encoding, level, body, chunk)
+                cpu.append((time.process_time() - started) * 1000)
+            yield encoding, level, len(compressed), statistics.median(cpu)
+
+
+async def fetch_bodies(user_id: int, export_rows: int) -> list[tuple[str, bytes]]:
+    token = await create_access_token(
+        data={"sub": BENCH_USERNAME, "uid": user_id, "email": "", "shard": None}
+    )
+    headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": "identity"}
+    bodies = []
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench"
+    ) as client:
+        for name, path in ROUTES:
+            response = await client.get(path, headers=headers)
+            response.raise_for_status()
+            bodies.append((name, response.content))
+
+    # no export route yet: the body a full listing would stream
+    user = User(id=user_id, username=BENCH_USERNAME, email="", avatar=None)
+    async with sessionmanager.session() as session:
+        rows = await ContactRepository(session).get_contacts(0, export_rows, user)
+    bodies.append(("export", json.dumps(_to_responses(rows)).encode()))
+    return bodies
+
+
+async def main(args) -> None:
+    async with sessionmanager.session() as session:
+        if args.seed_contacts:
+            user_id = await seed(session, args.seed_contacts)
+        else:
+            user_id = (
+                await session.execute(
+                    select(UserModel.id).filter_by(username=BENCH_USERNAME)
+                )
+            ).scalar_one()
+    bodies = await fetch_bodies(user_id, args.export_rows)
+    await sessionmanager._engine.dispose()
+
+    print(
+        f"minimum size {settings.COMPRESSION_MINIMUM_SIZE} B, "
+        f"thread cutoff {settings.COMPRESSION_THREAD_CUTOFF} B"
+    )
+    print(
+        f"{'route':<14}{'bytes':>10}{'encoding':>10}{'level':>7}"
+        f"{'compressed':>12}{'ratio':>8}{'cpu ms':>10}{'MB/s':>9}"
+    )
+    cases = [(name, body, None) for name, body in bodies]
+    cases.append(("export stream", bodies[-1][1], STREAM_CHUNK))
+    for name, body, chunk in cases:
+        if len(body) < settings.COMPRESSION_MINIMUM_SIZE:
+            print(f"{name:<14}{len(body):>10}  below the minimum size, sent as is")
+            continue
+        repeat = args.repeat if len(body) < 1 << 20 else 5
+        for encoding, level, size, cpu_ms in measure(body, repeat, chunk):
+            print(
+                f"{name:<14}{len(body):>10}{encoding:>10}{level:>7}{size:>12}"
+                f"{len(body) / size:>8.1f}{cpu_ms:>10.3f}"
+                f"{len(body) / 1e3 / cpu_ms if cpu_ms else float('inf'):>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seed-contacts", type=int, default=0)
+    parser.add_argument("--export-rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
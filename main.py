@@ -1,11 +1,50 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from src.api import contacts, utils, auth, users
+from src.api import contacts, utils, auth, users, batch, profiles
 from slowapi.errors import RateLimitExceeded
+from src.conf.config import settings
+from src.middleware.admission import (
+    AdmissionControlMiddleware,
+    admission_controller,
+    classify_request,
+)
+from src.middleware.compression import CompressionMiddleware
+from src.middleware.profiling import ProfilingMiddleware
+from src.middleware.tracing import TracingMiddleware
+from src.services.archive import contact_archiver
+from src.services.audit import audit_log
+from src.services.avatars import avatar_proxy
+from src.services.digest import birthday_digest_job
+from src.services.health import health_monitor
+from src.services.profiling import profile_store
+from src.services.tracing import tracer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    health_monitor.start()
+    audit_log.start()
+    if settings.BIRTHDAY_DIGEST_ENABLED:
+        birthday_digest_job.start()
+    if settings.ARCHIVE_ENABLED:
+        contact_archiver.start()
+    yield
+    await contact_archiver.stop()
+    await birthday_digest_job.stop()
+    await health_monitor.stop()
+    await avatar_proxy.close()
+    # last, after the jobs that record changes
+    await audit_log.stop()
+    # export the traces of the last requests
+    await asyncio.to_thread(tracer.stop)
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["<http://localhost:8000>", "<http://localhost:8080>"]
 app.add_middleware(
@@ -15,12 +54,44 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if settings.COMPRESSION_ENABLED:
+    # inside admission control and profiling, compression is part of the request's work
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        thread_cutoff=settings.COMPRESSION_THREAD_CUTOFF,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+    )
+if settings.PROFILING_ENABLED:
+    # inside admission control, so queueing time is not profiled
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        token=settings.PROFILING_TOKEN,
+        sample_rate=settings.PROFILING_SAMPLE_RATE,
+        interval=settings.PROFILING_INTERVAL_SECONDS,
+        max_concurrent=settings.PROFILING_MAX_CONCURRENT,
+    )
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        controller=admission_controller,
+        classify=classify_request,
+        exempt=("/api/healthchecker", "/api/livez", "/api/readyz", "/api/metrics"),
+    )
+if settings.TRACING_ENABLED:
+    # outermost, so the server span includes time spent waiting for admission
+    app.add_middleware(TracingMiddleware, tracer=tracer)
 
 
 app.include_router(utils.router, prefix="/api")
 app.include_router(contacts.router, prefix="/api")
 app.include_router(auth.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
+app.include_router(batch.router, prefix="/api")
+app.include_router(profiles.router, prefix="/api")
 
 
 @app.exception_handler(RateLimitExceeded)
@@ -36,6 +107,7 @@ def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code,
         content={"message": exc.detail},
+        headers=exc.headers,
     )
 
 
@@ -25,7 +25,11 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
-config.set_main_option("sqlalchemy.url", settings.DB_URL)
+# run `alembic -x db_url=... upgrade head` to migrate a shard listed in DB_SHARD_URLS
+config.set_main_option(
+    "sqlalchemy.url",
+    context.get_x_argument(as_dictionary=True).get("db_url", settings.DB_URL),
+)
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -58,7 +62,11 @@ def run_migrations_offline() -> None:
 
 
 def run_migrations(connection: Connection):
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
     with context.begin_transaction():
         context.run_migrations()
 
@@ -0,0 +1,39 @@
+"""add contact prefix indexes
+
+Revision ID: 3c1e7a9d2b45
+Revises: f659f901dec5
+Create Date: 2026-10-19 10:02:11.402317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1e7a9d2b45'
+down_revision: Union[str, None] = 'f659f901dec5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+PREFIX_INDEXES = {
+    'ix_contacts_user_first_name_prefix': 'first_name',
+    'ix_contacts_user_last_name_prefix': 'last_name',
+    'ix_contacts_user_email_prefix': 'email',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # text_pattern_ops lets Postgres use the index for LIKE 'prefix%' under any collation
+    ops = ' text_pattern_ops' if op.get_bind().dialect.name == 'postgresql' else ''
+    for name, column in PREFIX_INDEXES.items():
+        op.create_index(name, 'contacts', ['user_id', sa.text(f'lower({column}){ops}')])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in reversed(PREFIX_INDEXES):
+        op.drop_index(name, table_name='contacts')
@@ -0,0 +1,28 @@
+"""add refresh tokens user index
+
+Revision ID: 409ab3a2160d
+Revises: acb8a6d96fc2
+Create Date: 2026-10-19 12:38:05.597956
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '409ab3a2160d'
+down_revision: Union[str, None] = 'acb8a6d96fc2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_refresh_tokens_user_id_expires_at', 'refresh_tokens', ['user_id', 'expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_refresh_tokens_user_id_expires_at', table_name='refresh_tokens')
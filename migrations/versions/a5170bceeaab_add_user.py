@@ -17,6 +17,8 @@ down_revision: Union[str, None] = '20b59d91905a'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+NAMING_CONVENTION = {'uq': '%(table_name)s_%(column_0_name)s_key'}
+
 
 def upgrade() -> None:
     """Upgrade schema."""
@@ -32,19 +34,23 @@ def upgrade() -> None:
     sa.UniqueConstraint('email'),
     sa.UniqueConstraint('username')
     )
-    op.add_column('contacts', sa.Column('user_id', sa.Integer(), nullable=True))
-    op.drop_constraint('contacts_email_key', 'contacts', type_='unique')
-    op.create_unique_constraint('unique_email_user', 'contacts', ['email', 'user_id'])
-    op.create_foreign_key(None, 'contacts', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    # batch mode recreates the table on SQLite, where constraints cannot be altered;
+    # the naming convention gives the unnamed unique constraint its Postgres name
+    with op.batch_alter_table('contacts', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+        batch_op.drop_constraint('contacts_email_key', type_='unique')
+        batch_op.create_unique_constraint('unique_email_user', ['email', 'user_id'])
+        batch_op.create_foreign_key('contacts_user_id_fkey', 'users', ['user_id'], ['id'], ondelete='CASCADE')
     # ### end Alembic commands ###
 
 
 def downgrade() -> None:
     """Downgrade schema."""
     # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_constraint(None, 'contacts', type_='foreignkey')
-    op.drop_constraint('unique_email_user', 'contacts', type_='unique')
-    op.create_unique_constraint('contacts_email_key', 'contacts', ['email'])
-    op.drop_column('contacts', 'user_id')
+    with op.batch_alter_table('contacts', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint('contacts_user_id_fkey', type_='foreignkey')
+        batch_op.drop_constraint('unique_email_user', type_='unique')
+        batch_op.create_unique_constraint('contacts_email_key', ['email'])
+        batch_op.drop_column('user_id')
     op.drop_table('users')
     # ### end Alembic commands ###
@@ -0,0 +1,90 @@
+"""add contact stats
+
+Revision ID: acb8a6d96fc2
+Revises: a81c4e6f2d93
+Create Date: 2026-10-19 11:45:49.757618
+
+Counts the existing contacts once; from then on the application keeps the
+counts up to date on every write.
+"""
+from collections import Counter
+from datetime import timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'acb8a6d96fc2'
+down_revision: Union[str, None] = 'a81c4e6f2d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def _count(counts: Counter, user_id, email, birthday, created_at) -> None:
+    # same keys as src.repository.stats.contact_stat_keys
+    counts[user_id, 'total', ''] += 1
+    if birthday is not None:
+        counts[user_id, 'birth_month', f'{birthday.month:02d}'] += 1
+    if email and '@' in email:
+        counts[user_id, 'email_domain', email.rsplit('@', 1)[1].lower()] += 1
+    if created_at is not None:
+        week = created_at.date() - timedelta(days=created_at.weekday())
+        counts[user_id, 'added_week', week.isoformat()] += 1
+
+
+def _backfill(bind) -> None:
+    counts = Counter()
+    for name in ('contacts', 'archived_contacts'):
+        # typed, SQLite returns dates as strings otherwise
+        table = sa.table(name, sa.column('id'), sa.column('user_id'), sa.column('email'),
+                         sa.column('birthday', sa.Date), sa.column('created_at', sa.DateTime))
+        last_id = 0
+        while True:
+            rows = bind.execute(
+                sa.select(table.c.id, table.c.user_id, table.c.email, table.c.birthday, table.c.created_at)
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                if name == 'contacts':
+                    _count(counts, row.user_id, row.email, row.birthday, row.created_at)
+                else:
+                    counts[row.user_id, 'archived', ''] += 1
+            last_id = rows[-1].id
+    stats = sa.table('contact_stats', sa.column('user_id'), sa.column('kind'), sa.column('key'),
+                     sa.column('contacts'))
+    rows = [
+        {'user_id': user_id, 'kind': kind, 'key': key, 'contacts': contacts}
+        for (user_id, kind, key), contacts in counts.items()
+    ]
+    for start in range(0, len(rows), BACKFILL_BATCH_SIZE):
+        bind.execute(stats.insert(), rows[start:start + BACKFILL_BATCH_SIZE])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('contact_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('contacts', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'kind', 'key')
+    )
+    # ### end Alembic commands ###
+    _backfill(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_table('contact_stats')
+    # ### end Alembic commands ###
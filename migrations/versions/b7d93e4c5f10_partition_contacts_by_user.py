@@ -0,0 +1,102 @@
+"""partition contacts by user
+
+Revision ID: b7d93e4c5f10
+Revises: 8f4b2d6e1a73
+Create Date: 2026-10-19 12:41:05.872931
+
+Rebuilds `contacts` as a Postgres table hash-partitioned on `user_id`.
+The number of partitions defaults to 16 and can be set with
+`alembic -x contact_partitions=64 upgrade head`.
+
+The primary key becomes (id, user_id) because a partitioned table's unique
+constraints must contain the partition key; `unique_email_user` already does.
+Rows are copied under an ACCESS EXCLUSIVE lock, so run it in a maintenance
+window on large tables. Contacts without a user_id stop the upgrade.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d93e4c5f10'
+down_revision: Union[str, None] = '8f4b2d6e1a73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PREFIX_INDEXES = {
+    'ix_contacts_user_first_name_prefix': 'first_name',
+    'ix_contacts_user_last_name_prefix': 'last_name',
+    'ix_contacts_user_email_prefix': 'email',
+}
+
+
+def _create_contacts_table(partitions: int | None) -> None:
+    op.execute(f"""
+        CREATE TABLE contacts (
+            id INTEGER NOT NULL DEFAULT nextval('contacts_id_seq'),
+            first_name VARCHAR(50) NOT NULL,
+            last_name VARCHAR(50) NOT NULL,
+            email VARCHAR(100) NOT NULL,
+            phone VARCHAR(15) NOT NULL,
+            birthday DATE NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            user_id INTEGER {'NOT NULL' if partitions else ''},
+            CONSTRAINT contacts_pkey PRIMARY KEY ({'id, user_id' if partitions else 'id'}),
+            CONSTRAINT unique_email_user UNIQUE (email, user_id),
+            CONSTRAINT contacts_user_id_fkey FOREIGN KEY (user_id)
+                REFERENCES users (id) ON DELETE CASCADE
+        ) {'PARTITION BY HASH (user_id)' if partitions else ''}
+    """)
+    for remainder in range(partitions or 0):
+        op.execute(
+            f"CREATE TABLE contacts_p{remainder} PARTITION OF contacts "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        )
+    for name, column in PREFIX_INDEXES.items():
+        op.create_index(name, 'contacts', ['user_id', sa.text(f'lower({column}) text_pattern_ops')])
+
+
+def _rebuild_contacts(partitions: int | None) -> None:
+    op.execute('LOCK TABLE contacts IN ACCESS EXCLUSIVE MODE')
+    op.execute('ALTER TABLE contacts RENAME TO contacts_old')
+    for constraint in ('contacts_pkey', 'unique_email_user', 'contacts_user_id_fkey'):
+        op.execute(f'ALTER TABLE contacts_old DROP CONSTRAINT IF EXISTS {constraint}')
+    for name in PREFIX_INDEXES:
+        op.drop_index(name, table_name='contacts_old')
+
+    _create_contacts_table(partitions)
+    op.execute("""
+        INSERT INTO contacts (id, first_name, last_name, email, phone, birthday,
+                              created_at, updated_at, user_id)
+        SELECT id, first_name, last_name, email, phone, birthday,
+               created_at, updated_at, user_id
+        FROM contacts_old
+    """)
+    op.execute('ALTER SEQUENCE contacts_id_seq OWNED BY contacts.id')
+    op.drop_table('contacts_old')
+    op.execute('ANALYZE contacts')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    partitions = int(context.get_x_argument(as_dictionary=True).get('contact_partitions', 16))
+    orphans = op.get_bind().scalar(sa.text('SELECT count(*) FROM contacts WHERE user_id IS NULL'))
+    if orphans:
+        # the partition key is part of the primary key, so it cannot be NULL
+        raise RuntimeError(
+            f'{orphans} contacts have no user_id, assign them to a user or '
+            'delete them before upgrading'
+        )
+    _rebuild_contacts(partitions)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    _rebuild_contacts(None)
@@ -0,0 +1,59 @@
+"""add contact tags
+
+Revision ID: d4e7b1c9a2f6
+Revises: c2a8f61d9e34
+Create Date: 2026-10-19 16:22:10.403816
+
+`contact_tags` references contacts by (id, user_id). The partitioned Postgres
+contacts table already has that primary key; elsewhere a unique index on
+(id, user_id) is added for the foreign key to point at.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e7b1c9a2f6'
+down_revision: Union[str, None] = 'c2a8f61d9e34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _contacts_keyed_by_user() -> bool:
+    primary_key = sa.inspect(op.get_bind()).get_pk_constraint('contacts')
+    return set(primary_key['constrained_columns']) == {'id', 'user_id'}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _contacts_keyed_by_user():
+        op.create_index('ix_contacts_id_user_id', 'contacts', ['id', 'user_id'], unique=True)
+    op.create_table('tags',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'name', name='unique_tag_user')
+    )
+    op.create_table('contact_tags',
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.Column('contact_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['contact_id', 'user_id'], ['contacts.id', 'contacts.user_id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('tag_id', 'contact_id')
+    )
+    op.create_index('ix_contact_tags_contact_id_user_id', 'contact_tags', ['contact_id', 'user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_contact_tags_contact_id_user_id', table_name='contact_tags')
+    op.drop_table('contact_tags')
+    op.drop_table('tags')
+    if not _contacts_keyed_by_user():
+        op.drop_index('ix_contacts_id_user_id', table_name='contacts')
@@ -0,0 +1,73 @@
+"""add contact phone digits
+
+Revision ID: e5b2c8f4a1d7
+Revises: d4e7b1c9a2f6
+Create Date: 2026-10-19 17:48:31.660214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b2c8f4a1d7'
+down_revision: Union[str, None] = 'd4e7b1c9a2f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+# expression indexes of 3c1e7a9d2b45, lost when SQLite recreates the table
+PREFIX_INDEXES = {
+    'ix_contacts_user_first_name_prefix': 'first_name',
+    'ix_contacts_user_last_name_prefix': 'last_name',
+    'ix_contacts_user_email_prefix': 'email',
+}
+
+
+def _backfill(bind) -> None:
+    if bind.dialect.name == 'postgresql':
+        op.execute(r"UPDATE contacts SET phone_digits = regexp_replace(phone, '\D', '', 'g')")
+        return
+    contacts = sa.table('contacts', sa.column('id'), sa.column('phone'), sa.column('phone_digits'))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(contacts.c.id, contacts.c.phone)
+            .where(contacts.c.id > last_id)
+            .order_by(contacts.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            contacts.update().where(contacts.c.id == sa.bindparam('contact_id')),
+            [{'contact_id': id, 'phone_digits': ''.join(filter(str.isdigit, phone))} for id, phone in rows],
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    op.add_column('contacts', sa.Column('phone_digits', sa.String(length=15), nullable=True))
+    _backfill(bind)
+    # text_pattern_ops lets Postgres use the index for LIKE 'prefix%' under any collation
+    ops = ' text_pattern_ops' if bind.dialect.name == 'postgresql' else ''
+    op.create_index('ix_contacts_user_phone_digits', 'contacts', ['user_id', sa.text(f'phone_digits{ops}')])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_contacts_user_phone_digits', table_name='contacts')
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        for name in PREFIX_INDEXES:
+            op.drop_index(name, table_name='contacts')
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_column('phone_digits')
+    if sqlite:
+        for name, column in PREFIX_INDEXES.items():
+            op.create_index(name, 'contacts', ['user_id', sa.text(f'lower({column})')])
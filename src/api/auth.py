@@ -1,3 +1,5 @@
+import math
+
 from fastapi import (
     APIRouter,
     HTTPException,
@@ -9,12 +11,20 @@ from fastapi import (
 )
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
-from src.schemas import UserCreate, Token, User, RequestEmail
-from src.services.auth import create_access_token, Hash
+from src.schemas import UserCreate, Token, User, RequestEmail, RefreshTokenRequest
+from src.services.auth import (
+    Hash,
+    create_tokens,
+    rotate_refresh_token,
+    revoke_tokens,
+    get_token_payload,
+)
 from src.services.users import UserService
 from src.services.email import send_email
 from src.services.auth import get_email_from_token
-from src.database.db import get_db
+from src.database.db import get_directory_db, shard_for_user
+from src.services.shards import provision_user_shard
+from src.services.login_guard import login_guard
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -24,7 +34,7 @@ async def register_user(
     user_data: UserCreate,
     background_tasks: BackgroundTasks,
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_directory_db),
 ):
     """
     Register a new user.
@@ -39,23 +49,18 @@ async def register_user(
     ).
     - verify email: Confirm email address following link in your mailbox.
     """
-    user_service = UserService(db)
-
-    email_user = await user_service.get_user_by_email(user_data.email)
-    if email_user:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="User with such email already exists",
-        )
-
-    username_user = await user_service.get_user_by_username(user_data.username)
-    if username_user:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="User with such username already exists",
-        )
+    # the request body is fully validated before hashing; taken usernames and
+    # emails are rejected by the users unique constraints on the single insert
     user_data.password = Hash().get_password_hash(user_data.password)
-    new_user = await user_service.create_user(user_data)
+    shard = shard_for_user(user_data.username)
+    user_service = UserService(db)
+    new_user = await user_service.create_user(user_data, shard)
+    try:
+        await provision_user_shard(new_user, shard)
+    except BaseException:
+        # without its row on the shard every contact write of the user would fail
+        await user_service.delete_user(new_user.id)
+        raise
     background_tasks.add_task(
         send_email, new_user.email, new_user.username, request.base_url
     )
@@ -64,34 +69,79 @@ async def register_user(
 
 @router.post("/login", response_model=Token)
 async def login_user(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_directory_db),
 ):
     """
     Authenticate a user.
     - **username**: The username of the user.
     - **password**: The password of the user.
     - Email must be confirmed.
+    - Repeated failures for a username or from an IP address lock them out for an
+      exponentially growing time; locked out attempts get `429` with `Retry-After`.
     """
+    ip = request.client.host if request.client else "unknown"
+    retry_after = await login_guard.retry_after(form_data.username, ip)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts, try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
     user_service = UserService(db)
     user = await user_service.get_user_by_username(form_data.username)
-    if not user or not Hash().verify_password(form_data.password, user.hashed_password):
+    if user is None:
+        verified = Hash().dummy_verify(form_data.password)
+    else:
+        verified = Hash().verify_password(form_data.password, user.hashed_password)
+    if not verified:
+        await login_guard.record_failure(form_data.username, ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not valid password or username",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    await login_guard.record_success(form_data.username)
     if not user.confirmed:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email must be confirmed",
         )
 
-    access_token = await create_access_token(data={"sub": user.username})
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await create_tokens(user, db)
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh_tokens(
+    body: RefreshTokenRequest, db: AsyncSession = Depends(get_directory_db)
+):
+    """
+    Exchange a refresh token for a new access token and refresh token.
+    - **refresh_token**: The refresh token issued by login or a previous refresh.
+    - Every refresh token can be used only once; reusing a rotated token revokes
+      all refresh tokens of the user.
+    """
+    return await rotate_refresh_token(body.refresh_token, db)
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_user(
+    body: RefreshTokenRequest | None = None,
+    payload: dict = Depends(get_token_payload),
+    db: AsyncSession = Depends(get_directory_db),
+):
+    """
+    Log out the current user.
+    - Revokes the access token used for this request.
+    - **refresh_token** (optional): The refresh token to revoke.
+    """
+    await revoke_tokens(payload, body.refresh_token if body else None, db)
 
 
 @router.get("/confirmed_email/{token}")
-async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_directory_db)):
     """
     Confirm a user's email address.
 
@@ -117,7 +167,7 @@ async def request_email(
     body: RequestEmail,
     background_tasks: BackgroundTasks,
     request: Request,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_directory_db),
 ):
     """
     Request a new confirmation email.
@@ -0,0 +1,161 @@
+import asyncio
+import json
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.conf.config import settings
+from src.database.db import get_db
+from src.schemas import BatchRequest, BatchResponse, BatchSubRequest
+from src.services.auth import get_token_payload
+
+router = APIRouter(prefix="/batch", tags=["batch"])
+
+
+async def _dispatch(
+    request: Request, sub_request: BatchSubRequest, state: dict
+) -> dict:
+    """
+    Run one sub-request in process through the ASGI app and collect its response.
+    """
+    url = urlsplit(sub_request.path)
+    body = b"" if sub_request.body is None else json.dumps(sub_request.body).encode()
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    authorization = request.headers.get("authorization")
+    if authorization:
+        headers.append((b"authorization", authorization.encode("latin-1")))
+    scope = {
+        "type": "http",
+        "asgi": request.scope["asgi"],
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": sub_request.method,
+        "scheme": request.scope.get("scheme", "http"),
+        "server": request.scope.get("server"),
+        "client": request.scope.get("client"),
+        "root_path": request.scope.get("root_path", ""),
+        "path": url.path,
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "headers": headers,
+        "state": state,
+        "batch_subrequest": True,
+    }
+
+    request_sent = False
+    response_done = asyncio.Event()
+    response = {"status": 500, "body": bytearray(), "content_type": ""}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            for name, value in message.get("headers", []):
+                if name.lower() == b"content-type":
+                    response["content_type"] = value.decode("latin-1")
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+            if not message.get("more_body", False):
+                response_done.set()
+
+    try:
+        await request.app(scope, receive, send)
+    except Exception as e:
+        # re-raised by the server error middleware after its response, which
+        # must fail this sub-request only
+        print(e)
+        batch_db = state.get("batch_db")
+        if batch_db is not None:
+            # the later sub-requests share the session
+            await batch_db.rollback()
+        return {"status": 500, "body": {"message": "Internal server error"}}
+    content = bytes(response["body"])
+    if response["content_type"].startswith("application/json") and content:
+        content = json.loads(content)
+    else:
+        content = content.decode(errors="replace") or None
+    return {"status": response["status"], "body": content}
+
+
+@router.post("", response_model=BatchResponse)
+async def batch(
+    body: BatchRequest,
+    request: Request,
+    payload: dict = Depends(get_token_payload),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Execute several API requests in one round trip.
+    - `requests`: List of sub-requests with `method`, `path` (including the query string) and optional JSON `body`.
+    - The access token is checked once for the whole batch.
+    - Consecutive `GET` sub-requests run concurrently, up to `BATCH_MAX_CONCURRENCY` at a time; other sub-requests run in order and share one database session.
+    - Responses are returned in the order of the sub-requests.
+    - Up to `BATCH_MAX_REQUESTS` sub-requests, sub-requests not finished within `BATCH_TIMEOUT_SECONDS` get status `504`. A write interrupted by the timeout is rolled back unless it was already committed.
+    """
+    if len(body.requests) > settings.BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch can contain up to {settings.BATCH_MAX_REQUESTS} requests",
+        )
+    if any(sub_request.path.startswith("/api/batch") for sub_request in body.requests):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Batch requests cannot be nested",
+        )
+
+    state = {"batch_payload": payload}
+    shared_state = {**state, "batch_db": db}
+    groups = []
+    for index, sub_request in enumerate(body.requests):
+        if sub_request.method == "GET" and groups and groups[-1][0] == "GET":
+            groups[-1][1].append(index)
+        else:
+            groups.append((sub_request.method, [index]))
+
+    responses = [{"status": 504, "body": {"message": "Batch timeout exceeded"}}] * len(
+        body.requests
+    )
+    # every concurrent GET holds a connection of its own
+    concurrency = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+    writing = None
+
+    async def dispatch_get(index: int) -> dict:
+        async with concurrency:
+            return await _dispatch(request, body.requests[index], dict(state))
+
+    async def run():
+        nonlocal writing
+        for method, indexes in groups:
+            if method == "GET":
+                results = await asyncio.gather(*map(dispatch_get, indexes))
+            else:
+                writing = indexes[0]
+                results = [
+                    await _dispatch(request, body.requests[writing], shared_state)
+                ]
+                writing = None
+            for index, result in zip(indexes, results):
+                responses[index] = result
+
+    try:
+        await asyncio.wait_for(run(), settings.BATCH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        if writing is not None:
+            # cancelled in the middle of its write on the shared session
+            await db.rollback()
+            responses[writing] = {
+                "status": 504,
+                "body": {
+                    "message": "Batch timeout exceeded, uncommitted changes of the request were rolled back"
+                },
+            }
+    return {"responses": responses}
@@ -1,22 +1,67 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Path, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.database.db import get_db
-from src.schemas import ContactModel, ContactResponse, User
+from src.schemas import (
+    CONTACT_FIELDS,
+    ContactMergeRequest,
+    ContactHistoryEntry,
+    ContactMergeResponse,
+    ContactModel,
+    ContactResponse,
+    ContactStats,
+    ContactSuggestion,
+    ContactTagsRequest,
+    DuplicateGroup,
+    TagResponse,
+    User,
+)
 from src.services.auth import get_current_user
 from src.services.contacts import ContactService
 
-
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
 
-@router.get("/", response_model=List[ContactResponse])
+def parse_fields(
+    fields: Optional[str] = Query(
+        None,
+        description=f"Comma-separated fields to return, `id` is always included ({', '.join(CONTACT_FIELDS)})",
+    ),
+) -> Optional[tuple[str, ...]]:
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(CONTACT_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+        )
+    return tuple(
+        field for field in CONTACT_FIELDS if field in requested or field == "id"
+    )
+
+
+@router.get(
+    "/",
+    # rows are serialized by the service, the model documents the response only
+    response_model=None,
+    responses={200: {"model": List[ContactResponse]}},
+)
 async def read_contacts(
     skip: int = Query(0, ge=0, description="Number of records to skip (must be >= 0)"),
     limit: int = Query(
         10, ge=1, le=100, description="Maximum number of records to return (1-100)"
     ),
+    tag: Optional[str] = Query(
+        None, max_length=50, description="Only contacts with this tag"
+    ),
+    include_archived: bool = Query(
+        False, description="Include archived contacts, flagged with `archived`"
+    ),
+    fields: Optional[tuple[str, ...]] = Depends(parse_fields),
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
@@ -24,29 +69,176 @@ async def read_contacts(
     Get a list of contacts with pagination.
     - `skip`: Number of records to skip (default: 0, must be >= 0).
     - `limit`: Maximum number of records to return (default: 10, range: 1-100).
+    - `tag`: Only contacts with this tag (optional).
+    - `include_archived`: Also return archived contacts (default: false).
+    - `fields`: Comma-separated fields to return (optional, default: all fields).
     """
     contact_service = ContactService(db)
-    contacts = await contact_service.get_contacts(skip, limit, user)
-    return contacts
+    contacts = await contact_service.get_contacts(
+        skip, limit, user, fields, tag, include_archived
+    )
+    return JSONResponse(content=contacts)
 
 
-@router.get("/{contact_id}", response_model=ContactResponse)
+@router.get("/suggest", response_model=List[ContactSuggestion])
+async def suggest_contacts(
+    prefix: str = Query(
+        ...,
+        min_length=1,
+        max_length=100,
+        description="Prefix of first name, last name or email (case-insensitive)",
+    ),
+    limit: int = Query(
+        10, ge=1, le=20, description="Maximum number of suggestions to return (1-20)"
+    ),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Typeahead suggestions for contacts whose first name, last name or email starts with `prefix`.
+    - `prefix`: The prefix to match (case-insensitive).
+    - `limit`: Maximum number of suggestions to return (default: 10, range: 1-20).
+    - Returns only the contact id and display name.
+    """
+    contact_service = ContactService(db)
+    return await contact_service.suggest_contacts(prefix, limit, user)
+
+
+@router.get("/stats", response_model=ContactStats)
+async def read_contact_stats(
+    weeks: int = Query(
+        12, ge=1, le=104, description="Number of weeks of `added_per_week` (1-104)"
+    ),
+    domains: int = Query(
+        10, ge=1, le=100, description="Number of top email domains to return (1-100)"
+    ),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Get statistics of the user's contacts, kept up to date on every change rather than computed per request.
+    - `total`: Number of contacts; archived contacts are counted in `archived` only.
+    - `birth_months`: Number of contacts born in each month.
+    - `email_domains`: The most common email domains, most contacts first.
+    - `added_per_week`: Number of contacts created in each of the last `weeks` weeks (default: 12, range: 1-104),
+      keyed by the Monday starting the week; contacts deleted or merged since are not counted.
+    - `domains`: Number of email domains to return (default: 10, range: 1-100).
+    """
+    contact_service = ContactService(db)
+    return await contact_service.get_contact_stats(weeks, domains, user)
+
+
+@router.get("/duplicates", response_model=List[DuplicateGroup])
+async def find_duplicates(
+    skip: int = Query(0, ge=0, description="Number of groups to skip (must be >= 0)"),
+    limit: int = Query(
+        50, ge=1, le=500, description="Maximum number of groups to return (1-500)"
+    ),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Find groups of likely duplicate contacts.
+    - Contacts are grouped when they share the email (case-insensitive), the phone number digits
+      or the first and last name (ignoring case and surrounding whitespace), directly or through other contacts.
+    - `keys` lists which of `email`, `phone` and `name` matched within the group.
+    - `skip`: Number of groups to skip (default: 0, must be >= 0).
+    - `limit`: Maximum number of groups to return (default: 50, range: 1-500).
+    """
+    contact_service = ContactService(db)
+    return await contact_service.find_duplicates(skip, limit, user)
+
+
+@router.post("/merge", response_model=ContactMergeResponse)
+async def merge_contacts(
+    body: ContactMergeRequest,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Merge duplicate contacts in bulk.
+    - `merges`: List of `target_id` and `source_ids`. The target keeps its fields and gains the tags
+      of its sources, the sources are deleted.
+    - Every contact can appear only once in the request.
+    """
+    contact_service = ContactService(db)
+    return await contact_service.merge_contacts(body.merges, user)
+
+
+@router.get("/tags", response_model=List[TagResponse])
+async def read_tags(
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Get the user's tags with the number of contacts tagged with each.
+    """
+    contact_service = ContactService(db)
+    return await contact_service.get_tags(user)
+
+
+@router.post("/tags/{tag}", response_model=TagResponse)
+async def tag_contacts(
+    body: ContactTagsRequest,
+    tag: str = Path(..., min_length=1, max_length=50),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Tag contacts in bulk, creating the tag if it does not exist.
+    - `tag`: The tag name.
+    - `contact_ids`: IDs of the contacts to tag (up to 1000); unknown IDs are ignored.
+    """
+    contact_service = ContactService(db)
+    return await contact_service.tag_contacts(tag, body.contact_ids, user)
+
+
+@router.delete("/tags/{tag}", response_model=TagResponse)
+async def untag_contacts(
+    body: ContactTagsRequest | None = None,
+    tag: str = Path(..., min_length=1, max_length=50),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Remove a tag from contacts in bulk.
+    - `tag`: The tag name.
+    - `contact_ids`: IDs of the contacts to untag (optional). Without a body the tag itself is deleted.
+    """
+    contact_service = ContactService(db)
+    tag_counts = await contact_service.untag_contacts(
+        tag, body.contact_ids if body else None, user
+    )
+    if tag_counts is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Tag not found"
+        )
+    return tag_counts
+
+
+@router.get(
+    "/{contact_id}",
+    response_model=None,
+    responses={200: {"model": ContactResponse}},
+)
 async def read_contact(
     contact_id: int,
+    fields: Optional[tuple[str, ...]] = Depends(parse_fields),
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
     """
     Get a single contact by its ID.
     - `contact_id`: The ID of the contact to retrieve.
+    - `fields`: Comma-separated fields to return (optional, default: all fields).
     """
     contact_service = ContactService(db)
-    contact = await contact_service.get_contact(contact_id, user)
+    contact = await contact_service.get_contact(contact_id, user, fields)
     if contact is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found"
         )
-    return contact
+    return JSONResponse(content=contact)
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED)
@@ -84,6 +276,48 @@ async def update_contact(
     return contact
 
 
+@router.post("/{contact_id}/restore", response_model=ContactResponse)
+async def restore_contact(
+    contact_id: int,
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Move an archived contact back to the active contacts, with its tags.
+    - `contact_id`: The ID of the archived contact.
+    """
+    contact_service = ContactService(db)
+    contact = await contact_service.restore_contact(contact_id, user)
+    if contact is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Archived contact not found"
+        )
+    return contact
+
+
+@router.get("/{contact_id}/history", response_model=List[ContactHistoryEntry])
+async def read_contact_history(
+    contact_id: int,
+    skip: int = Query(0, ge=0, description="Number of entries to skip (must be >= 0)"),
+    limit: int = Query(
+        20, ge=1, le=100, description="Maximum number of entries to return (1-100)"
+    ),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Get the change history of a contact, newest first. Deleted contacts keep their history.
+    - `contact_id`: The ID of the contact.
+    - `skip`: Number of entries to skip (default: 0, must be >= 0).
+    - `limit`: Maximum number of entries to return (default: 20, range: 1-100).
+    - `changes` maps each changed field to its `[before, after]` values; `actor_id` is
+      the user who made the change, empty for changes made by the archiver.
+    - Changes are written in the background and show up within `AUDIT_FLUSH_SECONDS`.
+    """
+    contact_service = ContactService(db)
+    return await contact_service.get_contact_history(contact_id, skip, limit, user)
+
+
 @router.delete("/{contact_id}", response_model=ContactResponse)
 async def remove_contact(
     contact_id: int,
@@ -103,7 +337,11 @@ async def remove_contact(
     return contact
 
 
-@router.get("/search/", response_model=List[ContactResponse])
+@router.get(
+    "/search/",
+    response_model=None,
+    responses={200: {"model": List[ContactResponse]}},
+)
 async def search_contacts(
     skip: int = Query(0, ge=0, description="Number of records to skip (must be >= 0)"),
     limit: int = Query(
@@ -118,6 +356,19 @@ async def search_contacts(
     email: Optional[str] = Query(
         None, description="Filter contacts by email address (case-insensitive)"
     ),
+    phone: Optional[str] = Query(
+        None,
+        max_length=30,
+        pattern=r"^[+\d\s().-]*\d[\d\s().-]*\*?$",
+        description="Filter contacts by phone number digits, a trailing `*` matches by prefix",
+    ),
+    tag: Optional[str] = Query(
+        None, max_length=50, description="Only contacts with this tag"
+    ),
+    include_archived: bool = Query(
+        False, description="Include archived contacts, flagged with `archived`"
+    ),
+    fields: Optional[tuple[str, ...]] = Depends(parse_fields),
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
@@ -128,15 +379,33 @@ async def search_contacts(
     - `first_name`: Filter by first name (optional).
     - `last_name`: Filter by last name (optional).
     - `email`: Filter by email address (optional).
+    - `phone`: Filter by phone number (optional). Only its digits are compared, so
+      `+38 (050) 123-45-67` finds `+380501234567`; end it with `*` to match by prefix.
+    - `tag`: Only contacts with this tag (optional).
+    - `include_archived`: Also return archived contacts (default: false).
+    - `fields`: Comma-separated fields to return (optional, default: all fields).
     """
     contact_service = ContactService(db)
     contacts = await contact_service.search_contacts(
-        skip, limit, first_name, last_name, email, user
+        skip,
+        limit,
+        first_name,
+        last_name,
+        email,
+        user,
+        fields,
+        tag,
+        phone,
+        include_archived,
     )
-    return contacts
+    return JSONResponse(content=contacts)
 
 
-@router.get("/birthdays/", response_model=List[ContactResponse])
+@router.get(
+    "/birthdays/",
+    response_model=None,
+    responses={200: {"model": List[ContactResponse]}},
+)
 async def get_upcoming_birthdays(
     days: int = Query(
         7,
@@ -148,6 +417,7 @@ async def get_upcoming_birthdays(
     limit: int = Query(
         10, ge=1, le=100, description="Maximum number of records to return (1-100)"
     ),
+    fields: Optional[tuple[str, ...]] = Depends(parse_fields),
     db: AsyncSession = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
@@ -156,7 +426,10 @@ async def get_upcoming_birthdays(
     - `days`: Number of days to look ahead for birthdays (default: 7, range: 1-364).
     - `skip`: Number of records to skip (default: 0, must be >= 0).
     - `limit`: Maximum number of records to return (default: 10, range: 1-100).
+    - `fields`: Comma-separated fields to return (optional, default: all fields).
     """
     contact_service = ContactService(db)
-    contacts = await contact_service.get_upcoming_birthdays(days, skip, limit, user)
-    return contacts
+    contacts = await contact_service.get_upcoming_birthdays(
+        days, skip, limit, user, fields
+    )
+    return JSONResponse(content=contacts)
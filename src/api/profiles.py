@@ -0,0 +1,46 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import FileResponse
+
+from src.conf.config import settings
+from src.services.profiling import profile_store, profiling_token_matches
+
+router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+
+async def require_profiling_admin(
+    x_profile_token: Optional[str] = Header(default=None),
+):
+    # the header as sent, the middleware compares the raw bytes too
+    header = None if x_profile_token is None else x_profile_token.encode("latin-1")
+    if not profiling_token_matches(header, settings.PROFILING_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Profiles are available to administrators only",
+        )
+
+
+@router.get("/", dependencies=[Depends(require_profiling_admin)])
+async def list_profiles():
+    """
+    List captured request profiles, newest first.
+    - Requires the `X-Profile-Token` header set to `PROFILING_TOKEN`.
+    - Returns the `name`, `size` in bytes and `created_at` (Unix time) of each profile.
+    """
+    return profile_store.list()
+
+
+@router.get("/{name}", dependencies=[Depends(require_profiling_admin)])
+async def download_profile(name: str):
+    """
+    Download one profile in the collapsed stack format.
+    - `name`: profile name from the list or from the `X-Profile-Id` response header.
+    - Render it with `flamegraph.pl`, speedscope or inferno.
+    """
+    path = profile_store.path(name)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found"
+        )
+    return FileResponse(path, media_type="text/plain", filename=name)
@@ -1,12 +1,13 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from src.schemas import User
 from src.services.auth import get_current_user
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from fastapi import UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.database.db import get_db
+from src.database.db import get_directory_db
 from src.conf.config import settings
+from src.services.avatars import avatar_proxy
 from src.services.users import UserService
 from src.services.upload_file import UploadFileService
 
@@ -16,20 +17,64 @@ limiter = Limiter(key_func=get_remote_address)
 
 @router.get("/me", response_model=User)
 @limiter.limit("5/minute")
-async def me(request: Request, user: User = Depends(get_current_user)):
+async def me(
+    request: Request,
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_directory_db),
+):
     """
     Get details of the currently authenticated user.
     - Requires a valid access token in the `Authorization` header.
     - Requests are limited up to 5 per minute.
     """
-    return user
+    return await UserService(db).get_user_by_id(user.id)
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # weak comparison, as for GET
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+@router.get(
+    "/{user_id}/avatar",
+    response_class=Response,
+    responses={200: {"content": {"image/*": {}}}, 304: {}},
+)
+async def read_avatar(
+    user_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_directory_db),
+):
+    """
+    Get the avatar image of a user through the API's cache instead of Cloudinary or Gravatar.
+    - `user_id`: The ID of the user.
+    - No access token is needed, so the URL works as an `<img>` source.
+    - Responses carry an `ETag` and are cacheable for `AVATAR_MAX_AGE_SECONDS`; send `If-None-Match`
+      to get `304 Not Modified` when the image has not changed.
+    """
+    user = await UserService(db).get_user_by_id(user_id)
+    avatar = await avatar_proxy.get(user.avatar) if user and user.avatar else None
+    if avatar is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Avatar not found"
+        )
+    headers = {
+        "ETag": avatar.etag,
+        "Cache-Control": f"public, max-age={settings.AVATAR_MAX_AGE_SECONDS}",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), avatar.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(avatar.content, media_type=avatar.content_type, headers=headers)
 
 
 @router.patch("/avatar", response_model=User)
 async def update_avatar_user(
     file: UploadFile = File(),
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_directory_db),
 ):
     """
     Update the avatar of the authenticated user by uploading a new image file.
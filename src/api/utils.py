@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import JSONResponse
 from src.schemas import HealthCheckResponse
-from src.database.db import get_db
+from src.middleware.admission import admission_controller
+from src.services.avatars import avatar_proxy
+from src.services.cache import result_cache
+from src.services.health import health_monitor
+from src.services.login_guard import login_guard
 
 router = APIRouter(tags=["utils"])
 
@@ -27,23 +30,74 @@ router = APIRouter(tags=["utils"])
         },
     },
 )
-async def healthchecker(db: AsyncSession = Depends(get_db)):
+async def healthchecker():
     """
     Health check endpoint to verify database connection.
+    - Answered from the last background health check, it does not query the database.
     """
-    try:
-        result = await db.execute(text("SELECT 1"))
-        result = result.scalar_one_or_none()
-
-        if result is None:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Database is not configured correctly",
-            )
-        return {"message": "Welcome to ContactAPI!"}
-    except Exception as e:
-        print(e)
+    if not health_monitor.is_ready():
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error connecting to the database",
         )
+    return {"message": "Welcome to ContactAPI!"}
+
+
+@router.get("/livez")
+async def livez():
+    """
+    Liveness probe. Performs no I/O.
+    """
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz():
+    """
+    Readiness probe answered from the last background health check.
+    - Reports database latency and pool saturation and mail server reachability.
+    - Returns `503` when a database is unreachable or the last check is stale.
+    """
+    return JSONResponse(
+        status_code=(
+            status.HTTP_200_OK
+            if health_monitor.is_ready()
+            else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+        content=health_monitor.status,
+    )
+
+
+@router.get("/metrics/admission")
+async def admission_metrics():
+    """
+    Admission control metrics: global and per route class in-flight requests,
+    queue lengths, admitted and rejected counters and average queue wait.
+    """
+    return admission_controller.metrics()
+
+
+@router.get("/metrics/cache")
+async def cache_metrics():
+    """
+    Result cache metrics: hits, misses, hit ratio and memory use.
+    """
+    return result_cache.stats()
+
+
+@router.get("/metrics/avatars")
+async def avatar_metrics():
+    """
+    Avatar proxy metrics: memory and disk cache hits, origin fetches, misses
+    that waited for another request's fetch, fetch errors and cache sizes.
+    """
+    return avatar_proxy.stats()
+
+
+@router.get("/metrics/login")
+async def login_metrics():
+    """
+    Login guard metrics: attempts, failures, lockouts, attempts rejected while
+    locked out, and the number of tracked and locked usernames and IP addresses.
+    """
+    return login_guard.metrics()
@@ -0,0 +1,33 @@
+"""
+Contact archive commands.
+
+    python -m src.cli.archive run
+    python -m src.cli.archive run --after-days 365
+"""
+
+import argparse
+import asyncio
+
+from src.database.db import sessionmanager, shard_managers
+from src.services.archive import contact_archiver
+
+
+async def main(args) -> None:
+    try:
+        if args.command == "run":
+            moved = await contact_archiver.run(args.after_days)
+            print(f"Archived {moved} contacts")
+    finally:
+        managers = [sessionmanager, *shard_managers]
+        for manager in {id(manager): manager for manager in managers}.values():
+            await manager._engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Contact archive commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run = subparsers.add_parser(
+        "run", help="Archive contacts not updated for ARCHIVE_AFTER_DAYS days"
+    )
+    run.add_argument("--after-days", type=int, default=None)
+    asyncio.run(main(parser.parse_args()))
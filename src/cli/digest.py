@@ -0,0 +1,34 @@
+"""
+Birthday digest commands.
+
+    python -m src.cli.digest send
+    python -m src.cli.digest send --date 2026-10-19
+"""
+
+import argparse
+import asyncio
+from datetime import date
+
+from src.database.db import sessionmanager, shard_managers
+from src.services.digest import birthday_digest_job
+
+
+async def main(args) -> None:
+    try:
+        if args.command == "send":
+            sent = await birthday_digest_job.run(args.date)
+            print(f"Sent {sent} birthday digests for {args.date or date.today()}")
+    finally:
+        managers = [sessionmanager, *shard_managers]
+        for manager in {id(manager): manager for manager in managers}.values():
+            await manager._engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Birthday digest commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    send = subparsers.add_parser(
+        "send", help="Send the day's digests, resuming an interrupted run"
+    )
+    send.add_argument("--date", type=date.fromisoformat, default=None)
+    asyncio.run(main(parser.parse_args()))
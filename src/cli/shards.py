@@ -0,0 +1,56 @@
+"""
+Shard maintenance commands.
+
+    python -m src.cli.shards move --user-id 42 --to-shard 1
+    python -m src.cli.shards configure-sequences
+"""
+
+import argparse
+import asyncio
+
+from src.conf.config import settings
+from src.database.db import shard_managers
+from src.services.shards import move_user, configure_sequences
+
+
+async def main(args) -> None:
+    try:
+        if args.command == "move":
+            if not 0 <= args.to_shard < len(shard_managers):
+                raise SystemExit(f"Shard must be in range 0-{len(shard_managers) - 1}")
+            moved = await move_user(
+                args.user_id,
+                args.to_shard,
+                args.batch_size,
+                settings.JWT_EXPIRATION_SECONDS if args.wait_for_tokens else 0,
+            )
+            print(
+                f"Moved {moved} contacts of user {args.user_id} to shard {args.to_shard}"
+            )
+        elif args.command == "configure-sequences":
+            await configure_sequences()
+            print(f"Configured contact id sequences on {len(shard_managers)} shards")
+    finally:
+        for manager in {id(manager): manager for manager in shard_managers}.values():
+            await manager._engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shard maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    move = subparsers.add_parser(
+        "move", help="Move one user's contacts to another shard"
+    )
+    move.add_argument("--user-id", type=int, required=True)
+    move.add_argument("--to-shard", type=int, required=True)
+    move.add_argument("--batch-size", type=int, default=1000)
+    move.add_argument(
+        "--wait-for-tokens",
+        action="store_true",
+        help="When moving off the directory database, wait for access tokens issued "
+        "before the move to expire and move what they wrote",
+    )
+    subparsers.add_parser(
+        "configure-sequences", help="Make contact ids unique across shards"
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,34 @@
+"""
+Refresh token commands.
+
+    python -m src.cli.tokens purge
+    python -m src.cli.tokens purge --batch-size 5000
+"""
+
+import argparse
+import asyncio
+
+from src.database.db import sessionmanager
+from src.services.users import UserService
+
+
+async def main(args) -> None:
+    try:
+        if args.command == "purge":
+            async with sessionmanager.session() as session:
+                purged = await UserService(session).purge_expired_refresh_tokens(
+                    args.batch_size
+                )
+            print(f"Purged {purged} expired refresh tokens")
+    finally:
+        await sessionmanager._engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh token commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    purge = subparsers.add_parser(
+        "purge", help="Delete the expired refresh tokens of every user"
+    )
+    purge.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -1,12 +1,16 @@
+from typing import Literal
+
 from pydantic import ConfigDict, EmailStr
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     DB_URL: str
+    DB_SHARD_URLS: list[str] = []
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
-    JWT_EXPIRATION_SECONDS: int = 3600
+    JWT_EXPIRATION_SECONDS: int = 900
+    JWT_REFRESH_EXPIRATION_SECONDS: int = 1209600
     model_config = ConfigDict(
         extra="ignore", env_file=".env", env_file_encoding="utf-8"
     )
@@ -23,6 +27,80 @@ class Settings(BaseSettings):
     CLOUDINARY_NAME: str
     CLOUDINARY_API_KEY: int
     CLOUDINARY_API_SECRET: str
+    SUGGEST_INDEX_ENABLED: bool = False
+    SUGGEST_INDEX_MAX_USERS: int = 1000
+    SUGGEST_INDEX_TTL_SECONDS: int = 60
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESULT_CACHE_TTL_SECONDS: int = 300
+    RESULT_CACHE_REDIS_URL: str | None = None
+    BATCH_MAX_REQUESTS: int = 20
+    BATCH_TIMEOUT_SECONDS: float = 10.0
+    BATCH_MAX_CONCURRENCY: int = 4
+    HEALTH_CHECK_INTERVAL_SECONDS: float = 5.0
+    HEALTH_CHECK_TIMEOUT_SECONDS: float = 2.0
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_IN_FLIGHT: int = 32
+    ADMISSION_PER_USER_LIMIT: int = 8
+    ADMISSION_READ_LIMIT: int = 20
+    ADMISSION_SEARCH_LIMIT: int = 8
+    ADMISSION_AUTH_LIMIT: int = 4
+    ADMISSION_UPLOAD_LIMIT: int = 4
+    ADMISSION_QUEUE_SIZE: int = 64
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0
+    ADMISSION_UPLOAD_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    LOGIN_GUARD_ENABLED: bool = True
+    LOGIN_GUARD_USERNAME_THRESHOLD: int = 5
+    LOGIN_GUARD_IP_THRESHOLD: int = 20
+    LOGIN_GUARD_BASE_LOCKOUT_SECONDS: float = 30.0
+    LOGIN_GUARD_MAX_LOCKOUT_SECONDS: float = 3600.0
+    LOGIN_GUARD_WINDOW_SECONDS: int = 3600
+    LOGIN_GUARD_MAX_ENTRIES: int = 100000
+    LOGIN_GUARD_REDIS_URL: str | None = None
+    BIRTHDAY_DIGEST_ENABLED: bool = False
+    BIRTHDAY_DIGEST_HOUR: int = 8
+    BIRTHDAY_DIGEST_DAYS: int = 7
+    BIRTHDAY_DIGEST_MAX_CONTACTS: int = 50
+    BIRTHDAY_DIGEST_BATCH_SIZE: int = 500
+    BIRTHDAY_DIGEST_CONCURRENCY: int = 10
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_AFTER_DAYS: int = 730
+    ARCHIVE_BATCH_SIZE: int = 500
+    ARCHIVE_BATCH_PAUSE_SECONDS: float = 0.1
+    ARCHIVE_INTERVAL_SECONDS: float = 86400
+    AUDIT_ENABLED: bool = True
+    AUDIT_QUEUE_SIZE: int = 10000
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_SECONDS: float = 1.0
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_THREAD_CUTOFF: int = 65536
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    AVATAR_ORIGIN: Literal["http", "local"] = "http"
+    AVATAR_LOCAL_DIR: str = "avatars"
+    AVATAR_CACHE_DIR: str = "avatar_cache"
+    AVATAR_MEMORY_CACHE_BYTES: int = 16 * 1024 * 1024
+    AVATAR_DISK_CACHE_BYTES: int = 512 * 1024 * 1024
+    AVATAR_MAX_BYTES: int = 2 * 1024 * 1024
+    AVATAR_FETCH_TIMEOUT_SECONDS: float = 5.0
+    AVATAR_MAX_AGE_SECONDS: int = 3600
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATE: float = 0.01
+    TRACING_TRUST_PARENT: bool = False
+    TRACING_EXPORTER: Literal["console", "file"] = "file"
+    TRACING_FILE_PATH: str = "traces.jsonl"
+    TRACING_FILE_MAX_BYTES: int = 100 * 1024 * 1024
+    TRACING_EXPORT_QUEUE_SIZE: int = 1000
+    TRACING_SERVICE_NAME: str = "contacts-api"
+    PROFILING_ENABLED: bool = False
+    PROFILING_TOKEN: str | None = None
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_INTERVAL_SECONDS: float = 0.005
+    PROFILING_MAX_CONCURRENT: int = 2
+    PROFILING_DIR: str = "profiles"
+    PROFILING_MAX_FILES: int = 100
 
 
 settings = Settings()
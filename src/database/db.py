@@ -1,7 +1,17 @@
 import contextlib
+import zlib
+
+from fastapi import Depends, Request
+
 from src.conf.config import settings
+from src.schemas import User
+from src.services.auth import get_current_user
+from src.services.tracing import tracer
 
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     async_sessionmaker,
@@ -9,13 +19,37 @@ from sqlalchemy.ext.asyncio import (
 )
 
 
+def _enable_sqlite_fks(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
 class DatabaseSessionManager:
     def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url)
+        self._engine: AsyncEngine | None = create_async_engine(
+            url, **self._engine_options(url)
+        )
+        if self._engine.dialect.name == "sqlite":
+            event.listen(self._engine.sync_engine, "connect", _enable_sqlite_fks)
+        if settings.TRACING_ENABLED:
+            tracer.instrument_engine(self._engine.sync_engine)
         self._session_maker: async_sessionmaker = async_sessionmaker(
             autoflush=False, autocommit=False, bind=self._engine
         )
 
+    @staticmethod
+    def _engine_options(url: str) -> dict:
+        url = make_url(url)
+        if url.get_backend_name() == "sqlite" and url.database in (
+            None,
+            "",
+            ":memory:",
+        ):
+            # share one connection, otherwise each session gets its own empty database
+            return {"poolclass": StaticPool}
+        return {}
+
     @contextlib.asynccontextmanager
     async def session(self):
         if self._session_maker is None:
@@ -31,8 +65,30 @@ class DatabaseSessionManager:
 
 
 sessionmanager = DatabaseSessionManager(settings.DB_URL)
+shard_managers = [
+    sessionmanager if url == settings.DB_URL else DatabaseSessionManager(url)
+    for url in settings.DB_SHARD_URLS
+] or [sessionmanager]
 
 
-async def get_db():
+def shard_for_user(username: str) -> int:
+    """
+    Default shard of a user, assigned at registration and stored in `users.shard`.
+    """
+    return zlib.crc32(username.encode()) % len(shard_managers)
+
+
+async def get_directory_db():
     async with sessionmanager.session() as session:
         yield session
+
+
+async def get_db(request: Request, user: User = Depends(get_current_user)):
+    # sequential sub-requests of a batch share the batch session
+    batch_db = getattr(request.state, "batch_db", None)
+    if batch_db is not None:
+        yield batch_db
+        return
+    shard = user.shard if user.shard is not None else shard_for_user(user.username)
+    async with shard_managers[shard].session() as session:
+        yield session
@@ -1,24 +1,51 @@
+import re
 from datetime import datetime, date
 
-from sqlalchemy import Column, Integer, String, Boolean, func, Table
-from sqlalchemy.orm import relationship, mapped_column, Mapped, DeclarativeBase
-from sqlalchemy.sql.schema import ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, JSON, func, Table
+from sqlalchemy.orm import (
+    relationship,
+    mapped_column,
+    Mapped,
+    DeclarativeBase,
+    validates,
+)
+from sqlalchemy.sql.schema import (
+    ForeignKey,
+    ForeignKeyConstraint,
+    Index,
+    UniqueConstraint,
+)
 from sqlalchemy.sql.sqltypes import DateTime, Date
 
 
+def normalize_phone(phone: str) -> str:
+    """
+    Digits of a phone number as typed, e.g. "+38 (050) 123-45-67" -> "380501234567".
+    """
+    return re.sub(r"\D", "", phone)
+
+
 class Base(DeclarativeBase):
     pass
 
 
 class Contact(Base):
     __tablename__ = "contacts"
-    __table_args__ = (UniqueConstraint("email", "user_id", name="unique_email_user"),)
+    __table_args__ = (
+        UniqueConstraint("email", "user_id", name="unique_email_user"),
+        # target of the contact_tags foreign key; the partitioned Postgres
+        # table has (id, user_id) as its primary key and skips this index
+        Index("ix_contacts_id_user_id", "id", "user_id", unique=True),
+        # archived contacts keep their ids, SQLite must not hand them out again
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     first_name: Mapped[str] = mapped_column(String(50), nullable=False)
     last_name: Mapped[str] = mapped_column(String(50), nullable=False)
     email: Mapped[str] = mapped_column(String(100))
     phone: Mapped[str] = mapped_column(String(15), nullable=False)
+    phone_digits: Mapped[str | None] = mapped_column(String(15), nullable=True)
     birthday: Mapped[date] = mapped_column(Date)
     created_at: Mapped[datetime] = mapped_column(
         "created_at", DateTime, default=func.now()
@@ -31,6 +58,11 @@ class Contact(Base):
     )
     user = relationship("User", backref="contacts")
 
+    @validates("phone")
+    def _set_phone_digits(self, key, phone):
+        self.phone_digits = normalize_phone(phone)
+        return phone
+
 
 class User(Base):
     __tablename__ = "users"
@@ -41,3 +73,159 @@ class User(Base):
     created_at = Column(DateTime, default=func.now())
     avatar = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
+    shard = Column(Integer, nullable=True)
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        Index("ix_refresh_tokens_user_id_expires_at", "user_id", "expires_at"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(
+        "user_id", ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    token_hash = Column(String(64), unique=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    revoked = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+
+class Tag(Base):
+    __tablename__ = "tags"
+    __table_args__ = (UniqueConstraint("user_id", "name", name="unique_tag_user"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(50), nullable=False)
+    user_id = Column(
+        "user_id", ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        "created_at", DateTime, default=func.now()
+    )
+
+
+# the primary key (tag_id, contact_id) serves tag filters and per-tag counts;
+# user_id is part of the contact reference because the partitioned contacts
+# table is unique on (id, user_id) only
+contact_tags = Table(
+    "contact_tags",
+    Base.metadata,
+    Column("tag_id", ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Column("contact_id", Integer, primary_key=True),
+    Column("user_id", Integer, nullable=False),
+    ForeignKeyConstraint(
+        ["contact_id", "user_id"],
+        ["contacts.id", "contacts.user_id"],
+        ondelete="CASCADE",
+    ),
+    Index("ix_contact_tags_contact_id_user_id", "contact_id", "user_id"),
+)
+
+
+class ArchivedContact(Base):
+    """
+    Contacts not updated for a long time, moved out of `contacts` by the
+    archiver so the hot table and its indexes only hold contacts in use.
+    Rows keep their contact ids and move back unchanged on restore.
+    """
+
+    __tablename__ = "archived_contacts"
+    __table_args__ = (Index("ix_archived_contacts_user_id_id", "user_id", "id"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    first_name: Mapped[str] = mapped_column(String(50), nullable=False)
+    last_name: Mapped[str] = mapped_column(String(50), nullable=False)
+    email: Mapped[str] = mapped_column(String(100))
+    phone: Mapped[str] = mapped_column(String(15), nullable=False)
+    phone_digits: Mapped[str | None] = mapped_column(String(15), nullable=True)
+    birthday: Mapped[date] = mapped_column(Date)
+    created_at: Mapped[datetime] = mapped_column("created_at", DateTime)
+    updated_at: Mapped[datetime] = mapped_column("updated_at", DateTime)
+    user_id = Column(
+        "user_id", ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    archived_at: Mapped[datetime] = mapped_column(
+        "archived_at", DateTime, default=func.now()
+    )
+
+
+# tags of archived contacts, restored with them
+archived_contact_tags = Table(
+    "archived_contact_tags",
+    Base.metadata,
+    Column("tag_id", ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Column(
+        "contact_id",
+        ForeignKey("archived_contacts.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Index("ix_archived_contact_tags_contact_id", "contact_id"),
+)
+
+
+class ContactAudit(Base):
+    """
+    History of contact changes, written in batches by the audit log writer.
+    `changes` maps each changed field to its `[before, after]` values;
+    `actor_id` is the user who made the change, None for background jobs.
+    Rows outlive their contact, so `contact_id` is not a foreign key.
+    """
+
+    __tablename__ = "contact_audit"
+    __table_args__ = (
+        Index("ix_contact_audit_user_id_contact_id_id", "user_id", "contact_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    contact_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    user_id = Column(
+        "user_id", ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    actor_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    action: Mapped[str] = mapped_column(String(20), nullable=False)
+    changes = Column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column("created_at", DateTime, nullable=False)
+
+
+class ContactStat(Base):
+    """
+    Per-user contact aggregates, kept up to date in the transaction of every
+    contact write: the number of contacts with each `(kind, key)`, e.g.
+    `("birth_month", "04")` or `("email_domain", "example.com")`.
+    Rows are not deleted when they drop to zero.
+    """
+
+    __tablename__ = "contact_stats"
+    user_id = Column(
+        "user_id", ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    kind: Mapped[str] = mapped_column(String(20), primary_key=True)
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    contacts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class BirthdayDigest(Base):
+    """
+    One row per digest sent, claimed before sending so a user never gets
+    the same day's digest twice.
+    """
+
+    __tablename__ = "birthday_digests"
+    user_id = Column(
+        "user_id", ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    digest_date = Column(Date, primary_key=True)
+    sent_at = Column(DateTime, default=func.now())
+
+
+class DigestCheckpoint(Base):
+    """
+    Progress of a day's digest run: users up to `last_user_id` are done.
+    """
+
+    __tablename__ = "digest_checkpoints"
+    digest_date = Column(Date, primary_key=True)
+    last_user_id = Column(Integer, nullable=False, default=0)
+    completed = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -0,0 +1,271 @@
+import asyncio
+import json
+import math
+import time
+from dataclasses import dataclass, field
+
+from jose import JWTError, jwt
+
+from src.conf.config import settings
+
+
+@dataclass
+class RouteClass:
+    name: str
+    max_in_flight: int
+    max_queue: int
+    queue_timeout: float
+    semaphore: asyncio.Semaphore = field(init=False)
+    in_flight: int = 0
+    waiting: int = 0
+    admitted: int = 0
+    rejected_queue_full: int = 0
+    rejected_timeout: int = 0
+    rejected_user_limit: int = 0
+    total_wait_seconds: float = 0.0
+
+    def __post_init__(self):
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    def metrics(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "rejected_user_limit": self.rejected_user_limit,
+            "avg_wait_ms": (
+                round(self.total_wait_seconds * 1000 / self.admitted, 3)
+                if self.admitted
+                else 0.0
+            ),
+        }
+
+
+class AdmissionController:
+    """
+    Bounds the number of requests that run concurrently, globally, per route
+    class and per client. Requests over a class limit wait in a bounded queue
+    until their deadline; a full queue or an expired deadline is rejected
+    straight away so callers never wait on the database pool without bound.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        per_user_limit: int,
+        route_classes: dict[str, RouteClass],
+    ):
+        self.max_in_flight = max_in_flight
+        self.per_user_limit = per_user_limit
+        self.route_classes = route_classes
+        self._global = asyncio.Semaphore(max_in_flight)
+        self._per_user: dict[str, int] = {}
+        self.in_flight = 0
+
+    @staticmethod
+    async def _acquire(semaphore: asyncio.Semaphore, deadline: float) -> None:
+        if not semaphore.locked():
+            await semaphore.acquire()
+            return
+        await asyncio.wait_for(semaphore.acquire(), max(deadline - time.monotonic(), 0))
+
+    async def acquire(self, route_class: RouteClass, client_key: str) -> str | None:
+        """
+        Admit a request. Returns None on success or the rejection reason.
+        """
+        if self._per_user.get(client_key, 0) >= self.per_user_limit:
+            route_class.rejected_user_limit += 1
+            return "user_limit"
+        if (
+            route_class.semaphore.locked() or self._global.locked()
+        ) and route_class.waiting >= route_class.max_queue:
+            route_class.rejected_queue_full += 1
+            return "queue_full"
+
+        self._per_user[client_key] = self._per_user.get(client_key, 0) + 1
+        started = time.monotonic()
+        deadline = started + route_class.queue_timeout
+        route_class.waiting += 1
+        class_acquired = False
+        try:
+            await self._acquire(route_class.semaphore, deadline)
+            class_acquired = True
+            await self._acquire(self._global, deadline)
+        except BaseException as e:
+            # timeouts, and cancellation when the client goes away while queued
+            if class_acquired:
+                route_class.semaphore.release()
+            self._release_client(client_key)
+            if isinstance(e, asyncio.TimeoutError):
+                route_class.rejected_timeout += 1
+                return "timeout"
+            raise
+        finally:
+            route_class.waiting -= 1
+
+        route_class.admitted += 1
+        route_class.in_flight += 1
+        route_class.total_wait_seconds += time.monotonic() - started
+        self.in_flight += 1
+        return None
+
+    def _release_client(self, client_key: str) -> None:
+        count = self._per_user.get(client_key, 0) - 1
+        if count > 0:
+            self._per_user[client_key] = count
+        else:
+            self._per_user.pop(client_key, None)
+
+    def release(self, route_class: RouteClass, client_key: str) -> None:
+        self._release_client(client_key)
+        self.in_flight -= 1
+        route_class.in_flight -= 1
+        self._global.release()
+        route_class.semaphore.release()
+
+    def metrics(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "per_user_limit": self.per_user_limit,
+            "active_clients": len(self._per_user),
+            "route_classes": {
+                name: route_class.metrics()
+                for name, route_class in self.route_classes.items()
+            },
+        }
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware applying `AdmissionController` limits to `/api` requests.
+    `classify` maps a request (method, path) to a route class name.
+    """
+
+    def __init__(self, app, controller: AdmissionController, classify, exempt=()):
+        self.app = app
+        self.controller = controller
+        self.classify = classify
+        self.exempt = tuple(exempt)
+
+    @staticmethod
+    def _client_key(scope) -> str:
+        """
+        The user id of a valid bearer token, so every token of a user shares
+        the user's limit; the client address otherwise.
+        """
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer":
+                    break
+                try:
+                    payload = jwt.decode(
+                        token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM]
+                    )
+                except JWTError:
+                    break
+                if payload.get("type") == "access" and payload.get("uid") is not None:
+                    return f"user:{payload['uid']}"
+                break
+        client = scope.get("client")
+        return client[0] if client else "anonymous"
+
+    async def _reject(self, send, status_code: int, retry_after: int, message: str):
+        body = json.dumps({"message": message}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status_code,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or not path.startswith("/api/")
+            or path.startswith(self.exempt)
+            or scope.get("batch_subrequest")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.controller.route_classes[
+            self.classify(scope["method"], path)
+        ]
+        client_key = self._client_key(scope)
+        rejection = await self.controller.acquire(route_class, client_key)
+        if rejection == "user_limit":
+            await self._reject(
+                send, 429, 1, "Too many concurrent requests. Please, try again later"
+            )
+            return
+        if rejection is not None:
+            await self._reject(
+                send,
+                503,
+                max(math.ceil(route_class.queue_timeout), 1),
+                "Service is overloaded. Please, try again later",
+            )
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class, client_key)
+
+
+def classify_request(method: str, path: str) -> str:
+    if path.startswith(("/api/auth/login", "/api/auth/register")):
+        return "auth"
+    if path.startswith("/api/users/avatar"):
+        return "upload"
+    if path.startswith(
+        ("/api/contacts/search/", "/api/contacts/suggest", "/api/contacts/birthdays/")
+    ):
+        return "search"
+    return "read"
+
+
+admission_controller = AdmissionController(
+    settings.ADMISSION_MAX_IN_FLIGHT,
+    settings.ADMISSION_PER_USER_LIMIT,
+    {
+        name: RouteClass(
+            name, max_in_flight, settings.ADMISSION_QUEUE_SIZE, queue_timeout
+        )
+        for name, max_in_flight, queue_timeout in (
+            (
+                "read",
+                settings.ADMISSION_READ_LIMIT,
+                settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+            ),
+            (
+                "search",
+                settings.ADMISSION_SEARCH_LIMIT,
+                settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+            ),
+            (
+                "auth",
+                settings.ADMISSION_AUTH_LIMIT,
+                settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+            ),
+            (
+                "upload",
+                settings.ADMISSION_UPLOAD_LIMIT,
+                settings.ADMISSION_UPLOAD_QUEUE_TIMEOUT_SECONDS,
+            ),
+        )
+    },
+)
@@ -0,0 +1,203 @@
+import asyncio
+import zlib
+from functools import lru_cache
+
+from starlette.datastructures import MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        # wbits 31: deflate in a gzip container
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        )
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        output = self._compressor.process(data)
+        return output + (
+            self._compressor.finish() if final else self._compressor.flush()
+        )
+
+
+class ZstdEncoder:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_FINISH
+            if final
+            else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+
+def available_encoders(gzip_level: int, brotli_quality: int, zstd_level: int) -> dict:
+    """
+    Encoder factories by content coding, most preferred first. zstd and br
+    need the optional `zstandard` and `brotli` packages.
+    """
+    encoders = {}
+    if zstandard is not None:
+        encoders["zstd"] = lambda: ZstdEncoder(zstd_level)
+    if brotli is not None:
+        encoders["br"] = lambda: BrotliEncoder(brotli_quality)
+    encoders["gzip"] = lambda: GzipEncoder(gzip_level)
+    return encoders
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding: str, available: tuple[str, ...]) -> str | None:
+    """
+    Content coding for an `Accept-Encoding` header: the highest q-value among
+    `available` wins, ties go to the earlier one. None means identity.
+    """
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        name, *params = item.split(";")
+        weight = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip()] = weight
+    best, best_weight = None, 0.0
+    for name in available:
+        weight = weights.get(name, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+
+def _compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type == "text/event-stream":
+        # events must reach the client one by one
+        return False
+    # json also covers +json and ndjson
+    return (
+        media_type.startswith("text/")
+        or media_type in ("application/javascript", "application/xml")
+        or media_type.endswith(("json", "+xml"))
+    )
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing text and JSON responses with the best content
+    coding the client accepts. Bodies under `minimum_size` bytes are sent as
+    is, the saving does not pay for the CPU. Streaming responses are
+    compressed chunk by chunk and every chunk is flushed, so the client can
+    decode it as soon as it arrives. Chunks of `thread_cutoff` bytes or more
+    are compressed in a worker thread (zlib, brotli and zstd release the GIL)
+    so large payloads do not block the event loop.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int,
+        thread_cutoff: int,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        zstd_level: int = 3,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_cutoff = thread_cutoff
+        self.encoders = available_encoders(gzip_level, brotli_quality, zstd_level)
+        self.available = tuple(self.encoders)
+
+    @staticmethod
+    def _accept_encoding(scope) -> str:
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                return value.decode("latin-1")
+        return ""
+
+    async def _compress(self, encoder, data: bytes, final: bool) -> bytes:
+        if len(data) >= self.thread_cutoff:
+            return await asyncio.to_thread(encoder.compress, data, final)
+        return encoder.compress(data, final)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = self._accept_encoding(scope)
+        encoding = (
+            negotiate(accept_encoding, self.available) if accept_encoding else None
+        )
+        start = None
+        encoder = None
+
+        async def send_wrapper(message):
+            nonlocal start, encoder
+            if message["type"] == "http.response.start":
+                # held back until the first body chunk decides the headers
+                start = message
+                return
+            if message["type"] == "http.response.body" and encoder is not None:
+                message["body"] = await self._compress(
+                    encoder,
+                    message.get("body", b""),
+                    not message.get("more_body", False),
+                )
+                await send(message)
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            response_start, start = start, None
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            headers = MutableHeaders(raw=list(response_start.get("headers", [])))
+            response_start["headers"] = headers.raw
+            if (
+                response_start["status"] in (204, 304)
+                or "content-encoding" in headers
+                or not _compressible(headers.get("content-type", ""))
+                or (not more_body and len(body) < self.minimum_size)
+            ):
+                await send(response_start)
+                await send(message)
+                return
+
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is not None:
+                encoder = self.encoders[encoding]()
+                message["body"] = await self._compress(encoder, body, not more_body)
+                headers["content-encoding"] = encoding
+                if more_body:
+                    del headers["content-length"]
+                else:
+                    headers["content-length"] = str(len(message["body"]))
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # the compressed body is not byte-identical to the original
+                    headers["etag"] = f"W/{etag}"
+            await send(response_start)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
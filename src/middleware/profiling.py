@@ -0,0 +1,73 @@
+import asyncio
+import random
+
+from src.services.profiling import (
+    ProfileStore,
+    TaskSampler,
+    profiling_token_matches,
+)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling single requests with `TaskSampler`. A request
+    is profiled when it carries the admin `X-Profile-Token` header or is
+    picked by `sample_rate`, at most `max_concurrent` at a time. The profile
+    is saved to `store` and its name returned in the `X-Profile-Id` header.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        token: str | None,
+        sample_rate: float,
+        interval: float,
+        max_concurrent: int,
+    ):
+        self.app = app
+        self.store = store
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_concurrent = max_concurrent
+        self.active = 0
+
+    def _requested(self, scope) -> bool:
+        if self.token is None:
+            return False
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile-token":
+                return profiling_token_matches(value, self.token)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope.get("batch_subrequest")
+            or self.active >= self.max_concurrent
+            or not (self._requested(scope) or random.random() < self.sample_rate)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        name = self.store.new_name(f"{scope['method']} {scope['path']}")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", name.encode()),
+                ]
+            await send(message)
+
+        self.active += 1
+        sampler = TaskSampler(asyncio.current_task(), self.interval)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            samples = await asyncio.to_thread(sampler.stop)
+            self.active -= 1
+            # saved even when shorter than one interval, the id was already sent
+            await asyncio.to_thread(self.store.save, name, samples)
@@ -0,0 +1,58 @@
+from src.services.tracing import NOOP_SPAN, STATUS_CODE_ERROR, Tracer
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware running every HTTP request in the server span of a trace.
+    Sampled responses carry a `traceparent` header so a client can find its
+    trace in the exported spans.
+    """
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    @staticmethod
+    def _traceparent(scope) -> str | None:
+        for name, value in scope.get("headers", []):
+            if name == b"traceparent":
+                return value.decode("latin-1")
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        span = self.tracer.start_trace(
+            f"{method} {scope['path']}",
+            self._traceparent(scope),
+            {"http.request.method": method, "url.path": scope["path"]},
+        )
+        if span is NOOP_SPAN:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = f"00-{span.trace.trace_id}-{span.span_id}-01".encode()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                span.set_attribute("http.response.status_code", status_code)
+                if status_code >= 500:
+                    span.status = {"code": STATUS_CODE_ERROR}
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"traceparent", traceparent),
+                ]
+            await send(message)
+
+        with span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{method} {route.path}"
+                    span.set_attribute("http.route", route.path)
@@ -0,0 +1,41 @@
+from typing import Sequence
+
+from sqlalchemy import RowMapping, select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import ContactAudit
+from src.schemas import User
+
+
+class AuditRepository:
+    def __init__(self, session: AsyncSession):
+        self.db = session
+
+    async def add_entries(self, entries: list[dict]) -> None:
+        # one multi-row INSERT per batch
+        await self.db.execute(insert(ContactAudit), entries)
+        await self.db.commit()
+
+    async def get_contact_history(
+        self, contact_id: int, skip: int, limit: int, user: User
+    ) -> Sequence[RowMapping]:
+        stmt = (
+            select(
+                ContactAudit.id,
+                ContactAudit.contact_id,
+                ContactAudit.actor_id,
+                ContactAudit.action,
+                ContactAudit.changes,
+                ContactAudit.created_at,
+            )
+            .filter(
+                ContactAudit.user_id == user.id,
+                ContactAudit.contact_id == contact_id,
+            )
+            # entries written inline can overtake queued ones
+            .order_by(ContactAudit.created_at.desc(), ContactAudit.id.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+        result = await self.db.execute(stmt)
+        return result.mappings().all()
@@ -1,53 +1,216 @@
-from typing import List, Optional
+from typing import Optional, Sequence
 
-from sqlalchemy import select
+from sqlalchemy import (
+    RowMapping,
+    select,
+    insert,
+    delete,
+    exists,
+    func,
+    case,
+    literal,
+    union_all,
+)
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import or_, and_, extract
-from datetime import date
+from datetime import date, datetime
 
-from src.database.models import Contact
+from src.database.models import (
+    ArchivedContact,
+    Contact,
+    Tag,
+    archived_contact_tags,
+    contact_tags,
+    normalize_phone,
+)
+from src.repository.stats import ContactStatsRepository, count_contacts
 from src.schemas import ContactModel, User
+from src.services.tracing import tracer
 
+_ARCHIVED = ArchivedContact.__table__
 
+
+def _select(fields: Optional[Sequence[str]], table=Contact.__table__):
+    """
+    Core select of contact columns, all of them unless `fields` is set.
+    Rows come back as plain mappings, skipping ORM hydration and the identity map.
+    `table` is `contacts` or `archived_contacts`; the `archived` field tells them apart.
+    """
+    if fields is None:
+        return select(*(table.c[column] for column in Contact.__table__.c.keys()))
+    return select(
+        *(
+            (
+                literal(table is _ARCHIVED).label(field)
+                if field == "archived"
+                else table.c[field]
+            )
+            for field in fields
+        )
+    )
+
+
+def _filter_tag(stmt, tag: Optional[str], user: User, table=Contact.__table__):
+    """
+    Keep only contacts tagged with `tag`, looked up through the tag's primary key index.
+    """
+    if tag is None:
+        return stmt
+    links = archived_contact_tags if table is _ARCHIVED else contact_tags
+    tagged = (
+        select(links.c.contact_id)
+        .join(Tag, Tag.id == links.c.tag_id)
+        .filter(Tag.user_id == user.id, Tag.name == tag)
+    )
+    return stmt.filter(table.c.id.in_(tagged))
+
+
+def _page(build, fields, skip: int, limit: int, include_archived: bool):
+    """
+    One page of contacts ordered by id. `build(table, fields)` returns the
+    filtered select of one table; with `include_archived` the page is taken
+    from the union of the hot and the archived contacts, each side limited
+    to `skip + limit` rows first.
+    """
+    if not include_archived:
+        return (
+            build(Contact.__table__, fields)
+            .order_by(Contact.id)
+            .offset(skip)
+            .limit(limit)
+        )
+    fields = fields or (*Contact.__table__.c.keys(), "archived")
+    sides = [
+        build(table, fields).order_by(table.c.id).limit(skip + limit).subquery()
+        for table in (Contact.__table__, _ARCHIVED)
+    ]
+    union = union_all(*(select(side) for side in sides)).subquery()
+    return select(union).order_by(union.c.id).offset(skip).limit(limit)
+
+
+def _birthday_window(today: date, next_date: date):
+    """
+    Filter and ordering for birthdays from `today` through `next_date`.
+    """
+    # month * 100 + day works on every dialect and ignores leap-year shifts
+    # that day-of-year comparisons suffer from
+    birthday_key = extract("month", Contact.birthday) * 100 + extract(
+        "day", Contact.birthday
+    )
+    start_key = today.month * 100 + today.day
+    end_key = next_date.month * 100 + next_date.day
+
+    if start_key <= end_key:
+        condition = and_(birthday_key >= start_key, birthday_key <= end_key)
+        order = [birthday_key]
+    else:
+        condition = or_(birthday_key >= start_key, birthday_key <= end_key)
+        order = [case((birthday_key >= start_key, 0), else_=1), birthday_key]
+    return condition, order
+
+
+async def _fetch_all(db: AsyncSession, stmt) -> Sequence[RowMapping]:
+    result = await db.execute(stmt)
+    return result.mappings().all()
+
+
+@tracer.trace_methods
 class ContactRepository:
     def __init__(self, session: AsyncSession):
         self.db = session
+        self.stats_repository = ContactStatsRepository(session)
+
+    async def get_contacts(
+        self,
+        skip: int,
+        limit: int,
+        user: User,
+        fields: Optional[Sequence[str]] = None,
+        tag: Optional[str] = None,
+        include_archived: bool = False,
+    ) -> Sequence[RowMapping]:
+        def build(table, fields):
+            return _filter_tag(_select(fields, table), tag, user, table).filter(
+                table.c.user_id == user.id
+            )
 
-    async def get_contacts(self, skip: int, limit: int, user: User) -> List[Contact]:
-        stmt = select(Contact).filter_by(user=user).offset(skip).limit(limit)
-        contacts = await self.db.execute(stmt)
-        return contacts.scalars().all()
+        stmt = _page(build, fields, skip, limit, include_archived)
+        return await _fetch_all(self.db, stmt)
 
-    async def get_contact_by_id(self, contact_id: int, user: User) -> Contact | None:
-        stmt = select(Contact).filter_by(id=contact_id, user=user)
+    async def get_contact_by_id(
+        self, contact_id: int, user: User, fields: Optional[Sequence[str]] = None
+    ) -> Contact | RowMapping | None:
+        if fields is None:
+            stmt = select(Contact).filter_by(id=contact_id, user_id=user.id)
+            contact = await self.db.execute(stmt)
+            return contact.scalar_one_or_none()
+        stmt = _select(fields).filter_by(id=contact_id, user_id=user.id)
         contact = await self.db.execute(stmt)
-        return contact.scalar_one_or_none()
+        return contact.mappings().one_or_none()
 
     async def create_contact(self, body: ContactModel, user: User) -> Contact:
-        contact = Contact(**body.model_dump(exclude_unset=True), user=user)
+        contact = Contact(**body.model_dump(exclude_unset=True), user_id=user.id)
         self.db.add(contact)
-        await self.db.commit()
+        await self.db.flush()
+        # created_at is set by the database
         await self.db.refresh(contact)
-        return await self.get_contact_by_id(contact.id, user)
+        await self.stats_repository.apply(count_contacts([contact]))
+        contact_id = contact.id
+        await self.db.commit()
+        return await self.get_contact_by_id(contact_id, user)
 
     async def remove_contact(self, contact_id: int, user: User) -> Contact | None:
         contact = await self.get_contact_by_id(contact_id, user)
-        if contact:
-            await self.db.delete(contact)
-            await self.db.commit()
+        if contact is None:
+            return None
+        # the statistics follow the row actually deleted, a concurrent
+        # delete of the same contact must not count it out twice
+        deleted = await self.db.execute(
+            delete(Contact)
+            .filter_by(id=contact_id, user_id=user.id)
+            .returning(
+                Contact.user_id, Contact.email, Contact.birthday, Contact.created_at
+            )
+            .execution_options(synchronize_session=False)
+        )
+        deleted = deleted.all()
+        if not deleted:
+            await self.db.rollback()
+            return None
+        await self.stats_repository.apply(count_contacts(deleted, -1))
+        # keeps its loaded fields for the response
+        self.db.expunge(contact)
+        await self.db.commit()
         return contact
 
     async def update_contact(
         self, contact_id: int, body: ContactModel, user: User
-    ) -> Contact | None:
-        contact = await self.get_contact_by_id(contact_id, user)
-        if contact:
-            for key, value in body.dict(exclude_unset=True).items():
-                setattr(contact, key, value)
-            await self.db.commit()
-            await self.db.refresh(contact)
-
-        return contact
+    ) -> tuple[Contact, dict] | None:
+        """
+        Update the contact and return it with the values of its columns
+        before the update, read from the locked row. None if not found.
+        """
+        # locked and reloaded, so the statistics are moved from the values
+        # being replaced even if the contact was read earlier in the session
+        stmt = (
+            select(Contact)
+            .filter_by(id=contact_id, user_id=user.id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        contact = (await self.db.execute(stmt)).scalar_one_or_none()
+        if contact is None:
+            return None
+        before = {key: getattr(contact, key) for key in Contact.__table__.c.keys()}
+        changes = count_contacts([contact], -1)
+        for key, value in body.dict(exclude_unset=True).items():
+            setattr(contact, key, value)
+        # usually cancels out and writes nothing
+        await self.stats_repository.apply(count_contacts([contact], 1, changes))
+        await self.db.commit()
+        await self.db.refresh(contact)
+        return contact, before
 
     async def search_contacts(
         self,
@@ -57,55 +220,371 @@ class ContactRepository:
         last_name: Optional[str],
         email: Optional[str],
         user: User,
-    ) -> List[Contact]:
-        stmt = select(Contact)
-        if first_name:
-            stmt = stmt.filter(Contact.first_name.ilike(f"%{first_name}%"))
-        if last_name:
-            stmt = stmt.filter(Contact.last_name.ilike(f"%{last_name}%"))
-        if email:
-            stmt = stmt.filter(Contact.email.ilike(f"%{email}%"))
-        stmt = stmt.filter_by(user=user).offset(skip).limit(limit)
-        result = await self.db.execute(stmt)
-        return result.scalars().all()
+        fields: Optional[Sequence[str]] = None,
+        tag: Optional[str] = None,
+        phone: Optional[str] = None,
+        include_archived: bool = False,
+    ) -> Sequence[RowMapping]:
+        def build(table, fields):
+            stmt = _filter_tag(_select(fields, table), tag, user, table)
+            if first_name:
+                stmt = stmt.filter(table.c.first_name.ilike(f"%{first_name}%"))
+            if last_name:
+                stmt = stmt.filter(table.c.last_name.ilike(f"%{last_name}%"))
+            if email:
+                stmt = stmt.filter(table.c.email.ilike(f"%{email}%"))
+            if phone:
+                # served by the (user_id, phone_digits) index
+                digits = normalize_phone(phone)
+                if phone.endswith("*"):
+                    stmt = stmt.filter(table.c.phone_digits.like(f"{digits}%"))
+                else:
+                    stmt = stmt.filter(table.c.phone_digits == digits)
+            return stmt.filter(table.c.user_id == user.id)
 
-    async def get_upcoming_birthdays(
-        self, today: date, next_date: date, skip: int, limit: int, user: User
-    ) -> List[Contact]:
+        stmt = _page(build, fields, skip, limit, include_archived)
+        return await _fetch_all(self.db, stmt)
 
-        start_day_of_year = today.timetuple().tm_yday
-        end_day_of_year = next_date.timetuple().tm_yday
+    async def restore_contact(self, contact_id: int, user: User) -> Contact | None:
+        """
+        Move an archived contact and its tags back to `contacts`. The contact
+        counts as updated now, so it is not archived again straight away.
+        """
+        columns = [
+            column for column in Contact.__table__.c.keys() if column != "updated_at"
+        ]
+        restored = await self.db.execute(
+            insert(Contact.__table__).from_select(
+                [*columns, "updated_at"],
+                select(*(_ARCHIVED.c[column] for column in columns), func.now()).filter(
+                    _ARCHIVED.c.id == contact_id, _ARCHIVED.c.user_id == user.id
+                ),
+            )
+        )
+        if not restored.rowcount:
+            return None
+        await self.db.execute(
+            insert(contact_tags).from_select(
+                ["tag_id", "contact_id", "user_id"],
+                select(
+                    archived_contact_tags.c.tag_id,
+                    archived_contact_tags.c.contact_id,
+                    literal(user.id),
+                ).filter(archived_contact_tags.c.contact_id == contact_id),
+            )
+        )
+        await self.db.execute(delete(_ARCHIVED).filter(_ARCHIVED.c.id == contact_id))
+        restored = await self.db.execute(
+            select(
+                Contact.user_id, Contact.email, Contact.birthday, Contact.created_at
+            ).filter_by(id=contact_id, user_id=user.id)
+        )
+        changes = count_contacts(restored.all())
+        changes[user.id, "archived", ""] -= 1
+        await self.stats_repository.apply(changes)
+        await self.db.commit()
+        return await self.get_contact_by_id(contact_id, user)
 
-        if start_day_of_year <= end_day_of_year:
-            stmt = (
-                select(Contact)
-                .filter_by(user=user)
+    async def archive_stale_contacts(
+        self, after_id: int, updated_before: datetime, limit: int
+    ) -> list[tuple[int, int]]:
+        """
+        Move up to `limit` contacts with ids above `after_id` that were not
+        updated since `updated_before` to the archive, in one short transaction.
+        Returns the `(id, user_id)` of the contacts moved, in id order.
+        """
+        contacts = Contact.__table__
+        # rows being written by requests are skipped rather than waited for
+        # (Postgres); they are picked up by the next run
+        rows = (
+            await self.db.execute(
+                select(contacts.c.id, contacts.c.user_id)
                 .filter(
-                    or_(
-                        and_(
-                            extract("doy", Contact.birthday) >= start_day_of_year,
-                            extract("doy", Contact.birthday) <= end_day_of_year,
-                        )
-                    )
+                    contacts.c.id > after_id, contacts.c.updated_at < updated_before
                 )
-                .order_by(extract("doy", Contact.birthday))
-                .offset(skip)
+                .order_by(contacts.c.id)
                 .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+        ).all()
+        if not rows:
+            return []
+        contact_ids = [row.id for row in rows]
+        columns = contacts.c.keys()
+        await self.db.execute(
+            insert(_ARCHIVED).from_select(
+                [*columns, "archived_at"],
+                select(*contacts.c, func.now()).filter(contacts.c.id.in_(contact_ids)),
+            )
+        )
+        await self.db.execute(
+            insert(archived_contact_tags).from_select(
+                ["tag_id", "contact_id"],
+                select(contact_tags.c.tag_id, contact_tags.c.contact_id).filter(
+                    contact_tags.c.contact_id.in_(contact_ids)
+                ),
+            )
+        )
+        archived = await self.db.execute(
+            delete(contacts)
+            .filter(contacts.c.id.in_(contact_ids))
+            .returning(
+                contacts.c.id,
+                contacts.c.user_id,
+                contacts.c.email,
+                contacts.c.birthday,
+                contacts.c.created_at,
+            )
+        )
+        archived = sorted(archived.all())
+        changes = count_contacts(archived, -1)
+        for row in archived:
+            changes[row.user_id, "archived", ""] += 1
+        await self.stats_repository.apply(changes)
+        await self.db.commit()
+        return [(row.id, row.user_id) for row in archived]
+
+    async def get_tag_counts(self, user: User):
+        stmt = (
+            select(Tag.name, func.count(contact_tags.c.contact_id).label("contacts"))
+            .outerjoin(contact_tags, contact_tags.c.tag_id == Tag.id)
+            .filter(Tag.user_id == user.id)
+            .group_by(Tag.id, Tag.name)
+            .order_by(Tag.name)
+        )
+        return await _fetch_all(self.db, stmt)
+
+    async def get_tag_count(self, name: str, user: User) -> int | None:
+        stmt = (
+            select(func.count(contact_tags.c.contact_id))
+            .select_from(Tag)
+            .outerjoin(contact_tags, contact_tags.c.tag_id == Tag.id)
+            .filter(Tag.user_id == user.id, Tag.name == name)
+            .group_by(Tag.id)
+        )
+        return await self.db.scalar(stmt)
+
+    async def _get_or_create_tag(self, name: str, user: User) -> tuple[int, bool]:
+        """
+        Id of the user's tag `name` and whether it was created, in the current
+        transaction without committing, so the tag is never left without the
+        links it was created for.
+        """
+        stmt = select(Tag.id).filter_by(user_id=user.id, name=name)
+        tag_id = await self.db.scalar(stmt)
+        if tag_id is not None:
+            return tag_id, False
+        dialect = self.db.get_bind().dialect.name
+        insert_tag = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        # a tag created concurrently by another request is waited for and kept
+        created = await self.db.execute(
+            insert_tag(Tag)
+            .values(name=name, user_id=user.id)
+            .on_conflict_do_nothing(index_elements=["user_id", "name"])
+        )
+        return await self.db.scalar(stmt), created.rowcount == 1
+
+    async def tag_contacts(self, name: str, contact_ids: list[int], user: User) -> int:
+        """
+        Tag the user's contacts among `contact_ids` with one INSERT ... SELECT,
+        creating the tag if needed, in one transaction. A new tag that would
+        tag no contact is not created. Returns the number of newly tagged contacts.
+        """
+        tag_id, created = await self._get_or_create_tag(name, user)
+        already_tagged = select(contact_tags.c.contact_id).filter(
+            contact_tags.c.tag_id == tag_id
+        )
+        stmt = insert(contact_tags).from_select(
+            ["tag_id", "contact_id", "user_id"],
+            select(literal(tag_id), Contact.id, Contact.user_id).filter(
+                Contact.user_id == user.id,
+                Contact.id.in_(contact_ids),
+                Contact.id.not_in(already_tagged),
+            ),
+        )
+        result = await self.db.execute(stmt)
+        if created and result.rowcount == 0:
+            await self.db.rollback()
+            return 0
+        await self.db.commit()
+        return result.rowcount
+
+    async def untag_contacts(
+        self, name: str, contact_ids: Optional[list[int]], user: User
+    ) -> int | None:
+        """
+        Remove the tag from `contact_ids`, or delete the tag altogether when
+        no ids are given. Returns the number of untagged contacts, None if
+        the user has no such tag.
+        """
+        tag_id = await self.db.scalar(
+            select(Tag.id).filter_by(user_id=user.id, name=name)
+        )
+        if tag_id is None:
+            return None
+        stmt = delete(contact_tags).filter(contact_tags.c.tag_id == tag_id)
+        if contact_ids is not None:
+            stmt = stmt.filter(contact_tags.c.contact_id.in_(contact_ids))
+        result = await self.db.execute(stmt)
+        if contact_ids is None:
+            await self.db.execute(delete(Tag).filter_by(id=tag_id))
+        await self.db.commit()
+        return result.rowcount
+
+    async def get_duplicate_candidates(self, user: User) -> list[tuple]:
+        """
+        (key kind, key, contact id) rows, ordered by key, for every blocking key
+        shared by two or more of the user's contacts. Each kind of key takes one
+        scan and sort of the user's contacts, they are never compared pairwise.
+        """
+        keys = {
+            "email": func.lower(Contact.email),
+            "phone": Contact.phone_digits,
+            "name": func.lower(func.trim(Contact.first_name))
+            + " "
+            + func.lower(func.trim(Contact.last_name)),
+        }
+        candidates = []
+        for kind, key in keys.items():
+            keyed = (
+                select(
+                    key.label("key"),
+                    Contact.id,
+                    func.count().over(partition_by=key).label("shared"),
+                )
+                .filter(Contact.user_id == user.id, key.is_not(None), key != "")
+                .subquery()
             )
-        else:
             stmt = (
-                select(Contact)
-                .filter_by(user=user)
+                select(keyed.c.key, keyed.c.id)
+                .filter(keyed.c.shared > 1)
+                .order_by(keyed.c.key, keyed.c.id)
+            )
+            result = await self.db.execute(stmt)
+            candidates.extend((kind, value, contact_id) for value, contact_id in result)
+        return candidates
+
+    async def merge_contacts(self, targets: dict[int, int], user: User) -> int | None:
+        """
+        Merge contacts into other contacts; `targets` maps each source id to its
+        target id. Targets keep their fields and gain the tags of their sources,
+        then the sources are deleted, each step in one statement for all merges.
+        Returns the number of merged contacts, None if any contact is not the user's.
+        """
+        ids = set(targets) | set(targets.values())
+        found = await self.db.scalar(
+            select(func.count())
+            .select_from(Contact)
+            .filter(Contact.user_id == user.id, Contact.id.in_(ids))
+        )
+        if found != len(ids):
+            return None
+
+        target_id = case(targets, value=contact_tags.c.contact_id)
+        existing = contact_tags.alias("existing")
+        await self.db.execute(
+            insert(contact_tags).from_select(
+                ["tag_id", "contact_id", "user_id"],
+                select(contact_tags.c.tag_id, target_id, contact_tags.c.user_id)
+                .distinct()
                 .filter(
-                    or_(
-                        extract("doy", Contact.birthday) >= start_day_of_year,
-                        extract("doy", Contact.birthday) <= end_day_of_year,
-                    )
+                    contact_tags.c.user_id == user.id,
+                    contact_tags.c.contact_id.in_(targets),
+                    ~exists().where(
+                        existing.c.tag_id == contact_tags.c.tag_id,
+                        existing.c.contact_id == target_id,
+                    ),
+                ),
+            )
+        )
+        merged = await self.db.execute(
+            delete(Contact)
+            .filter(Contact.user_id == user.id, Contact.id.in_(targets))
+            .returning(
+                Contact.user_id, Contact.email, Contact.birthday, Contact.created_at
+            )
+            .execution_options(synchronize_session=False)
+        )
+        merged = merged.all()
+        await self.stats_repository.apply(count_contacts(merged, -1))
+        await self.db.commit()
+        return len(merged)
+
+    async def suggest_contacts(self, prefix: str, limit: int, user: User):
+        pattern = (
+            prefix.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            + "%"
+        )
+        stmt = (
+            select(Contact.id, Contact.first_name, Contact.last_name)
+            .filter(Contact.user_id == user.id)
+            .filter(
+                or_(
+                    func.lower(Contact.first_name).like(pattern, escape="\\"),
+                    func.lower(Contact.last_name).like(pattern, escape="\\"),
+                    func.lower(Contact.email).like(pattern, escape="\\"),
                 )
-                .order_by(extract("doy", Contact.birthday))
-                .offset(skip)
-                .limit(limit)
             )
+            .order_by(
+                func.lower(Contact.first_name),
+                func.lower(Contact.last_name),
+                Contact.id,
+            )
+            .limit(limit)
+        )
+        result = await self.db.execute(stmt)
+        return result.all()
 
+    async def get_suggest_entries(self, user: User):
+        stmt = select(
+            Contact.id, Contact.first_name, Contact.last_name, Contact.email
+        ).filter(Contact.user_id == user.id)
         result = await self.db.execute(stmt)
-        return result.scalars().all()
+        return result.all()
+
+    async def get_upcoming_birthdays(
+        self,
+        today: date,
+        next_date: date,
+        skip: int,
+        limit: int,
+        user: User,
+        fields: Optional[Sequence[str]] = None,
+    ) -> Sequence[RowMapping]:
+        condition, order = _birthday_window(today, next_date)
+        stmt = (
+            _select(fields)
+            .filter_by(user_id=user.id)
+            .filter(condition)
+            .order_by(*order, Contact.id)
+            .offset(skip)
+            .limit(limit)
+        )
+
+        return await _fetch_all(self.db, stmt)
+
+    async def get_upcoming_birthdays_for_users(
+        self, today: date, next_date: date, user_ids: Sequence[int], limit: int
+    ) -> Sequence[RowMapping]:
+        """
+        Upcoming birthdays of many users in one statement, at most `limit` per
+        user, ordered by user and then as in `get_upcoming_birthdays`.
+        """
+        condition, order = _birthday_window(today, next_date)
+        ranked = (
+            select(
+                *Contact.__table__.c,
+                func.row_number()
+                .over(partition_by=Contact.user_id, order_by=[*order, Contact.id])
+                .label("position"),
+            )
+            .filter(Contact.user_id.in_(user_ids))
+            .filter(condition)
+            .subquery()
+        )
+        stmt = (
+            select(*(ranked.c[column.name] for column in Contact.__table__.c))
+            .filter(ranked.c.position <= limit)
+            .order_by(ranked.c.user_id, ranked.c.position)
+        )
+        return await _fetch_all(self.db, stmt)
@@ -0,0 +1,82 @@
+from datetime import date
+from typing import Sequence
+
+from sqlalchemy import RowMapping, select, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import BirthdayDigest, DigestCheckpoint, User
+
+
+class DigestRepository:
+    def __init__(self, session: AsyncSession):
+        self.db = session
+
+    async def get_confirmed_users(
+        self, after_id: int, limit: int
+    ) -> Sequence[RowMapping]:
+        stmt = (
+            select(User.id, User.username, User.email, User.shard)
+            .filter(User.confirmed.is_(True), User.id > after_id)
+            .order_by(User.id)
+            .limit(limit)
+        )
+        result = await self.db.execute(stmt)
+        return result.mappings().all()
+
+    async def start_checkpoint(self, digest_date: date) -> DigestCheckpoint:
+        """
+        Return the day's checkpoint, creating it on the first run of the day.
+        """
+        stmt = select(DigestCheckpoint).filter_by(digest_date=digest_date)
+        checkpoint = await self.db.scalar(stmt)
+        if checkpoint is not None:
+            return checkpoint
+        try:
+            await self.db.execute(
+                insert(DigestCheckpoint).values(
+                    digest_date=digest_date, last_user_id=0, completed=False
+                )
+            )
+            await self.db.commit()
+        except IntegrityError:
+            # started concurrently by another worker
+            await self.db.rollback()
+        return await self.db.scalar(stmt)
+
+    async def save_checkpoint(
+        self, digest_date: date, last_user_id: int, completed: bool = False
+    ) -> None:
+        values = {"last_user_id": last_user_id}
+        if completed:
+            values["completed"] = True
+        await self.db.execute(
+            update(DigestCheckpoint)
+            .filter(
+                DigestCheckpoint.digest_date == digest_date,
+                DigestCheckpoint.last_user_id <= last_user_id,
+            )
+            .values(**values)
+        )
+        await self.db.commit()
+
+    async def claim_digest(self, user_id: int, digest_date: date) -> bool:
+        """
+        Record the user's digest for the day before it is sent. False when it
+        was already claimed, by an earlier run or by another worker.
+        """
+        try:
+            await self.db.execute(
+                insert(BirthdayDigest).values(user_id=user_id, digest_date=digest_date)
+            )
+            await self.db.commit()
+            return True
+        except IntegrityError:
+            await self.db.rollback()
+            return False
+
+    async def release_digest(self, user_id: int, digest_date: date) -> None:
+        await self.db.execute(
+            delete(BirthdayDigest).filter_by(user_id=user_id, digest_date=digest_date)
+        )
+        await self.db.commit()
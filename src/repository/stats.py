@@ -0,0 +1,108 @@
+from collections import Counter
+from datetime import date, timedelta
+from typing import Iterable
+
+from sqlalchemy import select, or_, and_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import ContactStat
+from src.schemas import User
+from src.services.tracing import tracer
+
+# kinds read as a whole; email domains are read top first, weeks by range
+_SMALL_KINDS = ("total", "archived", "birth_month")
+
+
+def week_start(day: date) -> date:
+    """
+    Monday of the ISO week of `day`, the key of the `added_week` aggregate.
+    """
+    return day - timedelta(days=day.weekday())
+
+
+def contact_stat_keys(contact) -> list[tuple[str, str]]:
+    """
+    The `(kind, key)` aggregates an active contact is counted in.
+    """
+    keys = [("total", "")]
+    if contact.birthday is not None:
+        keys.append(("birth_month", f"{contact.birthday.month:02d}"))
+    if contact.email and "@" in contact.email:
+        keys.append(("email_domain", contact.email.rsplit("@", 1)[1].lower()))
+    if contact.created_at is not None:
+        keys.append(("added_week", week_start(contact.created_at.date()).isoformat()))
+    return keys
+
+
+def count_contacts(
+    contacts: Iterable, sign: int = 1, changes: Counter | None = None
+) -> Counter:
+    """
+    Changes of the aggregates, `{(user_id, kind, key): delta}`, when `contacts`
+    are added, or removed with `sign=-1`. Contacts are objects or rows with
+    `user_id`, `email`, `birthday` and `created_at`.
+    """
+    changes = Counter() if changes is None else changes
+    for contact in contacts:
+        for kind, key in contact_stat_keys(contact):
+            changes[contact.user_id, kind, key] += sign
+    return changes
+
+
+@tracer.trace_methods
+class ContactStatsRepository:
+    def __init__(self, session: AsyncSession):
+        self.db = session
+
+    async def apply(self, changes: Counter) -> None:
+        """
+        Add `changes` to the aggregates in one upsert, without committing:
+        call it in the transaction of the contact write it accounts for.
+        """
+        rows = [
+            {"user_id": user_id, "kind": kind, "key": key, "contacts": delta}
+            # a fixed order, so concurrent writes lock the rows in the same order
+            for (user_id, kind, key), delta in sorted(changes.items())
+            if delta
+        ]
+        if not rows:
+            return
+        dialect = self.db.get_bind().dialect.name
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(ContactStat).values(rows)
+        await self.db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id", "kind", "key"],
+                set_={"contacts": ContactStat.contacts + stmt.excluded.contacts},
+            )
+        )
+
+    async def get_stats(
+        self, user: User, first_week: date, domains: int
+    ) -> tuple[list[tuple], list[tuple]]:
+        """
+        The user's `(kind, key, contacts)` aggregates, except email domains,
+        with weeks from `first_week` on; and the `domains` email domains with
+        the most contacts. Reads only the user's aggregate rows.
+        """
+        counted = select(
+            ContactStat.kind, ContactStat.key, ContactStat.contacts
+        ).filter(ContactStat.user_id == user.id, ContactStat.contacts > 0)
+        aggregates = await self.db.execute(
+            counted.filter(
+                or_(
+                    ContactStat.kind.in_(_SMALL_KINDS),
+                    and_(
+                        ContactStat.kind == "added_week",
+                        ContactStat.key >= first_week.isoformat(),
+                    ),
+                )
+            )
+        )
+        top_domains = await self.db.execute(
+            counted.filter(ContactStat.kind == "email_domain")
+            .order_by(ContactStat.contacts.desc(), ContactStat.key)
+            .limit(domains)
+        )
+        return aggregates.all(), top_domains.all()
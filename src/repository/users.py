@@ -1,10 +1,14 @@
-from sqlalchemy import select
+from datetime import datetime, UTC
+
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User
+from src.database.models import User, RefreshToken
 from src.schemas import UserCreate
+from src.services.tracing import tracer
 
 
+@tracer.trace_methods
 class UserRepository:
     def __init__(self, session: AsyncSession):
         self.db = session
@@ -24,25 +28,95 @@ class UserRepository:
         user = await self.db.execute(stmt)
         return user.scalar_one_or_none()
 
-    async def create_user(self, body: UserCreate, avatar: str = None) -> User:
-        user = User(
-            **body.model_dump(exclude_unset=True, exclude={"password"}),
-            hashed_password=body.password,
-            avatar=avatar
+    async def create_user(
+        self, body: UserCreate, avatar: str = None, shard: int = None
+    ) -> User:
+        """
+        Insert the user in one statement. Duplicate usernames and emails are
+        rejected by the unique constraints with IntegrityError.
+        """
+        result = await self.db.execute(
+            insert(User)
+            .values(
+                **body.model_dump(exclude_unset=True, exclude={"password"}),
+                hashed_password=body.password,
+                avatar=avatar,
+                shard=shard,
+            )
+            .returning(User)
         )
-        self.db.add(user)
+        user = result.scalar_one()
+        # detached, so the commit does not expire the returned columns
+        self.db.expunge(user)
         await self.db.commit()
-        await self.db.refresh(user)
         return user
 
+    async def delete_user(self, user_id: int) -> None:
+        await self.db.execute(delete(User).filter_by(id=user_id))
+        await self.db.commit()
+
     async def confirmed_email(self, email: str) -> None:
         user = await self.get_user_by_email(email)
         user.confirmed = True
         await self.db.commit()
 
+    async def set_shard(self, user_id: int, shard: int) -> None:
+        stmt = update(User).filter_by(id=user_id).values(shard=shard)
+        await self.db.execute(stmt)
+        await self.db.commit()
+
     async def update_avatar_url(self, email: str, url: str) -> User:
         user = await self.get_user_by_email(email)
         user.avatar = url
         await self.db.commit()
         await self.db.refresh(user)
         return user
+
+    async def add_refresh_token(
+        self, user_id: int, token_hash: str, expires_at: datetime
+    ) -> RefreshToken:
+        refresh_token = RefreshToken(
+            user_id=user_id, token_hash=token_hash, expires_at=expires_at
+        )
+        # the expired tokens of the user are purged as new ones are issued
+        stmt = delete(RefreshToken).where(
+            RefreshToken.user_id == user_id,
+            RefreshToken.expires_at < datetime.now(UTC).replace(tzinfo=None),
+        )
+        await self.db.execute(stmt)
+        self.db.add(refresh_token)
+        await self.db.commit()
+        return refresh_token
+
+    async def get_refresh_token(self, token_hash: str) -> RefreshToken | None:
+        stmt = select(RefreshToken).filter_by(token_hash=token_hash)
+        refresh_token = await self.db.execute(stmt)
+        return refresh_token.scalar_one_or_none()
+
+    async def revoke_refresh_token(self, token_hash: str) -> bool:
+        stmt = (
+            update(RefreshToken)
+            .filter_by(token_hash=token_hash, revoked=False)
+            .values(revoked=True)
+        )
+        result = await self.db.execute(stmt)
+        await self.db.commit()
+        return result.rowcount == 1
+
+    async def delete_expired_refresh_tokens(self, now: datetime, limit: int) -> int:
+        expired = (
+            select(RefreshToken.id).where(RefreshToken.expires_at < now).limit(limit)
+        )
+        stmt = delete(RefreshToken).where(RefreshToken.id.in_(expired))
+        result = await self.db.execute(stmt)
+        await self.db.commit()
+        return result.rowcount
+
+    async def revoke_user_refresh_tokens(self, user_id: int) -> None:
+        stmt = (
+            update(RefreshToken)
+            .filter_by(user_id=user_id, revoked=False)
+            .values(revoked=True)
+        )
+        await self.db.execute(stmt)
+        await self.db.commit()
@@ -1,6 +1,14 @@
 from datetime import date, datetime
-from typing import Optional
-from pydantic import BaseModel, Field, EmailStr, ConfigDict, field_validator
+from functools import lru_cache
+from typing import Any, List, Literal, Optional
+from pydantic import (
+    BaseModel,
+    Field,
+    EmailStr,
+    ConfigDict,
+    field_validator,
+    create_model,
+)
 
 
 class ContactModel(BaseModel):
@@ -15,14 +23,101 @@ class ContactResponse(ContactModel):
     id: int
     created_at: Optional[datetime] | None
     updated_at: Optional[datetime] | None
+    archived: bool = False
     model_config = ConfigDict(from_attributes=True)
 
 
+CONTACT_FIELDS = tuple(ContactResponse.model_fields)
+
+
+@lru_cache(maxsize=256)
+def contact_fields_model(fields: tuple[str, ...]) -> type[BaseModel]:
+    """
+    Response model with only the given `ContactResponse` fields, built once per combination.
+    """
+    return create_model(
+        "ContactFields_" + "_".join(fields),
+        __config__=ConfigDict(from_attributes=True),
+        **{
+            name: (
+                ContactResponse.model_fields[name].annotation,
+                ContactResponse.model_fields[name],
+            )
+            for name in fields
+        },
+    )
+
+
+class ContactSuggestion(BaseModel):
+    id: int
+    display_name: str
+
+
+class TagResponse(BaseModel):
+    name: str
+    contacts: int
+
+
+class ContactTagsRequest(BaseModel):
+    contact_ids: list[int] = Field(min_length=1, max_length=1000)
+
+
+class DuplicateGroup(BaseModel):
+    contact_ids: list[int]
+    keys: list[Literal["email", "phone", "name"]]
+
+
+class ContactMerge(BaseModel):
+    target_id: int
+    source_ids: list[int] = Field(min_length=1, max_length=100)
+
+
+class ContactMergeRequest(BaseModel):
+    merges: list[ContactMerge] = Field(min_length=1, max_length=100)
+
+
+class ContactMergeResponse(BaseModel):
+    merged: int
+
+
+class ContactHistoryEntry(BaseModel):
+    id: int
+    contact_id: int
+    actor_id: int | None
+    action: Literal["created", "updated", "deleted", "merged", "archived", "restored"]
+    changes: dict[str, list[Any]] | None
+    created_at: datetime
+
+
+class BirthMonthCount(BaseModel):
+    month: int
+    contacts: int
+
+
+class EmailDomainCount(BaseModel):
+    domain: str
+    contacts: int
+
+
+class WeekCount(BaseModel):
+    week: date
+    contacts: int
+
+
+class ContactStats(BaseModel):
+    total: int
+    archived: int
+    birth_months: list[BirthMonthCount]
+    email_domains: list[EmailDomainCount]
+    added_per_week: list[WeekCount]
+
+
 class User(BaseModel):
     id: int
     username: str
     email: str
-    avatar: str
+    avatar: str | None
+    shard: int | None = Field(None, exclude=True)
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -48,12 +143,36 @@ class UserCreate(BaseModel):
 
 class Token(BaseModel):
     access_token: str
+    refresh_token: str
     token_type: str
 
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+
 class RequestEmail(BaseModel):
     email: EmailStr
 
 
 class HealthCheckResponse(BaseModel):
     message: str
+
+
+class BatchSubRequest(BaseModel):
+    method: Literal["GET", "POST", "PUT", "PATCH", "DELETE"] = "GET"
+    path: str = Field(pattern=r"^/api/")
+    body: Any = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest] = Field(min_length=1)
+
+
+class BatchSubResponse(BaseModel):
+    status: int
+    body: Any = None
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchSubResponse]
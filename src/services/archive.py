@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta, UTC
+
+from src.conf.config import settings
+from src.database.db import sessionmanager, shard_managers
+from src.services.contacts import ContactService
+
+
+class ContactArchiver:
+    """
+    Moves contacts not updated for `after_days` days to `archived_contacts`.
+
+    Every shard is walked in contact id order (keyset pagination), one batch
+    of `batch_size` contacts per short transaction, pausing `pause_seconds`
+    between batches so the mover never holds locks or saturates the database
+    for long. A full pass runs every `interval_seconds`.
+    """
+
+    def __init__(
+        self,
+        after_days: int,
+        batch_size: int,
+        pause_seconds: float,
+        interval_seconds: float,
+    ):
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.interval_seconds = interval_seconds
+        self._task: asyncio.Task | None = None
+
+    async def run(self, after_days: int | None = None) -> int:
+        """
+        Archive the stale contacts of every shard. Returns the number moved.
+        """
+        updated_before = datetime.now(UTC).replace(tzinfo=None) - timedelta(
+            days=self.after_days if after_days is None else after_days
+        )
+        moved = 0
+        managers = {id(manager): manager for manager in shard_managers}.values()
+        for manager in managers:
+            last_id = 0
+            while True:
+                async with manager.session() as session:
+                    contact_ids = await ContactService(session).archive_stale_contacts(
+                        last_id, updated_before, self.batch_size
+                    )
+                if not contact_ids:
+                    break
+                moved += len(contact_ids)
+                last_id = contact_ids[-1]
+                await asyncio.sleep(self.pause_seconds)
+        return moved
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                print(e)
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+contact_archiver = ContactArchiver(
+    settings.ARCHIVE_AFTER_DAYS,
+    settings.ARCHIVE_BATCH_SIZE,
+    settings.ARCHIVE_BATCH_PAUSE_SECONDS,
+    settings.ARCHIVE_INTERVAL_SECONDS,
+)
@@ -0,0 +1,192 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, UTC
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.repository.audit import AuditRepository
+
+AUDITED_FIELDS = ("first_name", "last_name", "email", "phone", "birthday")
+
+_STOP = object()
+_WRITE_ATTEMPTS = 3
+
+
+def audit_snapshot(contact) -> dict:
+    """
+    JSON-ready values of the audited fields of a contact, an object or a dict.
+    """
+    if isinstance(contact, dict):
+        values = {field: contact[field] for field in AUDITED_FIELDS}
+    else:
+        values = {field: getattr(contact, field) for field in AUDITED_FIELDS}
+    if values["birthday"] is not None:
+        values["birthday"] = values["birthday"].isoformat()
+    return values
+
+
+def audit_diff(before: dict | None, after: dict | None) -> dict:
+    """
+    `{field: [before, after]}` for every audited field that differs.
+    """
+    before = before or {}
+    after = after or {}
+    return {
+        field: [before.get(field), after.get(field)]
+        for field in AUDITED_FIELDS
+        if before.get(field) != after.get(field)
+    }
+
+
+class AuditLog:
+    """
+    Contact history recorded off the request path. Entries go to a bounded
+    in-process queue and a background writer stores them in `contact_audit`
+    with one multi-row INSERT per database, once `batch_size` entries are
+    queued or `flush_seconds` after the first one. When the writer falls
+    `max_queue` entries behind, entries are written inline instead, so the
+    log slows requests down rather than dropping history. `stop` flushes the
+    queue; entries still queued when the process dies are lost.
+
+    Each entry is written to the database of the session that changed the
+    contact, so history stays on the contact's shard.
+    """
+
+    def __init__(
+        self, enabled: bool, max_queue: int, batch_size: int, flush_seconds: float
+    ):
+        self.enabled = enabled
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    async def record(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        contact_id: int,
+        action: str,
+        changes: dict | None = None,
+        actor_id: int | None = None,
+    ) -> None:
+        """
+        Record a committed change of a contact made in the session `db`.
+        """
+        if not self.enabled:
+            return
+        entry = {
+            "contact_id": contact_id,
+            "user_id": user_id,
+            "actor_id": actor_id,
+            "action": action,
+            "changes": changes,
+            "created_at": datetime.now(UTC).replace(tzinfo=None),
+        }
+        if self._task is not None:
+            try:
+                self._queue.put_nowait((db.bind, entry))
+                return
+            except asyncio.QueueFull:
+                pass
+        # no writer running (e.g. in the CLI) or it fell behind: waiting for
+        # queue space while holding a pool connection could starve the writer
+        # of connections, so the entry is written with the caller's session;
+        # its objects are up to date, they must not be expired by this commit
+        expire_on_commit = db.sync_session.expire_on_commit
+        db.sync_session.expire_on_commit = False
+        try:
+            await AuditRepository(db).add_entries([entry])
+        except Exception as e:
+            # the rollback would expire them too
+            db.expunge_all()
+            await db.rollback()
+            print(e)
+        finally:
+            db.sync_session.expire_on_commit = expire_on_commit
+
+    async def _next_batch(self) -> tuple[list, bool]:
+        """
+        Wait for the next entry, then collect up to `batch_size` entries for at
+        most `flush_seconds`. The flag is set when `stop` was called.
+        """
+        loop = asyncio.get_running_loop()
+        item = await self._queue.get()
+        deadline = loop.time() + self.flush_seconds
+        batch = []
+        while item is not _STOP:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, False
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                try:
+                    item = await asyncio.wait_for(
+                        self._queue.get(), deadline - loop.time()
+                    )
+                except asyncio.TimeoutError:
+                    return batch, False
+        return batch, True
+
+    @staticmethod
+    async def _insert(bind, entries: list[dict]) -> None:
+        async with AsyncSession(bind) as session:
+            await AuditRepository(session).add_entries(entries)
+
+    async def _write(self, batch: list) -> None:
+        entries_by_bind = defaultdict(list)
+        for bind, entry in batch:
+            entries_by_bind[bind].append(entry)
+        for bind, entries in entries_by_bind.items():
+            for attempt in range(_WRITE_ATTEMPTS):
+                try:
+                    await self._insert(bind, entries)
+                    break
+                except IntegrityError:
+                    # an entry of a user deleted meanwhile must not take the
+                    # rest of the batch with it
+                    for entry in entries:
+                        try:
+                            await self._insert(bind, [entry])
+                        except IntegrityError as e:
+                            print(e)
+                    break
+                except Exception as e:
+                    print(e)
+                    if attempt + 1 < _WRITE_ATTEMPTS:
+                        await asyncio.sleep(self.flush_seconds)
+            else:
+                print(f"Dropped {len(entries)} audit entries")
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            if batch:
+                await self._write(batch)
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._queue = asyncio.Queue(self.max_queue)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Write everything queued so far and stop the writer.
+        """
+        if self._task is not None:
+            task, self._task = self._task, None
+            await self._queue.put(_STOP)
+            await task
+
+
+audit_log = AuditLog(
+    settings.AUDIT_ENABLED,
+    settings.AUDIT_QUEUE_SIZE,
+    settings.AUDIT_BATCH_SIZE,
+    settings.AUDIT_FLUSH_SECONDS,
+)
@@ -1,22 +1,41 @@
+import hashlib
+import heapq
+import secrets
+import time
+import uuid
 from datetime import datetime, timedelta, UTC
 from typing import Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
 from src.conf.config import settings
-from src.database.db import get_db
+from src.schemas import User
+from src.services.tracing import tracer
 from src.services.users import UserService
 
 
 class Hash:
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    # hash of a discarded random secret, same cost as the hashes of real users
+    dummy_hash = "$2b$12$vlpDfyCdRLLycgwAmE3iyObRtQQ1Ed10OQS.hri/kCuZLCj3G2wcG"
 
+    @tracer.traced("bcrypt.verify")
     def verify_password(self, plain_password, hashed_password):
         return self.pwd_context.verify(plain_password, hashed_password)
 
+    @tracer.traced("bcrypt.verify")
+    def dummy_verify(self, plain_password) -> bool:
+        """
+        Spend the time of a real verification for a user that does not exist,
+        so response times do not reveal which usernames are registered.
+        """
+        self.pwd_context.verify(plain_password, self.dummy_hash)
+        return False
+
+    @tracer.traced("bcrypt.hash")
     def get_password_hash(self, password: str):
         return self.pwd_context.hash(password)
 
@@ -24,22 +43,127 @@ class Hash:
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
+class TokenRevocationList:
+    """
+    In-memory set of revoked access token ids. Entries are dropped once the
+    token itself expires, so the set stays bounded by the number of logouts
+    within one access token lifetime. A heap ordered by expiry finds the
+    expired entries without scanning the others.
+    """
+
+    def __init__(self):
+        self._revoked: dict[str, float] = {}
+        self._expiries: list[tuple[float, str]] = []
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        now = time.time()
+        while self._expiries and self._expiries[0][0] <= now:
+            _, key = heapq.heappop(self._expiries)
+            self._revoked.pop(key, None)
+        self._revoked[jti] = expires_at
+        heapq.heappush(self._expiries, (expires_at, jti))
+
+    def is_revoked(self, jti: str) -> bool:
+        return jti in self._revoked
+
+
+revoked_tokens = TokenRevocationList()
+
+
+def _hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
 async def create_access_token(data: dict, expires_delta: Optional[int] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(UTC) + timedelta(seconds=expires_delta)
     else:
         expire = datetime.now(UTC) + timedelta(seconds=settings.JWT_EXPIRATION_SECONDS)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex, "type": "access"})
     encoded_jwt = jwt.encode(
         to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM
     )
     return encoded_jwt
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
-):
+async def create_refresh_token(user_id: int, db: AsyncSession) -> str:
+    token = secrets.token_urlsafe(48)
+    expires_at = datetime.now(UTC).replace(tzinfo=None) + timedelta(
+        seconds=settings.JWT_REFRESH_EXPIRATION_SECONDS
+    )
+    await UserService(db).add_refresh_token(
+        user_id, _hash_refresh_token(token), expires_at
+    )
+    return token
+
+
+async def create_tokens(user, db: AsyncSession) -> dict:
+    """
+    Issue a short-lived access token carrying the user claims and a new refresh token.
+    Only claims that do not change while the token is valid are included, the
+    avatar is read from the database.
+    """
+    access_token = await create_access_token(
+        data={
+            "sub": user.username,
+            "uid": user.id,
+            "email": user.email,
+            "shard": user.shard,
+        }
+    )
+    refresh_token = await create_refresh_token(user.id, db)
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+    }
+
+
+async def rotate_refresh_token(refresh_token: str, db: AsyncSession) -> dict:
+    """
+    Exchange a refresh token for a new token pair. The presented token is revoked;
+    presenting an already revoked token revokes every refresh token of its user.
+    """
+    refresh_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user_service = UserService(db)
+    token_hash = _hash_refresh_token(refresh_token)
+    stored_token = await user_service.get_refresh_token(token_hash)
+    if stored_token is None:
+        raise refresh_exception
+    user_id = stored_token.user_id
+    if stored_token.revoked:
+        await user_service.revoke_user_refresh_tokens(user_id)
+        raise refresh_exception
+    if stored_token.expires_at < datetime.now(UTC).replace(tzinfo=None):
+        raise refresh_exception
+    if not await user_service.revoke_refresh_token(token_hash):
+        raise refresh_exception
+    user = await user_service.get_user_by_id(user_id)
+    if user is None or not user.confirmed:
+        raise refresh_exception
+    return await create_tokens(user, db)
+
+
+async def revoke_tokens(payload: dict, refresh_token: Optional[str], db: AsyncSession):
+    revoked_tokens.revoke(payload["jti"], payload["exp"])
+    if refresh_token:
+        await UserService(db).revoke_refresh_token(_hash_refresh_token(refresh_token))
+
+
+@tracer.traced()
+async def get_token_payload(
+    request: Request, token: str = Depends(oauth2_scheme)
+) -> dict:
+    # sub-requests of a batch reuse the payload verified for the whole batch
+    batch_payload = getattr(request.state, "batch_payload", None)
+    if batch_payload is not None:
+        return batch_payload
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -50,16 +174,31 @@ async def get_current_user(
         payload = jwt.decode(
             token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM]
         )
-        username = payload["sub"]
-        if username is None:
-            raise credentials_exception
     except JWTError as e:
         raise credentials_exception
-    user_service = UserService(db)
-    user = await user_service.get_user_by_username(username)
-    if user is None:
+    if (
+        payload.get("type") != "access"
+        or payload.get("sub") is None
+        or payload.get("uid") is None
+        or revoked_tokens.is_revoked(payload.get("jti"))
+    ):
         raise credentials_exception
-    return user
+    return payload
+
+
+@tracer.traced()
+async def get_current_user(payload: dict = Depends(get_token_payload)) -> User:
+    """
+    Build the current user from the access token claims without a database lookup.
+    The avatar is not a claim, endpoints returning it read the user from the database.
+    """
+    return User(
+        id=payload["uid"],
+        username=payload["sub"],
+        email=payload["email"],
+        avatar=None,
+        shard=payload.get("shard"),
+    )
 
 
 def create_email_token(data: dict):
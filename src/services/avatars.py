@@ -0,0 +1,326 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi import HTTPException, status
+
+from src.conf.config import settings
+
+
+@dataclass(frozen=True)
+class Avatar:
+    content: bytes
+    content_type: str
+    etag: str
+
+    @classmethod
+    def from_content(cls, content: bytes, content_type: str) -> "Avatar":
+        return cls(
+            content, content_type, f'"{hashlib.sha256(content).hexdigest()[:32]}"'
+        )
+
+
+class HttpAvatarOrigin:
+    """
+    Fetches avatars from their Cloudinary or Gravatar URL. Responses that are
+    not images or are larger than `max_bytes` are rejected.
+    """
+
+    def __init__(self, timeout: float, max_bytes: int):
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self._client: httpx.AsyncClient | None = None
+
+    async def fetch(self, url: str) -> Avatar | None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout, follow_redirects=True
+            )
+        async with self._client.stream("GET", url) as response:
+            if response.status_code == status.HTTP_404_NOT_FOUND:
+                return None
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "")
+            content_type = content_type.split(";", 1)[0].strip().lower()
+            if not content_type.startswith("image/"):
+                raise ValueError(f"Avatar {url} is {content_type or 'untyped'}")
+            content = bytearray()
+            async for chunk in response.aiter_bytes():
+                content += chunk
+                if len(content) > self.max_bytes:
+                    raise ValueError(f"Avatar {url} exceeds {self.max_bytes} bytes")
+        return Avatar.from_content(bytes(content), content_type)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class LocalAvatarOrigin:
+    """
+    Stub origin for tests and offline development: the avatar of a URL is the
+    file in `directory` named after the last segment of the URL's path, with
+    or without an extension, e.g. `bob.png` for `.../v1/RestApp/bob`.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def _read(self, url: str) -> Avatar | None:
+        name = urlsplit(url).path.rstrip("/").rpartition("/")[2]
+        if not name:
+            return None
+        for path in (self.directory / name, *self.directory.glob(f"{name}.*")):
+            if path.is_file():
+                content_type = mimetypes.guess_type(path.name)[0] or "image/png"
+                return Avatar.from_content(path.read_bytes(), content_type)
+        return None
+
+    async def fetch(self, url: str) -> Avatar | None:
+        return await asyncio.to_thread(self._read, url)
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryAvatarCache:
+    """
+    Per-process LRU of avatars bounded by the total size of their images.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, Avatar] = OrderedDict()
+
+    def get(self, key: str) -> Avatar | None:
+        avatar = self._entries.get(key)
+        if avatar is not None:
+            self._entries.move_to_end(key)
+        return avatar
+
+    def set(self, key: str, avatar: Avatar) -> None:
+        if len(avatar.content) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = avatar
+        self.size += len(avatar.content)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        avatar = self._entries.pop(key, None)
+        if avatar is not None:
+            self.size -= len(avatar.content)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class DiskAvatarCache:
+    """
+    LRU of avatars stored as files in `directory`, bounded by their total
+    size. Files are written under a temporary name and renamed, so readers
+    never see a partial avatar. The recency order is kept in memory, loaded
+    from the files' modification times on first use; reads touch the file,
+    so the order survives restarts. Blocking calls, run them in a thread.
+
+    Workers sharing the directory keep their own index; a file evicted by
+    another worker is a miss.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._files: OrderedDict[str, int] | None = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.avatar"
+
+    def _index(self) -> OrderedDict[str, int]:
+        # under self._lock
+        if self._files is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            files = []
+            for path in self.directory.glob("*.avatar"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, path.stem, stat.st_size))
+            self._files = OrderedDict((key, size) for _, key, size in sorted(files))
+            self.size = sum(self._files.values())
+        return self._files
+
+    def _forget(self, key: str) -> None:
+        # under self._lock
+        self.size -= self._index().pop(key, 0)
+
+    def get(self, key: str) -> Avatar | None:
+        with self._lock:
+            if key not in self._index():
+                return None
+            self._files.move_to_end(key)
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(key)
+            return None
+        content_type, etag, content = data.split(b"\n", 2)
+        return Avatar(content, content_type.decode(), etag.decode())
+
+    def set(self, key: str, avatar: Avatar) -> None:
+        data = b"%s\n%s\n%s" % (
+            avatar.content_type.encode(),
+            avatar.etag.encode(),
+            avatar.content,
+        )
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._index()
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self._forget(key)
+            self._files[key] = len(data)
+            self.size += len(data)
+            evicted = []
+            while self.size > self.max_bytes:
+                evicted.append(next(iter(self._files)))
+                self._forget(evicted[-1])
+        for key in evicted:
+            # another worker may have evicted it already
+            self._path(key).unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._files or ()),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class AvatarProxy:
+    """
+    Serves avatars from a memory LRU in front of a disk LRU, fetching misses
+    from `origin` (any object with `fetch(url)` returning an `Avatar` or None,
+    and `close()`). Avatars are cached by URL: a new upload gets a new URL, so
+    cached images never need invalidating. Concurrent misses of the same
+    avatar wait for a single disk read or fetch.
+    """
+
+    def __init__(self, origin, memory: MemoryAvatarCache, disk: DiskAvatarCache):
+        self.origin = origin
+        self.memory = memory
+        self.disk = disk
+        self._loads: dict[str, asyncio.Task] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.fetches = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    async def get(self, url: str) -> Avatar | None:
+        """
+        The avatar at `url`, None if the origin has none.
+        """
+        key = self._key(url)
+        avatar = self.memory.get(key)
+        if avatar is not None:
+            self.memory_hits += 1
+            return avatar
+        load = self._loads.get(key)
+        if load is None:
+            load = asyncio.create_task(self._load(key, url))
+            self._loads[key] = load
+            load.add_done_callback(lambda _: self._loads.pop(key, None))
+        else:
+            self.coalesced += 1
+        try:
+            # shielded, a client going away must not cancel the load others wait for
+            return await asyncio.shield(load)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Avatar is temporarily unavailable",
+            )
+
+    async def _load(self, key: str, url: str) -> Avatar | None:
+        avatar = await asyncio.to_thread(self.disk.get, key)
+        if avatar is not None:
+            self.disk_hits += 1
+        else:
+            self.fetches += 1
+            try:
+                avatar = await self.origin.fetch(url)
+            except Exception as e:
+                # logged once, however many requests wait for it
+                self.errors += 1
+                print(e)
+                raise
+            if avatar is None:
+                return None
+            try:
+                await asyncio.to_thread(self.disk.set, key, avatar)
+            except OSError as e:
+                # still served from memory
+                print(e)
+        self.memory.set(key, avatar)
+        return avatar
+
+    async def close(self) -> None:
+        await self.origin.close()
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "fetches": self.fetches,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats(),
+        }
+
+
+avatar_proxy = AvatarProxy(
+    (
+        LocalAvatarOrigin(settings.AVATAR_LOCAL_DIR)
+        if settings.AVATAR_ORIGIN == "local"
+        else HttpAvatarOrigin(
+            settings.AVATAR_FETCH_TIMEOUT_SECONDS, settings.AVATAR_MAX_BYTES
+        )
+    ),
+    MemoryAvatarCache(settings.AVATAR_MEMORY_CACHE_BYTES),
+    DiskAvatarCache(settings.AVATAR_CACHE_DIR, settings.AVATAR_DISK_CACHE_BYTES),
+)
@@ -0,0 +1,152 @@
+import json
+import time
+from collections import OrderedDict
+
+from src.conf.config import settings
+
+
+class InMemoryCacheBackend:
+    """
+    Per-process LRU bounded by the total size of the stored payloads.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._generations: dict[int, int] = {}
+
+    async def get_generation(self, user_id: int) -> int:
+        return self._generations.get(user_id, 0)
+
+    async def bump_generation(self, user_id: int) -> None:
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        payload, expires_at = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    async def set(self, key: str, payload: bytes, ttl: int) -> None:
+        if len(payload) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (payload, time.monotonic() + ttl)
+        self.size += len(payload)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[0])
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class RedisCacheBackend:
+    """
+    Cache shared by all workers. Stale entries of older generations expire by TTL.
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+
+    async def get_generation(self, user_id: int) -> int:
+        return int(await self.redis.get(f"contacts:gen:{user_id}") or 0)
+
+    async def bump_generation(self, user_id: int) -> None:
+        await self.redis.incr(f"contacts:gen:{user_id}")
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.redis.get(f"contacts:result:{key}")
+
+    async def set(self, key: str, payload: bytes, ttl: int) -> None:
+        await self.redis.set(f"contacts:result:{key}", payload, ex=ttl)
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+
+class ResultCache:
+    """
+    Caches serialized read results per user, route and normalized parameters.
+    Keys embed the user's generation number, which every write bumps, so a
+    write makes all earlier results of that user unreachable at once.
+    """
+
+    def __init__(self, backend, ttl: int, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(user_id: int, generation: int, route: str, params: dict) -> str:
+        normalized = json.dumps(params, sort_keys=True, default=str)
+        return f"{user_id}:{generation}:{route}:{normalized}"
+
+    async def get_or_load(self, user_id: int, route: str, params: dict, load):
+        """
+        Return the cached result or call `load()` and cache its JSON-serializable result.
+        """
+        if not self.enabled:
+            return await load()
+        generation = await self.backend.get_generation(user_id)
+        key = self._key(user_id, generation, route, params)
+        payload = await self.backend.get(key)
+        if payload is not None:
+            self.hits += 1
+            return json.loads(payload)
+        self.misses += 1
+        result = await load()
+        await self.backend.set(key, json.dumps(result, default=str).encode(), self.ttl)
+        return result
+
+    async def generation(self, user_id: int) -> int:
+        """
+        The user's generation, bumped by every write; 0 when disabled.
+        """
+        if not self.enabled:
+            return 0
+        return await self.backend.get_generation(user_id)
+
+    async def invalidate_user(self, user_id: int) -> None:
+        if self.enabled:
+            await self.backend.bump_generation(user_id)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            **self.backend.stats(),
+        }
+
+
+result_cache = ResultCache(
+    (
+        RedisCacheBackend(settings.RESULT_CACHE_REDIS_URL)
+        if settings.RESULT_CACHE_REDIS_URL
+        else InMemoryCacheBackend(settings.RESULT_CACHE_MAX_BYTES)
+    ),
+    settings.RESULT_CACHE_TTL_SECONDS,
+    settings.RESULT_CACHE_ENABLED,
+)
@@ -1,15 +1,73 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
-from datetime import date, timedelta
+from typing import List, Optional, Sequence
+from datetime import date, datetime, timedelta
+from itertools import groupby
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 
+from src.conf.config import settings
+from src.database.models import normalize_phone
+from src.repository.audit import AuditRepository
 from src.repository.contacts import ContactRepository
-from src.schemas import ContactModel, User
+from src.repository.stats import ContactStatsRepository, week_start
+from src.schemas import ContactModel, ContactResponse, User, contact_fields_model
+from src.services.audit import audit_diff, audit_log, audit_snapshot
+from src.services.cache import result_cache
+from src.services.suggest import suggest_index
+from src.services.tracing import tracer
+
+
+def _to_responses(rows, fields: Optional[Sequence[str]] = None) -> List[dict]:
+    # rows were validated on write; re-validating every stored email on read
+    # costs far more than the query itself
+    model = ContactResponse if fields is None else contact_fields_model(fields)
+    return [model.model_construct(**row).model_dump(mode="json") for row in rows]
+
+
+def _group_duplicates(candidates) -> List[dict]:
+    """
+    Union contacts that share any blocking key into groups (union-find),
+    near-linear in the number of candidate rows.
+    """
+    parent = {}
+
+    def find(contact_id):
+        root = parent.setdefault(contact_id, contact_id)
+        while root != parent[root]:
+            parent[root] = parent[parent[root]]
+            root = parent[root]
+        return root
+
+    matches = []
+    for (kind, _), rows in groupby(candidates, key=lambda row: row[:2]):
+        contact_ids = [contact_id for _, _, contact_id in rows]
+        for contact_id in contact_ids[1:]:
+            parent[find(contact_id)] = find(contact_ids[0])
+        matches.append((kind, contact_ids[0]))
+
+    groups = {}
+    for contact_id in sorted(parent):
+        group = groups.setdefault(find(contact_id), {"contact_ids": [], "keys": set()})
+        group["contact_ids"].append(contact_id)
+    for kind, contact_id in matches:
+        groups[find(contact_id)]["keys"].add(kind)
+    return [
+        {"contact_ids": group["contact_ids"], "keys": sorted(group["keys"])}
+        for group in sorted(groups.values(), key=lambda group: group["contact_ids"])
+    ]
 
 
 def _handle_integrity_error(e: IntegrityError):
-    if "unique_email_user" in str(e.orig):
+    # partitions of a partitioned contacts table report their own index name,
+    # SQLite reports the constrained columns
+    if any(
+        marker in str(e.orig)
+        for marker in (
+            "unique_email_user",
+            "Key (email, user_id)",
+            "contacts.email, contacts.user_id",
+        )
+    ):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Contact with such email already exists",
@@ -21,32 +79,255 @@ def _handle_integrity_error(e: IntegrityError):
         )
 
 
+async def _invalidate_user(user_id: int):
+    suggest_index.invalidate(user_id)
+    await result_cache.invalidate_user(user_id)
+
+
+@tracer.trace_methods
 class ContactService:
     def __init__(self, db: AsyncSession):
         self.contact_repository = ContactRepository(db)
+        self.audit_repository = AuditRepository(db)
+        self.stats_repository = ContactStatsRepository(db)
+
+    async def _contacts_changed(self, user: User):
+        """
+        Invalidate everything derived from the user's contacts. Call after every write.
+        """
+        await _invalidate_user(user.id)
+
+    async def _audit(
+        self, user: User, contact_id: int, action: str, changes: dict | None = None
+    ):
+        await audit_log.record(
+            self.contact_repository.db,
+            user.id,
+            contact_id,
+            action,
+            changes,
+            actor_id=user.id,
+        )
 
     async def create_contact(self, body: ContactModel, user: User):
         try:
-            return await self.contact_repository.create_contact(body, user)
+            contact = await self.contact_repository.create_contact(body, user)
         except IntegrityError as e:
             await self.contact_repository.db.rollback()
             _handle_integrity_error(e)
+        await self._contacts_changed(user)
+        await self._audit(
+            user, contact.id, "created", audit_diff(None, audit_snapshot(contact))
+        )
+        return contact
+
+    async def get_contacts(
+        self,
+        skip: int,
+        limit: int,
+        user: User,
+        fields: Optional[Sequence[str]] = None,
+        tag: Optional[str] = None,
+        include_archived: bool = False,
+    ):
+        async def load():
+            return _to_responses(
+                await self.contact_repository.get_contacts(
+                    skip, limit, user, fields, tag, include_archived
+                ),
+                fields,
+            )
 
-    async def get_contacts(self, skip: int, limit: int, user: User):
-        return await self.contact_repository.get_contacts(skip, limit, user)
+        params = {
+            "skip": skip,
+            "limit": limit,
+            "fields": fields,
+            "tag": tag,
+            "include_archived": include_archived,
+        }
+        return await result_cache.get_or_load(user.id, "contacts", params, load)
 
-    async def get_contact(self, contact_id: int, user: User):
-        return await self.contact_repository.get_contact_by_id(contact_id, user)
+    async def get_contact(
+        self, contact_id: int, user: User, fields: Optional[Sequence[str]] = None
+    ):
+        contact = await self.contact_repository.get_contact_by_id(
+            contact_id, user, fields
+        )
+        if contact is None:
+            return None
+        return _to_responses([contact], fields)[0]
 
     async def update_contact(self, contact_id: int, body: ContactModel, user: User):
         try:
-            return await self.contact_repository.update_contact(contact_id, body, user)
+            updated = await self.contact_repository.update_contact(
+                contact_id, body, user
+            )
         except IntegrityError as e:
             await self.contact_repository.db.rollback()
             _handle_integrity_error(e)
+        await self._contacts_changed(user)
+        if updated is None:
+            return None
+        contact, before = updated
+        changes = audit_diff(audit_snapshot(before), audit_snapshot(contact))
+        if changes:
+            await self._audit(user, contact_id, "updated", changes)
+        return contact
+
+    async def restore_contact(self, contact_id: int, user: User):
+        try:
+            contact = await self.contact_repository.restore_contact(contact_id, user)
+        except IntegrityError as e:
+            await self.contact_repository.db.rollback()
+            _handle_integrity_error(e)
+        if contact:
+            await self._contacts_changed(user)
+            await self._audit(user, contact_id, "restored")
+        return contact
+
+    async def archive_stale_contacts(
+        self, after_id: int, updated_before: datetime, limit: int
+    ) -> List[int]:
+        """
+        Archive one batch of stale contacts of any user, see
+        `ContactRepository.archive_stale_contacts`. Returns the ids moved.
+        """
+        archived = await self.contact_repository.archive_stale_contacts(
+            after_id, updated_before, limit
+        )
+        for user_id in {user_id for _, user_id in archived}:
+            await _invalidate_user(user_id)
+        for contact_id, user_id in archived:
+            await audit_log.record(
+                self.contact_repository.db, user_id, contact_id, "archived"
+            )
+        return [contact_id for contact_id, _ in archived]
 
     async def remove_contact(self, contact_id: int, user: User):
-        return await self.contact_repository.remove_contact(contact_id, user)
+        contact = await self.contact_repository.remove_contact(contact_id, user)
+        if contact:
+            await self._contacts_changed(user)
+            await self._audit(
+                user, contact_id, "deleted", audit_diff(audit_snapshot(contact), None)
+            )
+        return contact
+
+    async def get_contact_history(
+        self, contact_id: int, skip: int, limit: int, user: User
+    ) -> List[dict]:
+        rows = await self.audit_repository.get_contact_history(
+            contact_id, skip, limit, user
+        )
+        return [dict(row) for row in rows]
+
+    async def get_contact_stats(self, weeks: int, domains: int, user: User) -> dict:
+        """
+        Aggregates of the user's active contacts, read from the counts kept
+        up to date on write: contacts per birth month, the `domains` most
+        common email domains and contacts added in each of the last `weeks`
+        weeks, this one included.
+        """
+        first_week = week_start(date.today()) - timedelta(weeks=weeks - 1)
+        aggregates, top_domains = await self.stats_repository.get_stats(
+            user, first_week, domains
+        )
+        counts = {(kind, key): contacts for kind, key, contacts in aggregates}
+        return {
+            "total": counts.get(("total", ""), 0),
+            "archived": counts.get(("archived", ""), 0),
+            "birth_months": [
+                {
+                    "month": month,
+                    "contacts": counts.get(("birth_month", f"{month:02d}"), 0),
+                }
+                for month in range(1, 13)
+            ],
+            "email_domains": [
+                {"domain": domain, "contacts": contacts}
+                for _, domain, contacts in top_domains
+            ],
+            "added_per_week": [
+                {
+                    "week": week,
+                    "contacts": counts.get(("added_week", week.isoformat()), 0),
+                }
+                for week in (first_week + timedelta(weeks=i) for i in range(weeks))
+            ],
+        }
+
+    async def get_tags(self, user: User) -> List[dict]:
+        return [dict(row) for row in await self.contact_repository.get_tag_counts(user)]
+
+    async def tag_contacts(self, name: str, contact_ids: List[int], user: User):
+        try:
+            tagged = await self.contact_repository.tag_contacts(name, contact_ids, user)
+        except IntegrityError as e:
+            await self.contact_repository.db.rollback()
+            _handle_integrity_error(e)
+        if tagged:
+            await self._contacts_changed(user)
+        count = await self.contact_repository.get_tag_count(name, user)
+        return {"name": name, "contacts": count or 0}
+
+    async def untag_contacts(
+        self, name: str, contact_ids: Optional[List[int]], user: User
+    ):
+        untagged = await self.contact_repository.untag_contacts(name, contact_ids, user)
+        if untagged is None:
+            return None
+        if untagged:
+            await self._contacts_changed(user)
+        count = await self.contact_repository.get_tag_count(name, user)
+        return {"name": name, "contacts": count or 0}
+
+    async def find_duplicates(self, skip: int, limit: int, user: User) -> List[dict]:
+        async def load():
+            candidates = await self.contact_repository.get_duplicate_candidates(user)
+            return _group_duplicates(candidates)[skip : skip + limit]
+
+        params = {"skip": skip, "limit": limit}
+        return await result_cache.get_or_load(user.id, "duplicates", params, load)
+
+    async def merge_contacts(self, merges, user: User):
+        targets = {
+            source_id: merge.target_id
+            for merge in merges
+            for source_id in merge.source_ids
+        }
+        ids = [merge.target_id for merge in merges] + [
+            source_id for merge in merges for source_id in merge.source_ids
+        ]
+        if len(set(ids)) != len(ids):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Every contact can appear only once in a merge request",
+            )
+        merged = await self.contact_repository.merge_contacts(targets, user)
+        if merged is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found"
+            )
+        await self._contacts_changed(user)
+        for source_id, target_id in targets.items():
+            await self._audit(
+                user, source_id, "merged", {"merged_into": [None, target_id]}
+            )
+        return {"merged": merged}
+
+    async def suggest_contacts(self, prefix: str, limit: int, user: User):
+        if settings.SUGGEST_INDEX_ENABLED:
+            return await suggest_index.suggest(
+                user.id,
+                prefix,
+                limit,
+                lambda: self.contact_repository.get_suggest_entries(user),
+                await result_cache.generation(user.id),
+            )
+        rows = await self.contact_repository.suggest_contacts(prefix, limit, user)
+        return [
+            {"id": contact_id, "display_name": f"{first_name} {last_name}"}
+            for contact_id, first_name, last_name in rows
+        ]
 
     async def search_contacts(
         self,
@@ -56,16 +337,69 @@ class ContactService:
         last_name: Optional[str],
         email: Optional[str],
         user: User,
+        fields: Optional[Sequence[str]] = None,
+        tag: Optional[str] = None,
+        phone: Optional[str] = None,
+        include_archived: bool = False,
     ) -> List[ContactModel]:
-        return await self.contact_repository.search_contacts(
-            skip, limit, first_name, last_name, email, user
-        )
+        async def load():
+            return _to_responses(
+                await self.contact_repository.search_contacts(
+                    skip,
+                    limit,
+                    first_name,
+                    last_name,
+                    email,
+                    user,
+                    fields,
+                    tag,
+                    phone,
+                    include_archived,
+                ),
+                fields,
+            )
+
+        params = {
+            "skip": skip,
+            "limit": limit,
+            "first_name": first_name.lower() if first_name else None,
+            "last_name": last_name.lower() if last_name else None,
+            "email": email.lower() if email else None,
+            "fields": fields,
+            "tag": tag,
+            "phone": (
+                normalize_phone(phone) + ("*" if phone.endswith("*") else "")
+                if phone
+                else None
+            ),
+            "include_archived": include_archived,
+        }
+        return await result_cache.get_or_load(user.id, "search", params, load)
 
     async def get_upcoming_birthdays(
-        self, days: int, skip: int, limit: int, user: User
+        self,
+        days: int,
+        skip: int,
+        limit: int,
+        user: User,
+        fields: Optional[Sequence[str]] = None,
     ) -> List[ContactModel]:
         today = date.today()
         next_date = today + timedelta(days=days)
-        return await self.contact_repository.get_upcoming_birthdays(
-            today, next_date, skip, limit, user
-        )
+
+        async def load():
+            return _to_responses(
+                await self.contact_repository.get_upcoming_birthdays(
+                    today, next_date, skip, limit, user, fields
+                ),
+                fields,
+            )
+
+        params = {
+            "today": today,
+            "days": days,
+            "skip": skip,
+            "limit": limit,
+            "fields": fields,
+        }
+        return await result_cache.get_or_load(user.id, "birthdays", params, load)
@@ -0,0 +1,156 @@
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from src.conf.config import settings
+from src.database.db import sessionmanager, shard_managers, shard_for_user
+from src.repository.contacts import ContactRepository
+from src.repository.digests import DigestRepository
+from src.services.email import send_birthday_digest
+
+
+class BirthdayDigestJob:
+    """
+    Sends every confirmed user with upcoming birthdays one digest email a day.
+
+    Users are processed in batches by id. Each batch costs one birthdays query
+    per shard, and the last finished user id is checkpointed so an interrupted
+    run resumes where it stopped. Every digest is claimed in `birthday_digests`
+    before it is sent, so reruns and concurrent workers never send a user the
+    same day's digest twice.
+    """
+
+    def __init__(
+        self,
+        hour: int,
+        days: int,
+        max_contacts: int,
+        batch_size: int,
+        concurrency: int,
+    ):
+        self.hour = hour
+        self.days = days
+        self.max_contacts = max_contacts
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._task: asyncio.Task | None = None
+
+    async def _load_birthdays(self, users, today: date) -> dict[int, list[dict]]:
+        shards = defaultdict(list)
+        for user in users:
+            shard = (
+                user["shard"]
+                if user["shard"] is not None
+                else shard_for_user(user["username"])
+            )
+            shards[shard].append(user["id"])
+
+        birthdays = defaultdict(list)
+        next_date = today + timedelta(days=self.days)
+        for shard, user_ids in shards.items():
+            async with shard_managers[shard].session() as session:
+                rows = await ContactRepository(
+                    session
+                ).get_upcoming_birthdays_for_users(
+                    today, next_date, user_ids, self.max_contacts
+                )
+            for row in rows:
+                birthdays[row["user_id"]].append(dict(row))
+        return birthdays
+
+    async def _send(
+        self, semaphore: asyncio.Semaphore, user, contacts: list, today: date
+    ) -> bool | None:
+        """
+        True when sent, False when already sent, None when sending failed.
+        """
+        async with semaphore:
+            async with sessionmanager.session() as session:
+                digests = DigestRepository(session)
+                if not await digests.claim_digest(user["id"], today):
+                    return False
+                if await send_birthday_digest(
+                    user["email"], user["username"], contacts, self.days
+                ):
+                    return True
+                # let the next run retry this user
+                await digests.release_digest(user["id"], today)
+                return None
+
+    async def run(self, today: date | None = None) -> int:
+        """
+        Send the digests of `today` that were not sent yet. Returns the number sent.
+        """
+        today = today or date.today()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        sent = 0
+        async with sessionmanager.session() as session:
+            digests = DigestRepository(session)
+            checkpoint = await digests.start_checkpoint(today)
+            if checkpoint.completed:
+                return 0
+            last_user_id = checkpoint.last_user_id
+            while True:
+                users = await digests.get_confirmed_users(last_user_id, self.batch_size)
+                if not users:
+                    break
+                birthdays = await self._load_birthdays(users, today)
+                recipients = [user for user in users if birthdays[user["id"]]]
+                results = await asyncio.gather(
+                    *(
+                        self._send(semaphore, user, birthdays[user["id"]], today)
+                        for user in recipients
+                    )
+                )
+                sent += results.count(True)
+                failed = [
+                    user["id"]
+                    for user, result in zip(recipients, results)
+                    if result is None
+                ]
+                if failed:
+                    await digests.save_checkpoint(today, min(failed) - 1)
+                    raise RuntimeError(
+                        f"Sending {len(failed)} birthday digests failed, "
+                        f"sent {sent} before stopping"
+                    )
+                last_user_id = users[-1]["id"]
+                await digests.save_checkpoint(today, last_user_id)
+            await digests.save_checkpoint(today, last_user_id, completed=True)
+        return sent
+
+    async def _run(self) -> None:
+        while True:
+            now = datetime.now()
+            scheduled = datetime.combine(now.date(), time(self.hour))
+            if now >= scheduled:
+                try:
+                    await self.run(now.date())
+                    scheduled += timedelta(days=1)
+                except Exception as e:
+                    # resume from the checkpoint shortly
+                    print(e)
+                    scheduled = now + timedelta(minutes=1)
+            await asyncio.sleep((scheduled - datetime.now()).total_seconds())
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+birthday_digest_job = BirthdayDigestJob(
+    settings.BIRTHDAY_DIGEST_HOUR,
+    settings.BIRTHDAY_DIGEST_DAYS,
+    settings.BIRTHDAY_DIGEST_MAX_CONTACTS,
+    settings.BIRTHDAY_DIGEST_BATCH_SIZE,
+    settings.BIRTHDAY_DIGEST_CONCURRENCY,
+)
@@ -6,6 +6,7 @@ from pydantic import EmailStr
 
 from src.services.auth import create_email_token
 from src.conf.config import settings
+from src.services.tracing import tracer
 
 conf = ConnectionConfig(
     MAIL_USERNAME=settings.MAIL_USERNAME,
@@ -22,6 +23,7 @@ conf = ConnectionConfig(
 )
 
 
+@tracer.traced("email.send_verification")
 async def send_email(email: EmailStr, username: str, host: str):
     try:
         token_verification = create_email_token({"sub": email})
@@ -40,3 +42,27 @@ async def send_email(email: EmailStr, username: str, host: str):
         await fm.send_message(message, template_name="verify_email.html")
     except ConnectionErrors as err:
         print(err)
+
+
+@tracer.traced("email.send_birthday_digest")
+async def send_birthday_digest(
+    email: EmailStr, username: str, contacts: list, days: int
+) -> bool:
+    try:
+        message = MessageSchema(
+            subject="Upcoming birthdays",
+            recipients=[email],
+            template_body={
+                "username": username,
+                "days": days,
+                "contacts": contacts,
+            },
+            subtype=MessageType.html,
+        )
+
+        fm = FastMail(conf)
+        await fm.send_message(message, template_name="birthday_digest.html")
+        return True
+    except ConnectionErrors as err:
+        print(err)
+        return False
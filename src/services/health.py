@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+from sqlalchemy import text
+
+from src.conf.config import settings
+from src.database.db import sessionmanager, shard_managers
+
+
+class HealthMonitor:
+    """
+    Probes the databases and the mail server in the background and keeps the
+    latest result, so readiness probes are answered from memory.
+    """
+
+    def __init__(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+        self.status: dict = {"ready": False, "checked_at": None}
+        self._task: asyncio.Task | None = None
+
+    @staticmethod
+    def _pool_status(engine) -> dict:
+        pool = engine.pool
+        status = {}
+        for name in ("size", "checkedout", "overflow"):
+            if hasattr(pool, name):
+                status[name] = getattr(pool, name)()
+        if status.get("size"):
+            capacity = status["size"] + max(getattr(pool, "_max_overflow", 0), 0)
+            status["saturation"] = round(status["checkedout"] / capacity, 3)
+        return status
+
+    async def _probe_database(self, manager) -> dict:
+        started = time.perf_counter()
+        error = None
+
+        async def probe():
+            async with manager._engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+
+        try:
+            # the pool checkout and the connect are bounded too
+            await asyncio.wait_for(probe(), self.timeout)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        return {
+            "ok": error is None,
+            "error": error,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+            "pool": self._pool_status(manager._engine),
+        }
+
+    async def _probe_mail(self) -> dict:
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(settings.MAIL_SERVER, settings.MAIL_PORT),
+                self.timeout,
+            )
+        except Exception as e:
+            return {"ok": False, "error": str(e) or type(e).__name__}
+        writer.close()
+        try:
+            await asyncio.wait_for(writer.wait_closed(), self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            # the server was reachable; a close that does not finish is aborted
+            writer.transport.abort()
+        return {"ok": True, "error": None}
+
+    async def check(self) -> dict:
+        managers = {
+            id(manager): manager for manager in [sessionmanager, *shard_managers]
+        }
+        databases = await asyncio.gather(
+            *(self._probe_database(manager) for manager in managers.values())
+        )
+        mail = await self._probe_mail()
+        self.status = {
+            "ready": all(database["ok"] for database in databases),
+            "checked_at": time.time(),
+            "databases": databases,
+            "mail": mail,
+        }
+        return self.status
+
+    def is_ready(self) -> bool:
+        checked_at = self.status["checked_at"]
+        return (
+            self.status["ready"]
+            and checked_at is not None
+            and time.time() - checked_at < self.interval * 3
+        )
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                print(e)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+health_monitor = HealthMonitor(
+    settings.HEALTH_CHECK_INTERVAL_SECONDS, settings.HEALTH_CHECK_TIMEOUT_SECONDS
+)
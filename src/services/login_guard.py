@@ -0,0 +1,188 @@
+import time
+from collections import OrderedDict
+
+from src.conf.config import settings
+
+
+class InMemoryLoginGuardBackend:
+    """
+    Failure counters of one process in an LRU of (failures, locked_until,
+    expires_at) tuples, bounded by `max_entries`.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[int, float, float]] = OrderedDict()
+
+    def _get(self, key: str) -> tuple[int, float, float]:
+        entry = self._entries.get(key)
+        if entry is None or entry[2] < time.time():
+            self._entries.pop(key, None)
+            return 0, 0.0, 0.0
+        return entry
+
+    def _set(self, key: str, entry: tuple[int, float, float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> tuple[int, float]:
+        failures, locked_until, _ = self._get(key)
+        return failures, locked_until
+
+    async def add_failure(self, key: str, ttl: float) -> int:
+        failures, locked_until, _ = self._get(key)
+        self._set(key, (failures + 1, locked_until, time.time() + ttl))
+        return failures + 1
+
+    async def lock(self, key: str, locked_until: float, ttl: float) -> None:
+        failures, _, _ = self._get(key)
+        self._set(key, (failures, locked_until, time.time() + ttl))
+
+    async def reset(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "backend": "memory",
+            "tracked": len(self._entries),
+            "locked": sum(
+                1 for _, locked_until, _ in self._entries.values() if locked_until > now
+            ),
+        }
+
+
+class RedisLoginGuardBackend:
+    """
+    Failure counters shared by all workers, expiring by TTL.
+    """
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+
+    async def get(self, key: str) -> tuple[int, float]:
+        failures, locked_until = await self.redis.hmget(
+            f"login:{key}", "failures", "locked_until"
+        )
+        return int(failures or 0), float(locked_until or 0)
+
+    async def add_failure(self, key: str, ttl: float) -> int:
+        async with self.redis.pipeline() as pipe:
+            pipe.hincrby(f"login:{key}", "failures", 1)
+            pipe.expire(f"login:{key}", int(ttl))
+            failures, _ = await pipe.execute()
+        return failures
+
+    async def lock(self, key: str, locked_until: float, ttl: float) -> None:
+        async with self.redis.pipeline() as pipe:
+            pipe.hset(f"login:{key}", "locked_until", locked_until)
+            pipe.expire(f"login:{key}", int(ttl))
+            await pipe.execute()
+
+    async def reset(self, key: str) -> None:
+        await self.redis.delete(f"login:{key}")
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+
+class LoginGuard:
+    """
+    Counts failed logins per username and per client IP. Once a key reaches
+    its threshold it is locked out for `base_lockout` seconds, doubling with
+    every further failure up to `max_lockout`. Counters are forgotten after
+    `window` seconds without failures, and a successful login resets the
+    username's counter.
+    """
+
+    def __init__(
+        self,
+        backend,
+        username_threshold: int,
+        ip_threshold: int,
+        base_lockout: float,
+        max_lockout: float,
+        window: float,
+        enabled: bool = True,
+    ):
+        self.backend = backend
+        self.username_threshold = username_threshold
+        self.ip_threshold = ip_threshold
+        self.base_lockout = base_lockout
+        self.max_lockout = max_lockout
+        self.window = window
+        self.enabled = enabled
+        self.attempts = 0
+        self.rejected = 0
+        self.failures = 0
+        self.lockouts = 0
+
+    def _keys(self, username: str, ip: str) -> list[tuple[str, int]]:
+        return [
+            (f"user:{username.lower()}", self.username_threshold),
+            (f"ip:{ip}", self.ip_threshold),
+        ]
+
+    async def retry_after(self, username: str, ip: str) -> float:
+        """
+        Seconds until the username and the IP may try again, 0 when allowed.
+        """
+        if not self.enabled:
+            return 0
+        self.attempts += 1
+        now = time.time()
+        wait = 0.0
+        for key, _ in self._keys(username, ip):
+            _, locked_until = await self.backend.get(key)
+            wait = max(wait, locked_until - now)
+        if wait > 0:
+            self.rejected += 1
+        return wait
+
+    async def record_failure(self, username: str, ip: str) -> None:
+        if not self.enabled:
+            return
+        self.failures += 1
+        for key, threshold in self._keys(username, ip):
+            failures = await self.backend.add_failure(key, self.window)
+            if failures >= threshold:
+                lockout = min(
+                    self.base_lockout * 2 ** (failures - threshold), self.max_lockout
+                )
+                await self.backend.lock(
+                    key, time.time() + lockout, max(self.window, lockout)
+                )
+                self.lockouts += 1
+
+    async def record_success(self, username: str) -> None:
+        if self.enabled:
+            await self.backend.reset(f"user:{username.lower()}")
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "attempts": self.attempts,
+            "rejected": self.rejected,
+            "failures": self.failures,
+            "lockouts": self.lockouts,
+            **self.backend.stats(),
+        }
+
+
+login_guard = LoginGuard(
+    (
+        RedisLoginGuardBackend(settings.LOGIN_GUARD_REDIS_URL)
+        if settings.LOGIN_GUARD_REDIS_URL
+        else InMemoryLoginGuardBackend(settings.LOGIN_GUARD_MAX_ENTRIES)
+    ),
+    settings.LOGIN_GUARD_USERNAME_THRESHOLD,
+    settings.LOGIN_GUARD_IP_THRESHOLD,
+    settings.LOGIN_GUARD_BASE_LOCKOUT_SECONDS,
+    settings.LOGIN_GUARD_MAX_LOCKOUT_SECONDS,
+    settings.LOGIN_GUARD_WINDOW_SECONDS,
+    settings.LOGIN_GUARD_ENABLED,
+)
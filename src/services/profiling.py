@@ -0,0 +1,164 @@
+import asyncio
+import os
+import re
+import secrets
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from src.conf.config import settings
+
+_PROFILE_NAME = re.compile(r"^\d{19}-[\w.-]+\.folded$")
+
+
+_STDLIB = sysconfig.get_paths()["stdlib"] + os.sep
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    _, sep, package_path = filename.rpartition("site-packages" + os.sep)
+    if sep:
+        filename = package_path
+    elif filename.startswith(_STDLIB):
+        filename = filename[len(_STDLIB) :]
+    elif filename.startswith(os.getcwd()):
+        filename = os.path.relpath(filename)
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({filename}:{code.co_firstlineno})"
+
+
+class TaskSampler:
+    """
+    Sampling profiler for one asyncio task. A background thread records the
+    task's stack every `interval` seconds: the running frames while the task
+    holds the event loop, its suspended coroutine chain ending in `[await]`
+    while it waits on I/O or other tasks run. The sampled code is never
+    traced, so the overhead does not depend on how many calls it makes.
+    """
+
+    def __init__(self, task: asyncio.Task, interval: float):
+        self.task = task
+        self.loop = task.get_loop()
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.samples: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _coroutine_stack(self) -> list[str]:
+        stack = []
+        coro = self.task.get_coro()
+        while coro is not None:
+            frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+            if frame is None:
+                break
+            stack.append(_label(frame))
+            coro = getattr(coro, "cr_await", None) or getattr(
+                coro, "gi_yieldfrom", None
+            )
+        return stack
+
+    def _running_stack(self) -> list[str] | None:
+        root = self.task.get_coro().cr_frame
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(_label(frame))
+            if frame is root:
+                # drop the event loop frames below the task
+                return stack[::-1]
+            frame = frame.f_back
+        return None
+
+    def _sample(self) -> None:
+        stack = None
+        if asyncio.current_task(self.loop) is self.task:
+            stack = self._running_stack()
+        if stack is None:
+            stack = self._coroutine_stack() + ["[await]"]
+        self.samples[";".join(stack)] += 1
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Counter[str]:
+        self._stopped.set()
+        self._thread.join()
+        return self.samples
+
+
+def profiling_token_matches(header: bytes | None, token: str | None) -> bool:
+    """
+    Compare the raw `X-Profile-Token` header value with `token`, UTF-8 encoded,
+    in constant time. Starlette decodes header values as latin-1, so a header
+    read as `str` is passed back as `value.encode("latin-1")`.
+    """
+    if token is None or header is None:
+        return False
+    return secrets.compare_digest(header, token.encode())
+
+
+class ProfileStore:
+    """
+    Bounded on-disk ring buffer of profiles in the collapsed stack format
+    (`frame;frame;frame count` per line) read by flamegraph.pl, speedscope
+    and inferno. Beyond `max_files` the oldest profiles are deleted.
+    """
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def _files(self) -> list[Path]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(
+            path for path in self.directory.iterdir() if _PROFILE_NAME.match(path.name)
+        )
+
+    @staticmethod
+    def new_name(label: str) -> str:
+        slug = re.sub(r"[^\w.-]+", "_", label).strip("_")[:80]
+        return f"{time.time_ns()}-{slug}.folded"
+
+    def save(self, name: str, samples: Counter[str]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / name).write_text(
+            "".join(f"{stack} {count}\n" for stack, count in samples.items())
+        )
+        for path in self._files()[: -self.max_files]:
+            # another worker may have pruned it already
+            path.unlink(missing_ok=True)
+
+    def list(self) -> list[dict]:
+        profiles = []
+        for path in reversed(self._files()):
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                continue
+            profiles.append(
+                {
+                    "name": path.name,
+                    "size": size,
+                    "created_at": int(path.name.split("-", 1)[0]) / 1e9,
+                }
+            )
+        return profiles
+
+    def path(self, name: str) -> Path | None:
+        path = self.directory / name
+        if not _PROFILE_NAME.match(name) or not path.is_file():
+            return None
+        return path
+
+
+profile_store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_FILES)
@@ -0,0 +1,320 @@
+import asyncio
+from collections import Counter, defaultdict
+
+from sqlalchemy import select, insert, delete, update, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.db import sessionmanager, shard_managers, shard_for_user
+from src.database.models import (
+    ArchivedContact,
+    Contact,
+    ContactAudit,
+    ContactStat,
+    RefreshToken,
+    Tag,
+    User,
+    archived_contact_tags,
+    contact_tags,
+)
+from src.repository.stats import ContactStatsRepository
+from src.services.users import UserService
+
+
+async def provision_user_shard(user: User, shard: int) -> None:
+    """
+    Create the user row referenced by the contacts foreign key on a shard.
+    Shards keep only id, username and email; the directory database stays the
+    source of truth for everything else.
+    """
+    manager = shard_managers[shard]
+    if manager is sessionmanager:
+        return
+    async with manager.session() as session:
+        dialect = session.get_bind().dialect.name
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        # a row left by an earlier attempt is fine, any other conflict is not
+        await session.execute(
+            dialect_insert(User)
+            .values(id=user.id, username=user.username, email=user.email)
+            .on_conflict_do_nothing(index_elements=["id"])
+        )
+        await session.commit()
+
+
+async def _lock_user(session: AsyncSession, user_id: int) -> None:
+    """
+    Make the user's writes on a shard wait until the session's transaction
+    ends. On Postgres the user row is locked FOR UPDATE, which conflicts with
+    the foreign key check of every insert referencing it; rows read later
+    with FOR UPDATE block updates and deletes. SQLite has no row locks, any
+    write takes the write lock of the whole database.
+    """
+    if session.get_bind().dialect.name == "sqlite":
+        await session.execute(
+            update(User).filter_by(id=user_id).values(shard=User.shard)
+        )
+    else:
+        await session.execute(select(User.id).filter_by(id=user_id).with_for_update())
+
+
+async def _copy_user(
+    source: AsyncSession, target: AsyncSession, user_id: int, batch_size: int
+) -> tuple[dict, dict, Counter]:
+    """
+    Copy the user's rows from `source` to `target`, locking them on `source`,
+    without committing. Returns the ids read from the source and the ids
+    written to the target, by table, and the contact statistics copied.
+    """
+    copied, written = defaultdict(list), defaultdict(list)
+    for table in (Contact.__table__, ArchivedContact.__table__):
+        columns = [column.name for column in table.columns]
+        result = await source.stream(
+            select(table)
+            .filter_by(user_id=user_id)
+            .with_for_update()
+            .execution_options(yield_per=batch_size)
+        )
+        async for rows in result.partitions():
+            await target.execute(
+                insert(table),
+                [dict(zip(columns, row)) for row in rows],
+            )
+            copied[table].extend(row.id for row in rows)
+        # contacts keep their ids
+        written[table] = copied[table]
+
+    tag_ids = {}
+    tags = await source.execute(
+        select(Tag.id, Tag.name, Tag.created_at)
+        .filter_by(user_id=user_id)
+        .with_for_update()
+    )
+    for tag_id, name, created_at in tags.all():
+        # a later pass finds the tags copied by the first one
+        tag_ids[tag_id] = await target.scalar(
+            select(Tag.id).filter_by(user_id=user_id, name=name)
+        )
+        if tag_ids[tag_id] is None:
+            tag_ids[tag_id] = await target.scalar(
+                insert(Tag)
+                .values(name=name, user_id=user_id, created_at=created_at)
+                .returning(Tag.id)
+            )
+            written[Tag.__table__].append(tag_ids[tag_id])
+    copied[Tag.__table__] = list(tag_ids)
+    links = await source.execute(
+        select(contact_tags.c.tag_id, contact_tags.c.contact_id)
+        .filter(contact_tags.c.tag_id.in_(tag_ids))
+        .with_for_update()
+    )
+    links = [
+        {
+            "tag_id": tag_ids[tag_id],
+            "contact_id": contact_id,
+            "user_id": user_id,
+        }
+        for tag_id, contact_id in links.all()
+    ]
+    if links:
+        await target.execute(insert(contact_tags), links)
+    archived_links = await source.execute(
+        select(archived_contact_tags.c.tag_id, archived_contact_tags.c.contact_id)
+        .filter(archived_contact_tags.c.tag_id.in_(tag_ids))
+        .with_for_update()
+    )
+    archived_links = [
+        {"tag_id": tag_ids[tag_id], "contact_id": contact_id}
+        for tag_id, contact_id in archived_links.all()
+    ]
+    if archived_links:
+        await target.execute(insert(archived_contact_tags), archived_links)
+
+    audit = ContactAudit.__table__
+    history = await source.stream(
+        select(audit)
+        .filter_by(user_id=user_id)
+        .order_by(audit.c.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async for rows in history.partitions():
+        new_ids = await target.scalars(
+            insert(audit).returning(audit.c.id, sort_by_parameter_order=True),
+            [
+                {key: value for key, value in row._mapping.items() if key != "id"}
+                for row in rows
+            ],
+        )
+        copied[audit].extend(row.id for row in rows)
+        written[audit].extend(new_ids)
+
+    # read last, every write that changes them waits for the locks taken above
+    stats = await source.execute(
+        select(ContactStat.kind, ContactStat.key, ContactStat.contacts)
+        .filter_by(user_id=user_id)
+        .with_for_update()
+    )
+    stats = Counter(
+        {(user_id, kind, key): contacts for kind, key, contacts in stats.all()}
+    )
+    # added to any rows the target already has
+    await ContactStatsRepository(target).apply(stats)
+    return copied, written, stats
+
+
+async def _delete_rows(
+    session: AsyncSession, user_id: int, ids: dict, batch_size: int
+) -> None:
+    """
+    Delete the user's rows with the given ids, by table; tag links go with
+    their contacts and tags.
+    """
+    for table, table_ids in ids.items():
+        for start in range(0, len(table_ids), batch_size):
+            await session.execute(
+                delete(table).filter(
+                    table.c.user_id == user_id,
+                    table.c.id.in_(table_ids[start : start + batch_size]),
+                )
+            )
+
+
+async def _switch_user(session: AsyncSession, user_id: int, shard: int) -> None:
+    # new sessions go to `shard`; not committed
+    await session.execute(update(User).filter_by(id=user_id).values(shard=shard))
+    await session.execute(
+        update(RefreshToken)
+        .filter_by(user_id=user_id, revoked=False)
+        .values(revoked=True)
+    )
+
+
+async def _move_rows(
+    user_id: int, source_shard: int, target_shard: int, batch_size: int, switch: bool
+) -> int:
+    """
+    Copy the user's rows to the target with the source locked, point the
+    user at the target if `switch` is set, then delete the copied rows from
+    the source. Returns the number of contacts moved.
+    """
+    source_manager = shard_managers[source_shard]
+    target_manager = shard_managers[target_shard]
+    async with source_manager.session() as source:
+        await _lock_user(source, user_id)
+        async with target_manager.session() as target:
+            copied, written, stats = await _copy_user(
+                source, target, user_id, batch_size
+            )
+            await target.commit()
+        try:
+            if switch and source_manager is sessionmanager:
+                # the directory row is locked by this very session
+                await _switch_user(source, user_id, target_shard)
+            elif switch:
+                async with sessionmanager.session() as directory:
+                    await _switch_user(directory, user_id, target_shard)
+                    await directory.commit()
+        except BaseException:
+            # the source still has everything, drop the copy
+            async with target_manager.session() as target:
+                await _delete_rows(target, user_id, written, batch_size)
+                await ContactStatsRepository(target).apply(
+                    Counter({key: -contacts for key, contacts in stats.items()})
+                )
+                await target.commit()
+            raise
+
+        await _delete_rows(source, user_id, copied, batch_size)
+        keys = [(kind, key) for _, kind, key in stats]
+        for start in range(0, len(keys), batch_size):
+            await source.execute(
+                delete(ContactStat).filter(
+                    ContactStat.user_id == user_id,
+                    tuple_(ContactStat.kind, ContactStat.key).in_(
+                        keys[start : start + batch_size]
+                    ),
+                )
+            )
+        if source_manager is not sessionmanager:
+            # nothing else of the user can have been written while it was locked
+            await source.execute(delete(User).filter_by(id=user_id))
+        await source.commit()
+    return len(copied[Contact.__table__]) + len(copied[ArchivedContact.__table__])
+
+
+async def move_user(
+    user_id: int, target_shard: int, batch_size: int = 1000, wait_seconds: int = 0
+) -> int:
+    """
+    Move every contact of a user to `target_shard` and point the user at it.
+
+    The user's rows on the source shard stay locked for the whole move, so
+    concurrent writes of the user wait for it (Postgres) or fail (SQLite)
+    rather than being lost. Everything is copied to the target first; then
+    the user is switched to the target and its refresh tokens are revoked;
+    only then are the copied rows deleted from the source, together with the
+    user's row there. Access tokens issued before the switch keep routing to
+    the source until they expire: reads find no contacts and writes fail on
+    the missing user row.
+
+    When the source is the directory database the user row stays, so writes
+    with those tokens succeed on the source. Pass `wait_seconds` (e.g.
+    JWT_EXPIRATION_SECONDS) to wait for the tokens to expire and then move
+    whatever they wrote.
+
+    Contacts, archived ones included, keep their ids, so shards must use
+    non-overlapping contact id sequences (see `configure_sequences`); tags and
+    history entries get new ids on the target, contact statistics are added
+    to the target's. A move that deadlocks with a concurrent write of the
+    user fails without changes and can be run again.
+    Returns the number of contacts moved.
+    """
+    async with sessionmanager.session() as session:
+        user = await UserService(session).get_user_by_id(user_id)
+        if user is None:
+            raise ValueError(f"User {user_id} not found")
+        source_shard = (
+            user.shard if user.shard is not None else shard_for_user(user.username)
+        )
+        if source_shard == target_shard:
+            return 0
+        await provision_user_shard(user, target_shard)
+
+    moved = await _move_rows(user_id, source_shard, target_shard, batch_size, True)
+    if wait_seconds and shard_managers[source_shard] is sessionmanager:
+        await asyncio.sleep(wait_seconds)
+        moved += await _move_rows(
+            user_id, source_shard, target_shard, batch_size, False
+        )
+    return moved
+
+
+async def configure_sequences() -> None:
+    """
+    Make contact ids unique across Postgres shards: shard `i` of `n` issues
+    ids congruent to `i + 1` modulo `n`, starting above every existing id.
+    """
+    if any(manager._engine.dialect.name != "postgresql" for manager in shard_managers):
+        raise ValueError("Contact id sequences can be configured on Postgres only")
+    count = len(shard_managers)
+    start = 0
+    for manager in shard_managers:
+        async with manager.session() as session:
+            max_id = await session.scalar(
+                text(
+                    "SELECT GREATEST(COALESCE(MAX(id), 0), "
+                    "(SELECT COALESCE(MAX(id), 0) FROM archived_contacts)) "
+                    "FROM contacts"
+                )
+            )
+            start = max(start, max_id)
+    start = (start // count + 1) * count
+    for index, manager in enumerate(shard_managers):
+        async with manager.session() as session:
+            await session.execute(
+                text(
+                    f"ALTER SEQUENCE contacts_id_seq INCREMENT BY {count} "
+                    f"RESTART WITH {start + index + 1}"
+                )
+            )
+            await session.commit()
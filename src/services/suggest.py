@@ -0,0 +1,92 @@
+import time
+import heapq
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Callable, Awaitable, Iterable, List, Tuple
+
+from src.conf.config import settings
+
+
+class ContactPrefixIndex:
+    """
+    Per-user sorted array of lowercased first name, last name and email keys.
+    Matches are returned in the order of the database query: by lowercased
+    first name, last name and id. An index is built lazily on the first lookup after a write and kept for at
+    most `max_users` users (least recently used are evicted).
+
+    Each index is stamped with the user's result cache generation, so a write
+    seen by any worker sharing the generations makes it stale; other workers'
+    writes are picked up after `ttl` seconds. An index whose build overlapped
+    a local invalidation is used once and not kept.
+    """
+
+    def __init__(self, max_users: int, ttl: float):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._indexes: OrderedDict[
+            int, Tuple[int, float, List[str], List[Tuple[tuple, str]]]
+        ] = OrderedDict()
+        # builds in progress, dropped by invalidate
+        self._builds: dict[int, object] = {}
+
+    def invalidate(self, user_id: int) -> None:
+        self._indexes.pop(user_id, None)
+        self._builds.pop(user_id, None)
+
+    @staticmethod
+    def _build(rows: Iterable) -> Tuple[List[str], List[Tuple[tuple, str]]]:
+        entries = []
+        for contact_id, first_name, last_name, email in rows:
+            display_name = f"{first_name} {last_name}"
+            order = (first_name.lower(), last_name.lower(), contact_id)
+            for key in (first_name, last_name, email):
+                if key:
+                    entries.append((key.lower(), order, display_name))
+        entries.sort()
+        keys = [key for key, _, _ in entries]
+        values = [(order, name) for _, order, name in entries]
+        return keys, values
+
+    async def suggest(
+        self,
+        user_id: int,
+        prefix: str,
+        limit: int,
+        load_rows: Callable[[], Awaitable[Iterable]],
+        generation: int = 0,
+    ) -> List[dict]:
+        index = self._indexes.get(user_id)
+        if index is not None and index[0] == generation and index[1] > time.monotonic():
+            self._indexes.move_to_end(user_id)
+            keys, values = index[2:]
+        else:
+            build = self._builds[user_id] = object()
+            expires_at = time.monotonic() + self.ttl
+            try:
+                keys, values = self._build(await load_rows())
+            finally:
+                current = self._builds.get(user_id) is build
+                if current:
+                    del self._builds[user_id]
+            if current:
+                self._indexes[user_id] = (generation, expires_at, keys, values)
+                self._indexes.move_to_end(user_id)
+                if len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+
+        prefix = prefix.lower()
+        matches = {}
+        position = bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix):
+            order, display_name = values[position]
+            matches[order] = display_name
+            position += 1
+        return [
+            {"id": order[2], "display_name": matches[order]}
+            for order in heapq.nsmallest(limit, matches)
+        ]
+
+
+suggest_index = ContactPrefixIndex(
+    settings.SUGGEST_INDEX_MAX_USERS, settings.SUGGEST_INDEX_TTL_SECONDS
+)
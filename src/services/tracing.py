@@ -0,0 +1,431 @@
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+from src.conf.config import settings
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_ERROR = 2
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span: ContextVar["Span | None"] = ContextVar("current_span", default=None)
+
+_STOP = object()
+
+
+class _Trace:
+    __slots__ = ("trace_id", "root", "spans", "dropped", "exported")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.root: Span | None = None
+        self.spans: list[Span] = []
+        self.dropped = 0
+        self.exported = False
+
+
+class Span:
+    """
+    One timed operation of a sampled trace. Used as a context manager it
+    becomes the parent of the spans started inside it.
+    """
+
+    __slots__ = (
+        "tracer",
+        "trace",
+        "span_id",
+        "parent_span_id",
+        "name",
+        "kind",
+        "attributes",
+        "start_time",
+        "end_time",
+        "status",
+        "_token",
+    )
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        trace: _Trace,
+        name: str,
+        parent_span_id: str | None,
+        kind: int,
+        attributes: dict,
+    ):
+        self.tracer = tracer
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_time = time.time_ns()
+        self.end_time = None
+        self.status = None
+        self._token = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = {"code": STATUS_CODE_ERROR, "message": repr(exc)}
+        self.attributes["exception.type"] = type(exc).__name__
+
+    def end(self) -> None:
+        if self.end_time is None:
+            self.end_time = time.time_ns()
+            self.tracer._finish(self)
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.record_exception(exc)
+        self.end()
+        return False
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": _otlp_attributes(self.attributes),
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        if self.status:
+            span["status"] = self.status
+        return span
+
+
+class _NoopSpan:
+    """
+    Stands in for spans of unsampled requests, so instrumented code pays a
+    context variable lookup and nothing else.
+    """
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list[dict]:
+    return [
+        {"key": key, "value": _otlp_value(value)} for key, value in attributes.items()
+    ]
+
+
+class ConsoleSpanExporter:
+    """
+    Prints every finished trace as one OTLP/JSON line.
+    """
+
+    def export(self, line: str) -> None:
+        print(line, flush=True)
+
+
+class FileSpanExporter:
+    """
+    Appends every finished trace as one OTLP/JSON line to `path`, the format
+    of the OpenTelemetry Collector file exporter, so the file can be replayed
+    with its `otlpjsonfile` receiver or read by any OTLP/JSON tool. Once the
+    file would grow past `max_bytes` it is renamed to `path.1`, replacing the
+    previous one, and a new file is started.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def export(self, line: str) -> None:
+        data = (line + "\n").encode()
+        with self._lock:
+            if self._size and self._size + len(data) > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+                self._size = 0
+            with open(self.path, "ab") as f:
+                f.write(data)
+            self._size += len(data)
+
+
+class Tracer:
+    """
+    Minimal OpenTelemetry-compatible tracer. The sampling decision is made
+    once per request (head-based): `sample_rate` of requests are traced, and
+    with `trust_parent` the sampled flag of an incoming W3C `traceparent`
+    header is followed too, so clients cannot force traces by default. Spans
+    of a sampled request are collected in memory and, when its root span
+    ends, handed to a thread that serializes and exports them. At most
+    `max_queue` traces wait for it; further traces are dropped and counted in
+    `dropped_traces`. Unsampled requests never allocate a span.
+    """
+
+    def __init__(
+        self,
+        service_name: str,
+        sample_rate: float,
+        exporter,
+        max_spans_per_trace: int = 1000,
+        trust_parent: bool = False,
+        max_queue: int = 1000,
+    ):
+        self.service_name = service_name
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.max_spans_per_trace = max_spans_per_trace
+        self.trust_parent = trust_parent
+        self.dropped_traces = 0
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        self._worker: threading.Thread | None = None
+        self._worker_lock = threading.Lock()
+
+    def start_trace(
+        self, name: str, traceparent: str | None = None, attributes: dict = None
+    ) -> Span | _NoopSpan:
+        """
+        Start the server span of a request, or a child span when a trace is
+        already active (batch sub-requests).
+        """
+        parent = _current_span.get()
+        if parent is not None:
+            return self._child(parent, name, SPAN_KIND_SERVER, attributes)
+
+        match = _TRACEPARENT.match(traceparent or "")
+        if match:
+            trace_id, parent_span_id, flags = match.groups()
+        else:
+            trace_id, parent_span_id = None, None
+        if match and self.trust_parent:
+            sampled = int(flags, 16) & 1
+        else:
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            return NOOP_SPAN
+        trace = _Trace(trace_id or os.urandom(16).hex())
+        trace.root = Span(
+            self, trace, name, parent_span_id, SPAN_KIND_SERVER, attributes or {}
+        )
+        return trace.root
+
+    def _child(
+        self, parent: Span, name: str, kind: int, attributes: dict | None
+    ) -> Span:
+        return Span(self, parent.trace, name, parent.span_id, kind, attributes or {})
+
+    def span(
+        self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes
+    ) -> Span | _NoopSpan:
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return self._child(parent, name, kind, attributes)
+
+    def _finish(self, span: Span) -> None:
+        trace = span.trace
+        if trace.exported:
+            # outlived its request, e.g. a task spawned by the handler
+            self._export([span])
+            return
+        if span is not trace.root and len(trace.spans) >= self.max_spans_per_trace:
+            trace.dropped += 1
+        else:
+            trace.spans.append(span)
+        if span is trace.root:
+            if trace.dropped:
+                span.attributes["tracing.dropped_spans"] = trace.dropped
+            trace.exported = True
+            self._export(trace.spans)
+
+    def _export(self, spans: list[Span]) -> None:
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(
+                        target=self._run_exporter, name="span-exporter", daemon=True
+                    )
+                    self._worker.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped_traces += 1
+
+    def _run_exporter(self) -> None:
+        while (spans := self._queue.get()) is not _STOP:
+            try:
+                self.exporter.export(self._otlp_line(spans))
+            except OSError as e:
+                print(e)
+
+    def _otlp_line(self, spans: list[Span]) -> str:
+        return json.dumps(
+            {
+                "resourceSpans": [
+                    {
+                        "resource": {
+                            "attributes": _otlp_attributes(
+                                {"service.name": self.service_name}
+                            )
+                        },
+                        "scopeSpans": [
+                            {
+                                "scope": {"name": __name__},
+                                "spans": [span.to_otlp() for span in spans],
+                            }
+                        ],
+                    }
+                ]
+            },
+            separators=(",", ":"),
+        )
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Export the queued traces and stop the exporter thread, waiting at most
+        `timeout` seconds. Blocking, run it in a thread from async code.
+        """
+        with self._worker_lock:
+            worker, self._worker = self._worker, None
+        if worker is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        worker.join(timeout)
+
+    def traced(self, name: str = None):
+        """
+        Decorator running a function, sync or async, in a span named after it.
+        """
+
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            if inspect.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if _current_span.get() is None:
+                        return await func(*args, **kwargs)
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return func(*args, **kwargs)
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def trace_methods(self, cls):
+        """
+        Class decorator tracing every public coroutine method of `cls`.
+        """
+        for attr, value in list(vars(cls).items()):
+            if not attr.startswith("_") and inspect.iscoroutinefunction(value):
+                setattr(cls, attr, self.traced(f"{cls.__name__}.{attr}")(value))
+        return cls
+
+    def instrument_engine(self, engine) -> None:
+        """
+        Record every SQL statement run by `engine` (sync or the `sync_engine`
+        of an async engine) as a client span of the current trace.
+        """
+        from sqlalchemy import event
+
+        system = engine.dialect.name
+
+        def before_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            parent = _current_span.get()
+            if parent is not None:
+                context._trace_span = self._child(
+                    parent,
+                    f"SQL {statement.split(None, 1)[0].upper()}",
+                    SPAN_KIND_CLIENT,
+                    {"db.system": system, "db.statement": statement},
+                )
+
+        def after_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            span = getattr(context, "_trace_span", None)
+            if span is not None:
+                if cursor.rowcount is not None and cursor.rowcount >= 0:
+                    span.set_attribute("db.rowcount", cursor.rowcount)
+                span.end()
+
+        def handle_error(exception_context):
+            span = getattr(exception_context.execution_context, "_trace_span", None)
+            if span is not None:
+                span.record_exception(exception_context.original_exception)
+                span.end()
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+        event.listen(engine, "handle_error", handle_error)
+
+
+tracer = Tracer(
+    settings.TRACING_SERVICE_NAME,
+    settings.TRACING_SAMPLE_RATE,
+    (
+        FileSpanExporter(settings.TRACING_FILE_PATH, settings.TRACING_FILE_MAX_BYTES)
+        if settings.TRACING_EXPORTER == "file"
+        else ConsoleSpanExporter()
+    ),
+    trust_parent=settings.TRACING_TRUST_PARENT,
+    max_queue=settings.TRACING_EXPORT_QUEUE_SIZE,
+)
@@ -1,6 +1,8 @@
 import cloudinary
 import cloudinary.uploader
 
+from src.services.tracing import tracer
+
 
 class UploadFileService:
     def __init__(self, cloud_name, api_key, api_secret):
@@ -15,6 +17,7 @@ class UploadFileService:
         )
 
     @staticmethod
+    @tracer.traced("upload.avatar")
     def upload_file(file, username) -> str:
         public_id = f"RestApp/{username}"
         r = cloudinary.uploader.upload(file.file, public_id=public_id, overwrite=True)
@@ -1,15 +1,36 @@
+from datetime import datetime, UTC
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from libgravatar import Gravatar
 
 from src.repository.users import UserRepository
 from src.schemas import UserCreate
+from src.services.tracing import tracer
+
+
+def _handle_integrity_error(e: IntegrityError):
+    # Postgres reports the constraint name, SQLite the constrained column
+    message = str(e.orig)
+    if "users_email_key" in message or "users.email" in message:
+        detail = "User with such email already exists"
+    elif "users_username_key" in message or "users.username" in message:
+        detail = "User with such username already exists"
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Database integrity error",
+        )
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
 
 
+@tracer.trace_methods
 class UserService:
     def __init__(self, db: AsyncSession):
         self.repository = UserRepository(db)
 
-    async def create_user(self, body: UserCreate):
+    async def create_user(self, body: UserCreate, shard: int = None):
         avatar = None
         try:
             g = Gravatar(body.email)
@@ -17,7 +38,14 @@ class UserService:
         except Exception as e:
             print(e)
 
-        return await self.repository.create_user(body, avatar)
+        try:
+            return await self.repository.create_user(body, avatar, shard)
+        except IntegrityError as e:
+            await self.repository.db.rollback()
+            _handle_integrity_error(e)
+
+    async def delete_user(self, user_id: int):
+        return await self.repository.delete_user(user_id)
 
     async def get_user_by_id(self, user_id: int):
         return await self.repository.get_user_by_id(user_id)
@@ -31,5 +59,35 @@ class UserService:
     async def confirmed_email(self, email: str):
         return await self.repository.confirmed_email(email)
 
+    async def set_shard(self, user_id: int, shard: int):
+        return await self.repository.set_shard(user_id, shard)
+
     async def update_avatar_url(self, email: str, url: str):
         return await self.repository.update_avatar_url(email, url)
+
+    async def add_refresh_token(self, user_id: int, token_hash: str, expires_at):
+        return await self.repository.add_refresh_token(user_id, token_hash, expires_at)
+
+    async def get_refresh_token(self, token_hash: str):
+        return await self.repository.get_refresh_token(token_hash)
+
+    async def revoke_refresh_token(self, token_hash: str):
+        return await self.repository.revoke_refresh_token(token_hash)
+
+    async def purge_expired_refresh_tokens(self, batch_size: int) -> int:
+        """
+        Delete the expired refresh tokens of every user in batches of `batch_size`,
+        for the users who stopped logging in; returns the number deleted.
+        """
+        now = datetime.now(UTC).replace(tzinfo=None)
+        purged = 0
+        while True:
+            deleted = await self.repository.delete_expired_refresh_tokens(
+                now, batch_size
+            )
+            purged += deleted
+            if deleted < batch_size:
+                return purged
+
+    async def revoke_user_refresh_tokens(self, user_id: int):
+        return await self.repository.revoke_user_refresh_tokens(user_id)
@@ -0,0 +1,158 @@
+import contextlib
+import os
+
+# settings are read when the application is imported; the databases are
+# replaced by the `database` fixture
+os.environ.update(
+    DB_URL="sqlite+aiosqlite://",
+    DB_SHARD_URLS="[]",
+    ADMISSION_ENABLED="false",
+    RESULT_CACHE_REDIS_URL="",
+)
+for name, value in {
+    "JWT_SECRET": "test-secret",
+    "MAIL_USERNAME": "noreply@example.com",
+    "MAIL_PASSWORD": "password",
+    "MAIL_FROM": "noreply@example.com",
+    "MAIL_PORT": "465",
+    "MAIL_SERVER": "localhost",
+    "CLOUDINARY_NAME": "test",
+    "CLOUDINARY_API_KEY": "1",
+    "CLOUDINARY_API_SECRET": "secret",
+}.items():
+    os.environ.setdefault(name, value)
+
+import httpx
+import pytest
+from passlib.context import CryptContext
+
+import main
+import src.api.auth as auth_api
+import src.services.contacts as contacts_service
+from src.conf.config import settings
+from src.database.db import DatabaseSessionManager, sessionmanager, shard_managers
+from src.database.models import Base
+from src.services.auth import Hash, create_email_token
+from src.services.cache import InMemoryCacheBackend, result_cache
+from src.services.suggest import ContactPrefixIndex
+
+# comma-separated URLs of empty Postgres databases, the tests drop and create
+# every table in them; Postgres tests are skipped without them
+POSTGRES_URLS = [
+    url for url in os.environ.get("TEST_POSTGRES_URLS", "").split(",") if url
+]
+
+
+def database_urls(dialect: str, directory, count: int) -> list[str]:
+    if dialect == "sqlite":
+        return [f"sqlite+aiosqlite:///{directory}/contacts{i}.db" for i in range(count)]
+    if len(POSTGRES_URLS) < count:
+        pytest.skip(f"needs {count} Postgres databases in TEST_POSTGRES_URLS")
+    return POSTGRES_URLS[:count]
+
+
+@contextlib.asynccontextmanager
+async def use_databases(urls: list[str]):
+    """
+    Point the application at `urls` with empty schemas: the first database is
+    the directory and shard 0, the others are the next shards.
+    """
+    managers = [DatabaseSessionManager(url) for url in urls]
+    for manager in managers:
+        async with manager._engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+    saved = sessionmanager._engine, sessionmanager._session_maker, list(shard_managers)
+    # modules import the managers themselves, so they are changed in place
+    sessionmanager._engine = managers[0]._engine
+    sessionmanager._session_maker = managers[0]._session_maker
+    shard_managers[:] = [sessionmanager, *managers[1:]]
+    try:
+        yield
+    finally:
+        sessionmanager._engine, sessionmanager._session_maker = saved[:2]
+        shard_managers[:] = saved[2]
+        for manager in managers:
+            await manager._engine.dispose()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def isolated_app(monkeypatch):
+    async def send_email(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(auth_api, "send_email", send_email)
+    # the lowest bcrypt cost, the tests hash many passwords
+    monkeypatch.setattr(
+        Hash, "pwd_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    )
+    monkeypatch.setattr(
+        result_cache, "backend", InMemoryCacheBackend(settings.RESULT_CACHE_MAX_BYTES)
+    )
+    monkeypatch.setattr(
+        contacts_service,
+        "suggest_index",
+        ContactPrefixIndex(
+            settings.SUGGEST_INDEX_MAX_USERS, settings.SUGGEST_INDEX_TTL_SECONDS
+        ),
+    )
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def dialect(request) -> str:
+    return request.param
+
+
+@pytest.fixture
+def database_url(dialect, tmp_path) -> str:
+    return database_urls(dialect, tmp_path, 1)[0]
+
+
+@pytest.fixture
+def database_count() -> int:
+    """
+    Number of databases of the `database` fixture, override it for shards.
+    """
+    return 1
+
+
+@pytest.fixture
+async def database(dialect, tmp_path, database_count):
+    async with use_databases(database_urls(dialect, tmp_path, database_count)):
+        yield
+
+
+@pytest.fixture
+async def client(database):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def sign_up(client):
+    """
+    Register, confirm and log in a user; returns the authorization headers.
+    """
+
+    async def sign_up(username: str) -> dict:
+        credentials = {"username": username, "password": "Passw0rd!"}
+        email = f"{username}@example.com"
+        response = await client.post(
+            "/api/auth/register", json={**credentials, "email": email}
+        )
+        assert response.status_code == 201, response.text
+        response = await client.get(
+            f"/api/auth/confirmed_email/{create_email_token({'sub': email})}"
+        )
+        assert response.status_code == 200, response.text
+        response = await client.post("/api/auth/login", data=credentials)
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return sign_up
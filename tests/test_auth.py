@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, UTC
+
+import pytest
+from sqlalchemy import select, update
+
+from src.database.db import sessionmanager
+from src.database.models import RefreshToken, User
+from src.services import auth
+from src.services.auth import TokenRevocationList
+from src.services.users import UserService
+
+pytestmark = pytest.mark.anyio
+
+
+def test_revoked_tokens_are_dropped_once_expired(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(auth.time, "time", lambda: now)
+    revoked = TokenRevocationList()
+    revoked.revoke("a", 1010.0)
+    revoked.revoke("b", 1030.0)
+    now = 1020.0
+    revoked.revoke("c", 1025.0)
+    assert not revoked.is_revoked("a")
+    assert revoked.is_revoked("b") and revoked.is_revoked("c")
+    now = 1040.0
+    revoked.revoke("d", 1050.0)
+    assert [jti for jti in "abcd" if revoked.is_revoked(jti)] == ["d"]
+    assert len(revoked._expiries) == 1
+
+
+async def test_me_returns_the_current_avatar(client, sign_up):
+    headers = await sign_up("alice")
+    async with sessionmanager.session() as session:
+        await session.execute(
+            update(User).filter_by(username="alice").values(avatar="https://new")
+        )
+        await session.commit()
+
+    response = await client.get("/api/users/me", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["avatar"] == "https://new"
+
+
+async def expire_refresh_tokens(username: str) -> None:
+    async with sessionmanager.session() as session:
+        user_id = await session.scalar(select(User.id).filter_by(username=username))
+        await session.execute(
+            update(RefreshToken)
+            .filter_by(user_id=user_id)
+            .values(expires_at=datetime.now(UTC).replace(tzinfo=None) - timedelta(1))
+        )
+        await session.commit()
+
+
+async def refresh_token_owners() -> list[str]:
+    async with sessionmanager.session() as session:
+        return list(
+            await session.scalars(
+                select(User.username).join(
+                    RefreshToken, RefreshToken.user_id == User.id
+                )
+            )
+        )
+
+
+async def test_expired_refresh_tokens_are_purged(client, sign_up):
+    for username in ("alice", "bob", "carol"):
+        await sign_up(username)
+        await expire_refresh_tokens(username)
+
+    # a new login purges the expired tokens of that user only
+    await sign_up("dave")
+    response = await client.post(
+        "/api/auth/login", data={"username": "alice", "password": "Passw0rd!"}
+    )
+    assert response.status_code == 200, response.text
+    assert sorted(await refresh_token_owners()) == ["alice", "bob", "carol", "dave"]
+
+    async with sessionmanager.session() as session:
+        assert await UserService(session).purge_expired_refresh_tokens(1) == 2
+    assert sorted(await refresh_token_owners()) == ["alice", "dave"]
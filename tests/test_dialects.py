@@ -0,0 +1,154 @@
+"""
+The same requests against SQLite and Postgres must give the same results;
+every test runs on both through the `dialect` fixture.
+"""
+
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+from src.conf.config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+def birthday(days_from_today: int) -> str:
+    # a leap year, so any day of the year exists
+    return (
+        (date.today() + timedelta(days=days_from_today)).replace(year=1992).isoformat()
+    )
+
+
+CONTACTS = [
+    ("Anna", "Smith", "anna@example.com", "+380501234567", birthday(0)),
+    ("Andrew", "Brown", "drew@Example.org", "+380501234568", birthday(3)),
+    ("Zoe", "Anders", "zoe@example.com", "+380671112233", birthday(20)),
+    ("Mark", "Smith", "mark@mail.com", "+380501234567", birthday(-1)),
+    ("anna", "smith", "ANNA@example.com", "+380931112233", birthday(200)),
+    ("A_b", "Percent", "ab@example.net", "+380939998877", birthday(-30)),
+]
+
+
+@pytest.fixture
+async def owner(client, sign_up):
+    headers = await sign_up("owner")
+    for first_name, last_name, email, phone, born in CONTACTS:
+        response = await client.post(
+            "/api/contacts/",
+            json={
+                "first_name": first_name,
+                "last_name": last_name,
+                "email": email,
+                "phone": phone,
+                "birthday": born,
+            },
+            headers=headers,
+        )
+        assert response.status_code == 201, response.text
+    return headers
+
+
+async def ids(client, url: str, headers: dict) -> list[int]:
+    response = await client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return [item["id"] for item in response.json()]
+
+
+async def test_list_is_ordered_and_scoped_to_the_user(client, sign_up, owner):
+    assert await ids(client, "/api/contacts/?limit=100", owner) == [1, 2, 3, 4, 5, 6]
+    assert await ids(client, "/api/contacts/?skip=2&limit=2", owner) == [3, 4]
+    assert await ids(client, "/api/contacts/", await sign_up("other")) == []
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("first_name=AN", [1, 2, 5]),
+        ("last_name=smi", [1, 4, 5]),
+        ("email=EXAMPLE", [1, 2, 3, 5, 6]),
+        ("first_name=an&last_name=SMITH", [1, 5]),
+        ("phone=%2B38%20(050)%20123-45-67", [1, 4]),
+        ("phone=38050*", [1, 2, 4]),
+        ("first_name=NN", [1, 5]),
+        ("first_name=nobody", []),
+    ],
+)
+async def test_search(client, owner, query, expected):
+    assert await ids(client, f"/api/contacts/search/?{query}", owner) == expected
+
+
+@pytest.mark.parametrize(
+    "days, expected",
+    [(1, [1]), (7, [1, 2]), (30, [1, 2, 3]), (300, [1, 2, 3, 5])],
+)
+async def test_upcoming_birthdays_in_date_order(client, owner, days, expected):
+    assert await ids(client, f"/api/contacts/birthdays/?days={days}", owner) == expected
+
+
+@pytest.mark.parametrize("index_enabled", [False, True])
+@pytest.mark.parametrize(
+    "prefix, expected",
+    [("an", [2, 1, 5, 3]), ("AnNa", [1, 5]), ("a_", [6]), ("zoe@", [3]), ("%", [])],
+)
+async def test_suggest(client, owner, monkeypatch, index_enabled, prefix, expected):
+    # the in-memory index returns what the query does
+    monkeypatch.setattr(settings, "SUGGEST_INDEX_ENABLED", index_enabled)
+    url = f"/api/contacts/suggest?prefix={prefix.replace('%', '%25')}"
+    assert await ids(client, url, owner) == expected
+
+
+async def test_stats(client, owner):
+    response = await client.get("/api/contacts/stats?domains=2", headers=owner)
+    assert response.status_code == 200, response.text
+    stats = response.json()
+    assert (stats["total"], stats["archived"]) == (6, 0)
+    assert sum(month["contacts"] for month in stats["birth_months"]) == 6
+    assert stats["email_domains"][0] == {"domain": "example.com", "contacts": 3}
+    assert len(stats["email_domains"]) == 2
+    assert sum(week["contacts"] for week in stats["added_per_week"]) == 6
+
+
+async def test_duplicates(client, owner):
+    response = await client.get("/api/contacts/duplicates", headers=owner)
+    assert response.status_code == 200, response.text
+    # Anna shares her phone with Mark, and her name and email with anna
+    assert response.json() == [
+        {"contact_ids": [1, 4, 5], "keys": ["email", "name", "phone"]}
+    ]
+
+
+async def test_tags(client, owner):
+    response = await client.post(
+        "/api/contacts/tags/friends", json={"contact_ids": [1, 2]}, headers=owner
+    )
+    assert response.status_code == 200, response.text
+    response = await client.get("/api/contacts/tags", headers=owner)
+    assert response.json() == [{"name": "friends", "contacts": 2}]
+    assert await ids(client, "/api/contacts/?tag=friends", owner) == [1, 2]
+    assert await ids(
+        client, "/api/contacts/search/?tag=friends&last_name=smith", owner
+    ) == [1]
+
+
+async def test_tagging_no_contact_leaves_no_tag(client, owner):
+    response = await client.post(
+        "/api/contacts/tags/empty", json={"contact_ids": [404]}, headers=owner
+    )
+    assert response.json() == {"name": "empty", "contacts": 0}
+    response = await client.get("/api/contacts/tags", headers=owner)
+    assert response.json() == []
+
+
+async def test_concurrent_tagging_creates_one_tag(client, owner):
+    responses = await asyncio.gather(
+        *(
+            client.post(
+                "/api/contacts/tags/team", json={"contact_ids": [i]}, headers=owner
+            )
+            for i in range(1, 7)
+        )
+    )
+    assert all(response.status_code == 200 for response in responses)
+    response = await client.get("/api/contacts/tags", headers=owner)
+    assert response.json() == [{"name": "team", "contacts": 6}]
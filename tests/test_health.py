@@ -0,0 +1,49 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.conf.config import settings
+from src.services.health import HealthMonitor
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_database_probe_fails_fast_when_the_pool_is_exhausted(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path}/health.db",
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=30,
+    )
+    monitor = HealthMonitor(60, 0.2)
+    try:
+        async with engine.connect():
+            started = time.perf_counter()
+            status = await monitor._probe_database(SimpleNamespace(_engine=engine))
+            assert time.perf_counter() - started < 5
+        assert not status["ok"]
+        assert status["pool"]["saturation"] == 1
+        assert (await monitor._probe_database(SimpleNamespace(_engine=engine)))["ok"]
+    finally:
+        await engine.dispose()
+
+
+async def test_mail_probe_closes_its_connection(monkeypatch):
+    closed = asyncio.Event()
+
+    async def handle(reader, writer):
+        await reader.read()
+        closed.set()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    monkeypatch.setattr(settings, "MAIL_SERVER", "127.0.0.1")
+    monkeypatch.setattr(settings, "MAIL_PORT", server.sockets[0].getsockname()[1])
+    async with server:
+        assert await HealthMonitor(60, 1)._probe_mail() == {"ok": True, "error": None}
+        await asyncio.wait_for(closed.wait(), 1)
@@ -0,0 +1,40 @@
+import pytest
+from fastapi import HTTPException
+
+from src.api.profiles import require_profiling_admin
+from src.conf.config import settings
+from src.middleware.profiling import ProfilingMiddleware
+from src.services.profiling import ProfileStore
+
+pytestmark = pytest.mark.anyio
+
+TOKEN = "пароль-token"
+
+
+@pytest.fixture
+def middleware(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_TOKEN", TOKEN)
+    return ProfilingMiddleware(
+        None,
+        store=ProfileStore(str(tmp_path), 10),
+        token=TOKEN,
+        sample_rate=0,
+        interval=0.005,
+        max_concurrent=1,
+    )
+
+
+@pytest.mark.parametrize(
+    "header, accepted",
+    [(TOKEN.encode(), True), (b"wrong", False), (TOKEN.encode("cp1251"), False)],
+)
+async def test_middleware_and_api_accept_the_same_tokens(middleware, header, accepted):
+    scope = {"headers": [(b"x-profile-token", header)]}
+    assert middleware._requested(scope) is accepted
+
+    # Starlette hands the header to the endpoint decoded as latin-1
+    if accepted:
+        await require_profiling_admin(header.decode("latin-1"))
+    else:
+        with pytest.raises(HTTPException):
+            await require_profiling_admin(header.decode("latin-1"))
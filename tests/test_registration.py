@@ -0,0 +1,75 @@
+import asyncio
+from contextvars import ContextVar
+
+import pytest
+from sqlalchemy import event, func, select
+
+from src.database.db import sessionmanager
+from src.database.models import User
+
+pytestmark = pytest.mark.anyio
+
+# statements run on behalf of the current request
+statements: ContextVar[list | None] = ContextVar("statements", default=None)
+
+
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    queries = statements.get()
+    if queries is not None:
+        queries.append(statement)
+
+
+@pytest.fixture
+def count_queries(database):
+    engine = sessionmanager._engine.sync_engine
+    event.listen(engine, "before_cursor_execute", record_statement)
+    yield
+    event.remove(engine, "before_cursor_execute", record_statement)
+
+
+async def register(client, username: str, email: str):
+    queries = []
+    # set in the task of this request only
+    statements.set(queries)
+    response = await client.post(
+        "/api/auth/register",
+        json={"username": username, "email": email, "password": "Passw0rd!"},
+    )
+    return response, queries
+
+
+async def test_concurrent_registrations_run_a_single_insert(client, count_queries):
+    results = await asyncio.gather(
+        *(register(client, f"user{i}", f"user{i}@example.com") for i in range(20)),
+        *(register(client, "taken", "taken@example.com") for _ in range(10)),
+    )
+
+    for response, queries in results:
+        assert len(queries) == 1, queries
+        assert queries[0].lstrip().upper().startswith("INSERT INTO USERS")
+    statuses = [response.status_code for response, _ in results]
+    assert statuses[:20] == [201] * 20
+    assert sorted(statuses[20:]) == [201] + [409] * 9
+    for response, _ in results[20:]:
+        if response.status_code == 409:
+            assert response.json()["message"] in (
+                "User with such email already exists",
+                "User with such username already exists",
+            )
+    async with sessionmanager.session() as session:
+        assert await session.scalar(select(func.count()).select_from(User)) == 21
+
+
+async def test_taken_username_and_email_get_their_own_message(client, count_queries):
+    response, _ = await register(client, "alice", "alice@example.com")
+    assert response.status_code == 201
+
+    response, queries = await register(client, "alice", "other@example.com")
+    assert response.status_code == 409
+    assert response.json()["message"] == "User with such username already exists"
+    assert len(queries) == 1
+
+    response, queries = await register(client, "bob", "alice@example.com")
+    assert response.status_code == 409
+    assert response.json()["message"] == "User with such email already exists"
+    assert len(queries) == 1
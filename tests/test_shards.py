@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+from src.database.db import sessionmanager, shard_for_user, shard_managers
+from src.database.models import Contact, ContactStat, Tag, User
+from src.services.shards import move_user
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def database_count() -> int:
+    # the directory, which is also shard 0, and two more shards
+    return 3
+
+
+def username_on(shard: int) -> str:
+    return next(f"user{i}" for i in range(1000) if shard_for_user(f"user{i}") == shard)
+
+
+async def count(shard: int, model, user_id: int) -> int:
+    async with shard_managers[shard].session() as session:
+        return await session.scalar(
+            select(func.count()).select_from(model).filter_by(user_id=user_id)
+        )
+
+
+async def log_in(client, username: str) -> dict:
+    response = await client.post(
+        "/api/auth/login", data={"username": username, "password": "Passw0rd!"}
+    )
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def create_contact(client, headers: dict, i: int):
+    return await client.post(
+        "/api/contacts/",
+        json={
+            "first_name": f"First{i}",
+            "last_name": f"Last{i}",
+            "email": f"contact{i}@example.com",
+            "phone": f"+38050{i:07d}",
+            "birthday": "1990-05-17",
+        },
+        headers=headers,
+    )
+
+
+async def snapshot(client, headers: dict) -> dict:
+    contacts = await client.get("/api/contacts/?limit=100", headers=headers)
+    tags = await client.get("/api/contacts/tags", headers=headers)
+    stats = await client.get("/api/contacts/stats", headers=headers)
+    history = await client.get("/api/contacts/1/history", headers=headers)
+    return {
+        "contacts": contacts.json(),
+        "tags": tags.json(),
+        "stats": stats.json(),
+        "history": [(entry["action"], entry["changes"]) for entry in history.json()],
+    }
+
+
+@pytest.mark.parametrize("source, target", [(1, 2), (0, 1), (2, 0)])
+async def test_move_keeps_every_row_and_clears_the_source(
+    client, sign_up, source, target
+):
+    username = username_on(source)
+    headers = await sign_up(username)
+    for i in range(1, 6):
+        assert (await create_contact(client, headers, i)).status_code == 201
+    await client.put(
+        "/api/contacts/1",
+        json={
+            "first_name": "Renamed",
+            "last_name": "Last1",
+            "email": "contact1@example.com",
+            "phone": "+380500000001",
+            "birthday": "1990-05-17",
+        },
+        headers=headers,
+    )
+    await client.post(
+        "/api/contacts/tags/friends", json={"contact_ids": [1, 2]}, headers=headers
+    )
+    before = await snapshot(client, headers)
+    async with sessionmanager.session() as session:
+        user_id = await session.scalar(select(User.id).filter_by(username=username))
+
+    assert await move_user(user_id, target, batch_size=2) == 5
+
+    assert await snapshot(client, await log_in(client, username)) == before
+    async with sessionmanager.session() as session:
+        assert await session.scalar(select(User.shard).filter_by(id=user_id)) == target
+    for model in (Contact, Tag, ContactStat):
+        assert await count(source, model, user_id) == 0
+    if source != 0:
+        async with shard_managers[source].session() as session:
+            assert await session.get(User, user_id) is None
+
+
+async def test_writes_with_a_token_from_before_the_move_are_not_lost(client, sign_up):
+    username = username_on(1)
+    headers = await sign_up(username)
+    for i in range(1, 21):
+        assert (await create_contact(client, headers, i)).status_code == 201
+    async with sessionmanager.session() as session:
+        user_id = await session.scalar(select(User.id).filter_by(username=username))
+
+    async def write(i: int) -> int:
+        try:
+            response = await create_contact(client, headers, i)
+        except Exception:
+            # the fenced write failed on the database, e.g. SQLite is locked
+            return 500
+        return response.status_code
+
+    writes = [asyncio.create_task(write(i)) for i in range(21, 41)]
+    await asyncio.sleep(0)
+    await move_user(user_id, 2, batch_size=5)
+    statuses = await asyncio.gather(*writes)
+
+    # every acknowledged write was moved to the target, none stayed behind
+    acknowledged = {
+        f"contact{i}@example.com"
+        for i, status in zip(range(21, 41), statuses)
+        if status == 201
+    }
+    async with shard_managers[2].session() as session:
+        emails = set(
+            await session.scalars(select(Contact.email).filter_by(user_id=user_id))
+        )
+        total = await session.scalar(
+            select(ContactStat.contacts).filter_by(
+                user_id=user_id, kind="total", key=""
+            )
+        )
+    assert acknowledged <= emails
+    assert len(emails) >= 20 + len(acknowledged)
+    assert total == len(emails)
+    assert await count(1, Contact, user_id) == 0
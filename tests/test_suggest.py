@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from src.services.suggest import ContactPrefixIndex
+
+pytestmark = pytest.mark.anyio
+
+
+def loader(rows: list, loads: list, started: asyncio.Event | None = None, release=None):
+    async def load_rows():
+        loads.append(1)
+        if started is not None:
+            started.set()
+            await release.wait()
+        return list(rows)
+
+    return load_rows
+
+
+async def test_index_built_while_invalidated_is_not_kept():
+    index = ContactPrefixIndex(10, 60)
+    rows, loads = [(1, "Anna", "Smith", "anna@example.com")], []
+    started, release = asyncio.Event(), asyncio.Event()
+    lookup = asyncio.create_task(
+        index.suggest(1, "an", 10, loader(rows, loads, started, release))
+    )
+    await started.wait()
+    rows.append((2, "Andrew", "Brown", "drew@example.com"))
+    index.invalidate(1)
+    release.set()
+    await lookup
+
+    suggestions = await index.suggest(1, "an", 10, loader(rows, loads))
+    assert [s["id"] for s in suggestions] == [2, 1]
+    assert len(loads) == 2
+
+
+async def test_index_follows_the_generation_and_expires():
+    index = ContactPrefixIndex(10, 60)
+    loads = []
+    load_rows = loader([(1, "Anna", "Smith", "anna@example.com")], loads)
+    await index.suggest(1, "an", 10, load_rows, 3)
+    await index.suggest(1, "an", 10, load_rows, 3)
+    assert len(loads) == 1
+    await index.suggest(1, "an", 10, load_rows, 4)
+    assert len(loads) == 2
+
+    index = ContactPrefixIndex(10, 0)
+    await index.suggest(1, "an", 10, load_rows)
+    await index.suggest(1, "an", 10, load_rows)
+    assert len(loads) == 4
@@ -0,0 +1,51 @@
+import json
+
+from src.services.tracing import NOOP_SPAN, FileSpanExporter, Tracer
+
+TRACEPARENT = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+
+
+class ListExporter:
+    def __init__(self):
+        self.lines = []
+
+    def export(self, line: str) -> None:
+        self.lines.append(json.loads(line))
+
+
+def test_sampled_flag_of_the_client_is_followed_only_when_trusted():
+    exporter = ListExporter()
+    span = Tracer("test", 0.0, exporter).start_trace("GET /", TRACEPARENT)
+    assert span is NOOP_SPAN
+
+    tracer = Tracer("test", 0.0, exporter, trust_parent=True)
+    with tracer.start_trace("GET /", TRACEPARENT):
+        with tracer.span("child"):
+            pass
+    tracer.stop()
+    [line] = exporter.lines
+    spans = line["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [span["name"] for span in spans] == ["child", "GET /"]
+    assert {span["traceId"] for span in spans} == {"a" * 32}
+
+
+def test_traces_are_dropped_when_the_export_queue_is_full():
+    tracer = Tracer("test", 1.0, ListExporter(), max_queue=2)
+    # no exporter thread drains the queue
+    tracer._worker = object()
+    for _ in range(5):
+        with tracer.start_trace("GET /"):
+            pass
+    assert tracer.dropped_traces == 3
+
+
+def test_export_file_is_rotated(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = FileSpanExporter(str(path), 30)
+    for i in range(5):
+        exporter.export(f'{{"trace":{i}}}')
+    assert path.read_text().splitlines() == ['{"trace":4}']
+    assert (tmp_path / "traces.jsonl.1").read_text().splitlines() == [
+        '{"trace":2}',
+        '{"trace":3}',
+    ]